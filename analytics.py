@@ -0,0 +1,135 @@
+"""Rolling and drawdown analytics of an accrual result's gross and net series.
+
+Everything comes from cumulative arrays (log gross growth, running peaks,
+elapsed time), so each figure is a single pass over the history whatever the
+window length. Windows are in months; for a non-monthly series (pass the
+calendar's `days`) they are measured on the real dates.
+"""
+import numpy as np
+import pandas as pd
+
+from fee_engine import AccrualResult
+
+WINDOWS = (12, 36, 60)
+DAYS_PER_MONTH = 365.0 / 12.0
+
+
+def _periods(result: AccrualResult, first_row_is_base: bool, days=None):
+    # Rows that are real periods, and the months each one covers
+    sl = slice(1 if first_row_is_base and len(result) else 0, None)
+    rows = result.row[sl]
+    if days is None:
+        return sl, np.ones(len(rows))
+    days = np.asarray(days, dtype=np.float64)
+    if len(rows) == 0:
+        return sl, np.zeros(0)
+    elapsed = np.cumsum(days)[rows]
+    return sl, np.diff(elapsed, prepend=elapsed[0] - days[rows[0]]) / DAYS_PER_MONTH
+
+
+def _annualized(log_growth, months):
+    # From log growth, so century-long histories don't overflow
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        return np.where(months > 0, np.expm1(log_growth * 12.0 / months) * 100.0, np.nan)
+
+
+def rolling_frame(result: AccrualResult, periods, first_row_is_base: bool = True,
+                  windows=WINDOWS, days=None) -> pd.DataFrame:
+    """Trailing annualized gross and net returns and fee drag for each window, per period.
+
+    A window ending at a period covers the trailing `window` months; periods
+    with less history than that are left blank.
+    """
+    sl, months = _periods(result, first_row_is_base, days)
+    gross = result.gross_return[sl]
+    opening = result.beginning_nav[sl]
+    closing = result.closing_nav[sl]
+    end = np.cumsum(months)
+    start = end - months
+    log_growth = np.r_[0.0, np.cumsum(np.log1p(gross))]
+    idx = np.arange(len(end))
+
+    data = {"Month": pd.Series(periods).iloc[result.row[sl]].to_numpy()}
+    for window in windows:
+        if days is None:
+            first = idx - window + 1
+        else:
+            # Last period starting at or before `window` months back
+            first = np.searchsorted(start, end - window + 1e-9, side="right") - 1
+        full = first >= 0
+        first = np.maximum(first, 0)
+        span = end - start[first]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_net = np.log(closing / opening[first])
+        gross_pa = np.where(full, _annualized(log_growth[idx + 1] - log_growth[first], span), np.nan)
+        net_pa = np.where(full, _annualized(log_net, span), np.nan)
+        data[f"{window}M Gross % p.a."] = gross_pa
+        data[f"{window}M Net % p.a."] = net_pa
+        data[f"{window}M Fee Drag % p.a."] = gross_pa - net_pa
+    return pd.DataFrame(data)
+
+
+def _max_drawdown(log_path):
+    # Deepest fall from a running peak, and where it started and bottomed out
+    drawdown = log_path - np.maximum.accumulate(log_path)
+    trough = int(np.argmin(drawdown))
+    peak = int(np.argmax(log_path[:trough + 1]))
+    return float(np.expm1(drawdown[trough])) * 100.0, peak, trough
+
+
+def _spells(flag, months):
+    # Length in months of each run of consecutive True periods
+    edges = np.diff(np.r_[0, flag.astype(np.int8), 0])
+    elapsed = np.r_[0.0, np.cumsum(months)]
+    return elapsed[np.flatnonzero(edges == -1)] - elapsed[np.flatnonzero(edges == 1)]
+
+
+def drawdown_summary(result: AccrualResult, periods, first_row_is_base: bool = True, days=None) -> dict:
+    """Whole-history annualized returns, max drawdowns and time spent under the HWM."""
+    sl, months = _periods(result, first_row_is_base, days)
+    gross = result.gross_return[sl]
+    closing = result.closing_nav[sl]
+    # Labels of the NAV path: the opening NAV, then each period's close
+    periods = pd.Series(periods)
+    opening_label = periods.iloc[result.row[0]] if sl.start else "Start"
+    labels = np.r_[np.array([opening_label], dtype=object), periods.iloc[result.row[sl]].to_numpy(dtype=object)]
+    total_months = float(months.sum())
+    summary = {
+        "Annualized Gross %": np.nan,
+        "Annualized Net %": np.nan,
+        "Fee Drag % p.a.": np.nan,
+        "Max Drawdown % (Net)": 0.0,
+        "Drawdown Peak": None,
+        "Drawdown Trough": None,
+        "Max Drawdown % (Gross)": 0.0,
+        "Months Under HWM": 0.0,
+        "% of Time Under HWM": 0.0,
+        "Longest Spell Under HWM (months)": 0.0,
+        "Current Spell Under HWM (months)": 0.0,
+    }
+    if len(closing) == 0:
+        return summary
+
+    opening = result.beginning_nav[sl][0]
+    log_gross = np.r_[0.0, np.cumsum(np.log1p(gross))]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_net = np.log(np.r_[opening, closing] / opening)
+    gross_pa = float(_annualized(log_gross[-1], total_months))
+    net_pa = float(_annualized(log_net[-1], total_months))
+    net_dd, peak, trough = _max_drawdown(log_net)
+    under = closing < result.hwm[sl]
+    spells = _spells(under, months)
+    summary.update({
+        "Annualized Gross %": gross_pa,
+        "Annualized Net %": net_pa,
+        "Fee Drag % p.a.": gross_pa - net_pa,
+        "Max Drawdown % (Net)": net_dd,
+        "Drawdown Peak": labels[peak] if net_dd < 0 else None,
+        "Drawdown Trough": labels[trough] if net_dd < 0 else None,
+        "Max Drawdown % (Gross)": _max_drawdown(log_gross)[0],
+        "Months Under HWM": float(months[under].sum()),
+        "% of Time Under HWM": float(months[under].sum() / total_months * 100.0) if total_months else 0.0,
+        "Longest Spell Under HWM (months)": float(spells.max()) if len(spells) else 0.0,
+        "Current Spell Under HWM (months)": float(spells[-1]) if len(spells) and under[-1] else 0.0,
+    })
+    return summary
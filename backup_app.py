@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
-import io
-import numpy as np
 import streamlit.components.v1 as components
 from datetime import datetime
 
+from export import XLSX_MIME, excel_bytes
+from fee_engine import FeeParams, periodic_gross_from_net, run_periodic
+from periods import period_calendar
+
 
 st.set_page_config(page_title="FoF Calculator", layout="wide")
 
@@ -210,7 +212,7 @@ st.subheader('This application converts **gross values** to **net values** based
 col1, col2 = st.columns(2)
 
 with col1:
-    # data_type = st.radio("Gross or Net?", ["Gross", "Net"])
+    data_type = st.radio("Gross or Net?", ["Gross", "Net"])
     mgmt_fee = st.number_input("Management Fee % (Annual)", 0.0, 10.0, 1.5, 0.1)
     carry_pct = st.number_input("Carry %", 0.0, 50.0, 10.0, 0.5)
     
@@ -255,169 +257,29 @@ if uploaded_file is not None:
                         st.info(f"ℹ️ Detected base row: {df[period_col].iloc[0]} - Starting calculations from next row")
                         start_idx = 1
                     
-                    # Initialize
-                    starting_value = 1.0
-                    current_value = starting_value
-                    hwm = starting_value
-                    
-                    # Calculate management fee rate
-                    if mgmt_freq == "Monthly":
-                        mgmt_fee_rate = -(mgmt_fee / 100 / 12)
-                        mgmt_periods_per_year = 12
-                    elif mgmt_freq == "Quarterly":
-                        mgmt_fee_rate = -(mgmt_fee / 100 / 4)
-                        mgmt_periods_per_year = 4
-                    else:  # Yearly
-                        mgmt_fee_rate = -(mgmt_fee / 100)
-                        mgmt_periods_per_year = 1
-                    
-                    # Calculate hurdle rate
-                    if pfm_freq == "Monthly":
-                        hurdle_period = hurdle_rate / 100 / 12
-                        perf_periods_per_year = 12
-                    elif pfm_freq == "Quarterly":
-                        hurdle_period = hurdle_rate / 100 / 4
-                        perf_periods_per_year = 4
-                    else:  # Yearly
-                        hurdle_period = hurdle_rate / 100
-                        perf_periods_per_year = 1
-                    
-                    carry_decimal = carry_pct / 100
-                    
-                    # Storage lists
-                    months = []
-                    beginning_values = []
-                    gross_values = []
-                    mgmt_fees = []
-                    mgmt_charged_list = []
-                    after_mgmt_values = []
-                    perf_fee_base_list = []
-                    perf_fees = []
-                    ending_net_values = []
-                    return_pcts = []
-                    hwm_list = []
-                    
-                    # ✅ FIX 2: Add base row to results if detected
-                    if start_idx == 1:
-                        months.append(df[period_col].iloc[0])
-                        beginning_values.append(starting_value)
-                        gross_values.append(starting_value)
-                        mgmt_fees.append(0.0)
-                        mgmt_charged_list.append(False)
-                        after_mgmt_values.append(starting_value)
-                        perf_fee_base_list.append(0.0)
-                        perf_fees.append(0.0)
-                        ending_net_values.append(starting_value)
-                        return_pcts.append(0.0)
-                        hwm_list.append(hwm)
-                    
-                    # ✅ FIX 3: Process each period starting from start_idx
-                    for idx in range(start_idx, len(returns_decimal)):
-                        gross_return = returns_decimal.iloc[idx]
-                        
-                        if pd.isna(gross_return):
-                            continue
-                        
-                        # Get current month for frequency checking
-                        try:
-                            month_dt = pd.to_datetime(df[period_col].iloc[idx])
-                            current_month = month_dt.month
-                            is_year_end = current_month == 12
-                        except:
-                            current_month = ((idx - start_idx) % 12) + 1
-                            is_year_end = current_month == 12
-                        
-                        # Store month and beginning value (Column U in Excel)
-                        months.append(df[period_col].iloc[idx])
-                        beginning_value = current_value
-                        beginning_values.append(beginning_value)
-                        
-                        # Step 1: Calculate gross value
-                        gross_value = current_value * (1 + gross_return)
-                        gross_values.append(gross_value)
-                        
-                        # Step 2: Apply management fee
-                        mgmt_charged = False
-                        if mgmt_freq == "Monthly":
-                            mgmt_charged = True
-                        elif mgmt_freq == "Quarterly":
-                            mgmt_charged = current_month in [3, 6, 9, 12]
-                        elif mgmt_freq == "Yearly":
-                            mgmt_charged = is_year_end
-                        
-                        mgmt_fee_applied = mgmt_fee_rate if mgmt_charged else 0.0
-                        value_after_mgmt = current_value * (1 + gross_return + mgmt_fee_applied)
-                        
-                        mgmt_fee_amount = abs(mgmt_fee_applied * current_value) if mgmt_charged else 0.0
-                        mgmt_fees.append(mgmt_fee_amount)
-                        mgmt_charged_list.append(mgmt_charged)
-                        after_mgmt_values.append(value_after_mgmt)
-                        
-                        # Step 3: Calculate period return after mgmt
-                        period_return = (value_after_mgmt - current_value) / current_value if current_value > 0 else 0
-                        
-                        # Step 4: Check if performance fee should be calculated
-                        should_calc_perf = False
-                        if pfm_freq == "Yearly":
-                            should_calc_perf = is_year_end
-                        elif pfm_freq == "Quarterly":
-                            should_calc_perf = current_month in [3, 6, 9, 12]
-                        elif pfm_freq == "Monthly":
-                            should_calc_perf = True
-                        
-                        # Step 5: Calculate performance fee
-                        perf_fee_paid = 0.0
-                        perf_fee_base = 0.0
-                        
-                        if should_calc_perf:
-                            if use_hwm:
-                                # Only charge if value > HWM
-                                if value_after_mgmt > hwm:
-                                    perf_fee_base = value_after_mgmt - hwm
-                                    perf_fee_paid = perf_fee_base * carry_decimal
-                                    value_after_mgmt -= perf_fee_paid
-                                    hwm = value_after_mgmt
-                            else:
-                                # Charge on excess over hurdle
-                                if period_return > hurdle_period:
-                                    excess_return = period_return - hurdle_period
-                                    perf_fee_paid = current_value * excess_return * carry_decimal
-                                    value_after_mgmt -= perf_fee_paid
-                        
-                        perf_fees.append(perf_fee_paid)
-                        perf_fee_base_list.append(perf_fee_base)
-                        
-                        # Step 6: Final net value (Column AB in Excel) - AFTER perf fee deduction
-                        net_value = value_after_mgmt
-                        ending_net_values.append(net_value)
-                        
-                        # Step 7: Calculate return % using Excel formula: (AB - U) / U
-                        return_pct = ((net_value - beginning_value) / beginning_value * 100) if beginning_value > 0 else 0
-                        return_pcts.append(return_pct)
-                        
-                        # Store HWM
-                        hwm_list.append(hwm)
-                        
-                        # Update for next iteration
-                        current_value = net_value
-                    
-                    # Create results DataFrame
-                    result_df = pd.DataFrame({
-                        'Month': months,
-                        'Input': [returns_decimal.iloc[i] if i < len(returns_decimal) else 0.0 for i in range(len(months))],
-
-                        'Gross': gross_values,
-                        'Mgmt Fee': mgmt_fees,
-                        'Mgmt Charged?': mgmt_charged_list,
-                        'After Mgmt': after_mgmt_values,
-                        'Hurdle Met': ['✓' if r > hurdle_period else '' for r in 
-                                       [(after_mgmt_values[i] - beginning_values[i])/beginning_values[i] 
-                                        for i in range(len(after_mgmt_values))]],
-                        'Perf Paid': perf_fees,
-                        'Net Value': ending_net_values,
-                        'Return %': return_pcts,
-                        'HWM': hwm_list
-                    })
+                    calendar = period_calendar(df[period_col], start_idx)
+                    if calendar.days is not None:
+                        st.info("ℹ️ Not a monthly series: fees are charged on the rows that end a month, "
+                                "quarter or year.")
+                    params = FeeParams(
+                        mgmt_fee=mgmt_fee,
+                        carry_pct=carry_pct,
+                        hurdle_rate=hurdle_rate,
+                        mgmt_freq=mgmt_freq,
+                        pfm_freq=pfm_freq,
+                        use_hwm=use_hwm,
+                    )
+                    returns = returns_decimal.to_numpy(dtype=float)
+                    if data_type == "Net":
+                        # Solve for the gross that nets down to the uploaded returns
+                        returns = periodic_gross_from_net(returns, calendar.month, calendar.year_end,
+                                                          params, first_row_is_base=start_idx == 1,
+                                                          month_end=calendar.month_end)
+                    result = run_periodic(returns, calendar.month, calendar.year_end,
+                                          params, first_row_is_base=start_idx == 1, month_end=calendar.month_end)
+                    result_df = result.to_frame(df[period_col])
+                    if data_type == "Net":
+                        result_df = result_df.rename(columns={"Input": "Implied Gross"})
                     
                     # Display results
                     st.subheader("📈 Detailed Results")
@@ -430,38 +292,32 @@ if uploaded_file is not None:
                         avg_return = result_df['Return %'].mean()
                         st.metric("Avg Return %", f"{avg_return:.2f}%")
                     with c2:
-                        total_mgmt = sum(mgmt_fees)
+                        total_mgmt = result.total_mgmt_fees
                         st.metric("Total Mgmt Fees", f"{total_mgmt:.6f}")
                     with c3:
-                        total_perf = sum(perf_fees)
+                        total_perf = result.total_perf_fees
                         st.metric("Total Perf Fees", f"{total_perf:.6f}")
                     with c4:
-                        final_value = ending_net_values[-1]
+                        final_value = result.final_value
                         st.metric("Final Net Value", f"{final_value:.6f}")
                     
-                    # ✅ FIX 4: Download - Use openpyxl instead of xlsxwriter
-                    output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        result_df.to_excel(writer, index=False, sheet_name='Results')
-                        
-                        # Add summary sheet
-                        summary_df = pd.DataFrame({
-                            'Parameter': ['Management Fee', 'Mgmt Frequency', 'Performance Fee', 
-                                        'Perf Frequency', 'Hurdle Rate', 'High Water Mark', 
-                                        '', 'Avg Return %', 'Total Mgmt Fees', 'Total Perf Fees', 
-                                        'Final Net Value'],
-                            'Value': [f"{mgmt_fee}%", mgmt_freq, f"{carry_pct}%", 
-                                    pfm_freq, f"{hurdle_rate}%", 'Yes' if use_hwm else 'No',
-                                    '', f"{avg_return:.2f}%", f"{total_mgmt:.6f}", 
-                                    f"{total_perf:.6f}", f"{final_value:.6f}"]
-                        })
-                        summary_df.to_excel(writer, index=False, sheet_name='Summary')
+                    # Download - streamed through xlsxwriter in constant-memory mode
+                    summary_df = pd.DataFrame({
+                        'Parameter': ['Input Returns', 'Management Fee', 'Mgmt Frequency', 'Performance Fee', 
+                                    'Perf Frequency', 'Hurdle Rate', 'High Water Mark', 
+                                    '', 'Avg Return %', 'Total Mgmt Fees', 'Total Perf Fees', 
+                                    'Final Net Value'],
+                        'Value': [data_type, f"{mgmt_fee}%", mgmt_freq, f"{carry_pct}%", 
+                                pfm_freq, f"{hurdle_rate}%", 'Yes' if use_hwm else 'No',
+                                '', f"{avg_return:.2f}%", f"{total_mgmt:.6f}", 
+                                f"{total_perf:.6f}", f"{final_value:.6f}"]
+                    })
                     
                     st.download_button(
                         "📥 Download Excel",
-                        output.getvalue(),
+                        excel_bytes([('Results', result_df), ('Summary', summary_df)]),
                         f"fund_fees_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        XLSX_MIME
                     )
         else:
             st.error("❌ At least 2 columns required!")
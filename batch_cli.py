@@ -0,0 +1,249 @@
+"""Headless batch runner for the gross-to-net calculator.
+
+Runs the same accrual recurrence as `streamlit_app.py` over many return
+files at once, one file per worker process, and writes one result file per
+input plus a consolidated summary:
+
+    python batch_cli.py feeders/ --mgmt-fee 1.5 --carry 10 --out results/
+    python batch_cli.py "feeders/**/*.xlsx" --config fees.toml --workers 8
+
+Fee terms come from `--config` (JSON or TOML with `FeeParams` field names,
+plus optional `first_row_is_base`); any flag given on the command line
+overrides the config value.
+
+With `--checkpoints DIR` each single-fund file resumes from
+``DIR/<stem>.checkpoint.json`` when it exists, so a month-end file only needs
+the new months, and the updated checkpoint is written back there. Daily,
+weekly or irregular series can't be resumed, so they get no checkpoint.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import fields
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from export import csv_bytes, excel_bytes, excel_sheet_names, parquet_bytes
+from fee_engine import FREQUENCIES, AccrualCheckpoint, FeeParams, run_accrual, run_accrual_batch
+from ingest import UPLOAD_TYPES, parse_returns_report, read_upload
+from periods import period_calendar
+
+OUTPUT_FORMATS = ("xlsx", "csv", "parquet")
+SUMMARY_COLUMNS = ["File", "Fund", "Periods", "Avg Net Return %", "Total Mgmt Fees",
+                   "Total Crystallization Amount", "Uncrystallized PF", "Final NAV", "Seconds", "Error"]
+
+
+def expand_inputs(patterns) -> list:
+    """Files named by paths, directories (their supported files) or globs, in order, de-duplicated."""
+    suffixes = {f".{ext}" for ext in UPLOAD_TYPES}
+    found = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = sorted(p for p in path.iterdir() if p.is_file() and p.suffix.lower() in suffixes)
+        elif glob.has_magic(pattern):
+            matches = sorted(Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file())
+        else:
+            matches = [path]
+        # Skip Excel's "~$book.xlsx" lock files
+        found.extend(p for p in matches if not p.name.startswith("~$"))
+    return list(dict.fromkeys(found))
+
+
+def output_names(paths, fmt: str) -> list:
+    # Unique "<stem>_fees.<fmt>" names; inputs from different folders may share a stem
+    used, names = set(), []
+    for path in paths:
+        name, n = f"{path.stem}_fees.{fmt}", 1
+        while name.lower() in used:
+            n += 1
+            name = f"{path.stem}_{n}_fees.{fmt}"
+        used.add(name.lower())
+        names.append(name)
+    return names
+
+
+def load_config(path: Optional[str]) -> dict:
+    if not path:
+        return {}
+    data = Path(path).read_bytes()
+    config = tomllib.loads(data.decode("utf-8")) if path.endswith(".toml") else json.loads(data)
+    known = {f.name for f in fields(FeeParams)} | {"first_row_is_base"}
+    unknown = sorted(set(config) - known)
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(unknown)}")
+    return config
+
+
+def write_table(path: Path, fmt: str, df: pd.DataFrame, sheet: str = "Results"):
+    if fmt == "xlsx":
+        path.write_bytes(excel_bytes([(sheet, df)]))
+    else:
+        path.write_bytes(csv_bytes(df) if fmt == "csv" else parquet_bytes(df))
+
+
+def _write_results(path: Path, fmt: str, frames: dict, summary_df: pd.DataFrame):
+    if len(frames) == 1:
+        write_table(path, fmt, next(iter(frames.values())))
+    elif fmt == "xlsx":
+        # Same layout as the app's batch download: summary, then one sheet per fund
+        sheets = zip(excel_sheet_names(frames), frames.values())
+        path.write_bytes(excel_bytes([("Summary", summary_df), *sheets]))
+    else:
+        # Flat formats get every fund in one long table
+        df = pd.concat([frame.assign(Fund=name) for name, frame in frames.items()], ignore_index=True)
+        write_table(path, fmt, df[["Fund"] + [c for c in df.columns if c != "Fund"]])
+
+
+def process_file(path: Path, out_path: Path, params: FeeParams, first_row_is_base: bool,
+                 all_columns: bool, fmt: str, checkpoint_path: Optional[Path] = None) -> list:
+    """Calculate one input file and write its results; returns its summary rows.
+
+    Errors are reported as a summary row rather than raised, so one bad file
+    doesn't stop the batch.
+    """
+    started = time.perf_counter()
+    try:
+        df, _ = read_upload(path.read_bytes(), path.name, None if all_columns else 2)
+        if len(df.columns) < 2:
+            raise ValueError("At least 2 columns required")
+        period_col = df.columns[0]
+        return_cols = list(df.columns[1:]) if all_columns else [df.columns[1]]
+        parsed = {col: parse_returns_report(df[col])[0] for col in return_cols}
+        fund_cols = [col for col in return_cols if not parsed[col].isna().all()]
+        if not fund_cols:
+            raise ValueError("Cannot parse returns column")
+
+        resume = None
+        if checkpoint_path is not None and checkpoint_path.exists():
+            resume = AccrualCheckpoint.from_json(checkpoint_path.read_text())
+            resume.check_continues(df[period_col])
+        start_idx = -resume.period_index if resume else 1 if first_row_is_base else 0
+        calendar = period_calendar(df[period_col], start_idx)
+        months, year_end = calendar.month, calendar.year_end
+        if len(fund_cols) == 1:
+            result = run_accrual(parsed[fund_cols[0]].to_numpy(dtype=float), months, year_end,
+                                 params, first_row_is_base, resume=resume, **calendar.schedule)
+            funds = [result]
+            summary_df = pd.DataFrame([result.summary(str(fund_cols[0]))])
+        else:
+            matrix = np.column_stack([parsed[col].to_numpy(dtype=float) for col in fund_cols])
+            batch = run_accrual_batch(matrix, months, year_end, params, first_row_is_base, **calendar.schedule)
+            funds = [batch.fund(j) for j in range(len(fund_cols))]
+            summary_df = batch.summary_frame([str(col) for col in fund_cols])
+
+        frames = {str(col): fund.to_frame(df[period_col]) for col, fund in zip(fund_cols, funds)}
+        _write_results(out_path, fmt, frames, summary_df)
+        checkpoint = funds[0].period_checkpoint(df[period_col])
+        if checkpoint_path is not None and checkpoint is not None:
+            checkpoint_path.write_text(checkpoint.to_json())
+        rows = summary_df.to_dict("records")
+        error = ""
+    except Exception as e:
+        rows = [{"Fund": ""}]
+        error = f"{type(e).__name__}: {e}"
+
+    seconds = time.perf_counter() - started
+    for row in rows:
+        row.update({"File": str(path), "Seconds": seconds, "Error": error})
+    return rows
+
+
+def run_batch(paths, out_dir: Path, params: FeeParams, first_row_is_base: bool = True,
+              all_columns: bool = False, fmt: str = "xlsx", workers: Optional[int] = None,
+              log=None, checkpoint_dir: Optional[Path] = None) -> pd.DataFrame:
+    """Process every file in `paths` into `out_dir`; returns the consolidated summary."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if checkpoint_dir is not None:
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [(path, out_dir / name, params, first_row_is_base, all_columns, fmt,
+             checkpoint_dir / f"{Path(name).stem.removesuffix('_fees')}.checkpoint.json" if checkpoint_dir else None)
+            for path, name in zip(paths, output_names(paths, fmt))]
+    workers = min(workers or os.cpu_count() or 1, max(1, len(jobs)))
+
+    rows_by_file = [None] * len(jobs)
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(process_file, *job): i for i, job in enumerate(jobs)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                rows_by_file[i] = future.result()
+                if log:
+                    log(done, len(jobs), rows_by_file[i])
+    else:
+        for i, job in enumerate(jobs):
+            rows_by_file[i] = process_file(*job)
+            if log:
+                log(i + 1, len(jobs), rows_by_file[i])
+
+    rows = [row for file_rows in rows_by_file for row in file_rows]
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Gross-to-net fee calculation over many return files.")
+    parser.add_argument("inputs", nargs="+", help="files, directories or glob patterns (quote globs)")
+    parser.add_argument("--out", default="fee_results", help="output directory (default: fee_results)")
+    parser.add_argument("--config", help="JSON or TOML file of fee parameters")
+    parser.add_argument("--mgmt-fee", type=float, help="management fee %% (annual)")
+    parser.add_argument("--carry", dest="carry_pct", type=float, help="carry %%")
+    parser.add_argument("--hurdle", dest="hurdle_rate", type=float, help="hurdle rate %% (annual)")
+    parser.add_argument("--mgmt-freq", choices=FREQUENCIES)
+    parser.add_argument("--pfm-freq", choices=FREQUENCIES)
+    parser.add_argument("--crystal-freq", choices=FREQUENCIES)
+    parser.add_argument("--hwm", dest="use_hwm", action=argparse.BooleanOptionalAction, default=None,
+                        help="apply a high water mark (default: on)")
+    parser.add_argument("--first-row-is-base", action=argparse.BooleanOptionalAction, default=None,
+                        help="treat the first row as the base row (default: on)")
+    parser.add_argument("--all-columns", action="store_true",
+                        help="every column after the first is another fund's gross returns")
+    parser.add_argument("--format", dest="fmt", choices=OUTPUT_FORMATS, default="xlsx")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count; 1 runs in-process)")
+    parser.add_argument("--checkpoints", help="directory of per-file checkpoints to resume from and update")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.checkpoints and args.all_columns:
+        print("--checkpoints works on single-fund files only; drop --all-columns.", file=sys.stderr)
+        return 2
+    config = load_config(args.config)
+    for name in [f.name for f in fields(FeeParams)] + ["first_row_is_base"]:
+        value = getattr(args, name)
+        if value is not None:
+            config[name] = value
+    first_row_is_base = config.pop("first_row_is_base", True)
+    params = FeeParams(**config)
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("No input files found.", file=sys.stderr)
+        return 2
+
+    def log(done, total, rows):
+        status = rows[0]["Error"] or f"{len(rows)} fund(s)"
+        print(f"[{done}/{total}] {rows[0]['File']}: {status} ({rows[0]['Seconds']:.2f}s)", file=sys.stderr)
+
+    out_dir = Path(args.out)
+    started = time.perf_counter()
+    summary = run_batch(paths, out_dir, params, first_row_is_base, args.all_columns, args.fmt,
+                        args.workers, log, Path(args.checkpoints) if args.checkpoints else None)
+    write_table(out_dir / f"summary.{args.fmt}", args.fmt, summary, "Summary")
+
+    failed = summary.loc[summary["Error"] != "", "File"].nunique()
+    print(f"{len(paths) - failed}/{len(paths)} files in {time.perf_counter() - started:.1f}s; "
+          f"summary written to {out_dir / f'summary.{args.fmt}'}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
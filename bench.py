@@ -0,0 +1,250 @@
+"""Benchmarks for the upload -> parse -> fee recurrence -> export pipeline.
+
+    python bench.py                                # 1e2 .. 1e7 periods, appended to bench_history.json
+    python bench.py --max-size 100000 --no-memory  # quick run
+    python bench.py --compare                      # latest entry vs the one before it
+    python bench.py --compare 3160699              # latest entry vs a given commit
+
+Stages, each on a synthetic monthly series of every size:
+
+- ``input/ingest``: `read_upload` of a two-column file (``--ingest-format``)
+- ``input/parse_numeric`` / ``input/parse_text``: `parse_returns` on a float
+  column and on a column of "1.23%" strings
+- ``accrual/recurrence`` / ``periodic/recurrence``: `run_accrual` and
+  `run_periodic`, the engines behind `streamlit_app.py` and `backup_app.py`
+- ``accrual/export`` / ``periodic/export``: `to_frame` plus `excel_bytes`
+
+Each stage is timed without tracing (best of up to ``--repeat`` runs within a
+couple of seconds), then run once more under tracemalloc for peak memory.
+Excel stages are skipped above Excel's row limit.
+
+Two more stages time `streamlit_app.py` itself in a fresh interpreter, with no
+upload: ``app/cold_start`` (importing Streamlit and the app's modules, then
+the first script run) and ``app/rerun`` (the next run, as after a widget
+change). They are checked against `STARTUP_BUDGET`; any stage over budget
+makes the run exit with status 1. ``--no-startup`` skips them.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from export import EXCEL_MAX_ROWS, csv_bytes, excel_bytes, parquet_bytes
+from fee_engine import FeeParams, run_accrual, run_periodic
+from ingest import parse_returns, read_upload
+
+SIZES = [10**k for k in range(2, 8)]
+HISTORY_FILE = "bench_history.json"
+TIME_BUDGET = 2.0
+APP_FILE = Path(__file__).parent / "streamlit_app.py"
+# Seconds; generous enough for a slow CI box, tight enough to catch a heavy import at module level
+STARTUP_BUDGET = {"cold_start": 1.5, "rerun": 0.25}
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=60)
+app.run()
+cold_start = time.perf_counter() - started
+started = time.perf_counter()
+app.run()
+print(json.dumps({"cold_start": cold_start, "rerun": time.perf_counter() - started}))
+"""
+
+
+def synthetic_series(n: int, seed: int = 0) -> pd.DataFrame:
+    # Log NAV is a noisy 5-year cycle rather than a random walk, so NAV stays
+    # finite at 1e7 periods while still crossing the HWM regularly
+    rng = np.random.default_rng(seed)
+    log_nav = 0.2 * np.sin(np.arange(n) * (2 * np.pi / 60)) + rng.normal(0.0, 0.03, n)
+    gross = np.expm1(np.diff(log_nav, prepend=0.0))
+    return pd.DataFrame({"Month": np.arange(1, n + 1), "Gross": gross})
+
+
+def synthetic_upload(df: pd.DataFrame, fmt: str) -> bytes:
+    if fmt == "xlsx":
+        return excel_bytes([("Returns", df)])
+    return csv_bytes(df) if fmt == "csv" else parquet_bytes(df)
+
+
+def measure(fn, repeat: int, memory: bool) -> dict:
+    """Best wall time of up to `repeat` calls, and peak traced allocation of one more."""
+    best = float("inf")
+    spent = 0.0
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = min(best, elapsed)
+        spent += elapsed
+        if spent > TIME_BUDGET:
+            break
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"seconds": best, "peak_mb": None if peak is None else peak / 2**20}
+
+
+def stages(n: int, ingest_format: str):
+    """(engine, stage, callable) for one series length."""
+    df = synthetic_series(n)
+    returns = df["Gross"].to_numpy()
+    idx = np.arange(n)
+    months = (idx % 12 + 1).astype(np.int8)
+    year_end = months == 12
+    params = FeeParams()
+    excel_ok = n < EXCEL_MAX_ROWS
+
+    if ingest_format != "xlsx" or excel_ok:
+        upload = synthetic_upload(df, ingest_format)
+        yield "input", "ingest", lambda: read_upload(upload, f"bench.{ingest_format}", 2)
+    yield "input", "parse_numeric", lambda: parse_returns(df["Gross"])
+    text = pd.Series([f"{v * 100:.4f}%" for v in returns], dtype=object)
+    yield "input", "parse_text", lambda: parse_returns(text)
+
+    engines = {
+        "accrual": lambda: run_accrual(returns, months, year_end, params, True),
+        "periodic": lambda: run_periodic(returns, months, year_end, params, False),
+    }
+    for engine, run in engines.items():
+        yield engine, "recurrence", run
+        if excel_ok:
+            result = run()
+            yield engine, "export", lambda result=result: excel_bytes([("Results", result.to_frame(df["Month"]))])
+
+
+def run_benchmarks(sizes, repeat: int = 5, memory: bool = True, ingest_format: str = "xlsx", log=None) -> list:
+    results = []
+    for n in sizes:
+        for engine, stage, fn in stages(n, ingest_format):
+            row = {"engine": engine, "stage": stage, "size": n, **measure(fn, repeat, memory)}
+            row["rows_per_sec"] = n / row["seconds"] if row["seconds"] > 0 else None
+            results.append(row)
+            if log:
+                log(row)
+    return results
+
+
+def run_startup(repeat: int = 3, log=None) -> list:
+    """Best of `repeat` fresh-interpreter timings of the app's cold start and rerun."""
+    best = {}
+    for _ in range(max(1, repeat)):
+        out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, str(APP_FILE)], capture_output=True,
+                             text=True, check=True, cwd=APP_FILE.parent).stdout
+        for stage, seconds in json.loads(out.strip().splitlines()[-1]).items():
+            best[stage] = min(best.get(stage, float("inf")), seconds)
+    results = []
+    for stage, seconds in best.items():
+        row = {"engine": "app", "stage": stage, "size": 0, "seconds": seconds, "peak_mb": None,
+               "rows_per_sec": None, "budget": STARTUP_BUDGET[stage]}
+        results.append(row)
+        if log:
+            log(row)
+    return results
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, cwd=Path(__file__).parent,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def environment() -> dict:
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+    }
+
+
+def load_history(path: Path) -> list:
+    return json.loads(path.read_text()) if path.exists() else []
+
+
+def compare(old: dict, new: dict) -> pd.DataFrame:
+    """Side-by-side seconds and peak memory of two history entries; ratio > 1 means slower."""
+    key = ["engine", "stage", "size"]
+    a = pd.DataFrame(old["results"]).set_index(key)
+    b = pd.DataFrame(new["results"]).set_index(key)
+    out = pd.DataFrame({
+        "old s": a["seconds"],
+        "new s": b["seconds"],
+        "time ratio": b["seconds"] / a["seconds"],
+        "old MB": a["peak_mb"].astype(float),
+        "new MB": b["peak_mb"].astype(float),
+    })
+    return out.dropna(subset=["time ratio"])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ingest, parsing, both fee engines and export.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="series lengths (default: 1e2..1e7)")
+    parser.add_argument("--max-size", type=int, help="drop sizes above this")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage, within a ~2s budget")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--ingest-format", choices=["xlsx", "csv", "parquet"], default="xlsx")
+    parser.add_argument("--no-startup", action="store_true", help="skip the app cold start and rerun stages")
+    parser.add_argument("--history", default=HISTORY_FILE, help=f"JSON history file (default: {HISTORY_FILE})")
+    parser.add_argument("--compare", nargs="?", const="", metavar="COMMIT",
+                        help="compare the latest entry with COMMIT's (default: the previous entry) and exit")
+    args = parser.parse_args(argv)
+    history_path = Path(args.history)
+    history = load_history(history_path)
+
+    if args.compare is not None:
+        if len(history) < 2:
+            print("Need at least two history entries to compare.", file=sys.stderr)
+            return 2
+        new = history[-1]
+        older = [e for e in history[:-1] if e["commit"].startswith(args.compare)] if args.compare else history[:-1]
+        if not older:
+            print(f"No history entry for commit {args.compare}.", file=sys.stderr)
+            return 2
+        for label, entry in (("old", older[-1]), ("new", new)):
+            print(f"{label}: {entry['commit']}{' (dirty)' if entry['dirty'] else ''} at {entry['timestamp']}")
+        with pd.option_context("display.width", 200, "display.max_rows", None):
+            print(compare(older[-1], new).round(4).to_string())
+        return 0
+
+    sizes = [n for n in args.sizes if args.max_size is None or n <= args.max_size]
+
+    def log(row):
+        if row["engine"] == "app":
+            over = " OVER BUDGET" if row["seconds"] > row["budget"] else ""
+            print(f"{row['engine']:>8}/{row['stage']:<14}: {row['seconds']:.4f}s "
+                  f"(budget {row['budget']:.2f}s){over}", file=sys.stderr)
+            return
+        memory = "" if row["peak_mb"] is None else f", peak {row['peak_mb']:.1f} MB"
+        print(f"{row['engine']:>8}/{row['stage']:<14} n={row['size']:>10,}: {row['seconds']:.4f}s "
+              f"({row['rows_per_sec']:,.0f} rows/s{memory})", file=sys.stderr)
+
+    results = [] if args.no_startup else run_startup(min(args.repeat, 3), log)
+    results += run_benchmarks(sizes, args.repeat, not args.no_memory, args.ingest_format, log)
+    entry = {**environment(), "ingest_format": args.ingest_format, "results": results}
+    history.append(entry)
+    history_path.write_text(json.dumps(history, indent=1))
+    print(f"Appended {len(entry['results'])} results for {entry['commit']} to {history_path}", file=sys.stderr)
+    return 1 if any(row["seconds"] > row.get("budget", float("inf")) for row in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Wall time and peak memory of each stage of a calculator run.
+
+    with stage_log.stage("fee_recurrence") as record:
+        result = run_accrual(...)
+        record["Rows"] = len(result)
+
+Every stage is written as one JSON line to the ``fee_calculator.stages``
+logger (stderr unless the deployment configures that logger) and kept on the
+session's `StageLog` for the app's diagnostics panel. Peak memory comes from
+tracemalloc, which slows allocation-heavy code while it runs, so it is only
+measured once `set_memory_tracing(True)` has been called; tracing is
+process-wide, so stages running at the same time in other sessions share one
+peak. Stages are meant to run one after another, not nested.
+"""
+import json
+import logging
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+STAGE_COLUMNS = ["Run", "Stage", "Seconds", "Peak MiB", "Rows"]
+
+
+def _stage_logger() -> logging.Logger:
+    logger = logging.getLogger("fee_calculator.stages")
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+logger = _stage_logger()
+
+
+def set_memory_tracing(on: bool):
+    if on and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not on and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+class StageLog:
+    """Stage records of a session's recent runs, newest last."""
+
+    def __init__(self, max_records: int = 200):
+        self.records = deque(maxlen=max_records)
+        self.run = 0
+        self.session = uuid.uuid4().hex[:8]
+
+    def new_run(self):
+        self.run += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the block; yields its record so the block can fill in "Rows"."""
+        record = {"Run": self.run, "Stage": name, "Seconds": None, "Peak MiB": None, "Rows": None}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["Seconds"] = time.perf_counter() - started
+            if tracing and tracemalloc.is_tracing():
+                record["Peak MiB"] = max(0, tracemalloc.get_traced_memory()[1] - baseline) / 2**20
+            if record["Rows"] is not None:
+                record["Rows"] = int(record["Rows"])
+            self.records.append(record)
+            logger.info(json.dumps({
+                "event": "stage",
+                "session": self.session,
+                "run": record["Run"],
+                "stage": name,
+                "seconds": round(record["Seconds"], 6),
+                "peak_mib": None if record["Peak MiB"] is None else round(record["Peak MiB"], 3),
+                "rows": record["Rows"],
+            }))
+
+    def frame(self, run=None) -> pd.DataFrame:
+        """Records of one run (default: all kept), as a table."""
+        records = [r for r in list(self.records) if run is None or r["Run"] == run]
+        return pd.DataFrame(records, columns=STAGE_COLUMNS).astype({"Rows": "Int64"})
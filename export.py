@@ -0,0 +1,115 @@
+"""Download artifacts for result tables: Excel, CSV and Parquet.
+
+Excel is written with xlsxwriter in constant-memory mode: rows are streamed
+to the sheet one at a time and flushed, so a sheet never exists as a second
+in-memory object model next to the DataFrame.
+"""
+import datetime
+import io
+from typing import Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MIME = "text/csv"
+PARQUET_MIME = "application/vnd.apache.parquet"
+
+ROW_BLOCK = 10_000
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def _cell_values(series: pd.Series) -> list:
+    # Python values xlsxwriter can write directly; blanks (NaN/NaT) become None
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.dt.tz_localize(None) if series.dt.tz is not None else series
+        return [None if v is pd.NaT else v.to_pydatetime() for v in values]
+    if pd.api.types.is_float_dtype(series):
+        arr = series.to_numpy()
+        missing = ~np.isfinite(arr)
+        if missing.any():
+            out = arr.astype(object)
+            out[missing] = None
+            return out.tolist()
+        return arr.tolist()
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series.tolist()
+    values = series.tolist()
+    for i, v in enumerate(values):
+        if v is None or v is pd.NaT or (isinstance(v, float) and not np.isfinite(v)):
+            values[i] = None
+        elif isinstance(v, pd.Timestamp):
+            values[i] = v.tz_localize(None).to_pydatetime() if v.tzinfo else v.to_pydatetime()
+        elif not isinstance(v, (str, int, float, bool, datetime.date, datetime.time)):
+            values[i] = str(v)
+    return values
+
+
+def _write_sheet(workbook, name: str, df: pd.DataFrame, header_format):
+    if len(df) + 1 > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(df):,} rows don't fit on an Excel sheet ({EXCEL_MAX_ROWS - 1:,} max); "
+                         "export as CSV or Parquet instead.")
+    ws = workbook.add_worksheet(name)
+    ws.write_row(0, 0, [str(c) for c in df.columns], header_format)
+    # Convert a block of rows at a time so only one block of Python values is alive
+    for start in range(0, len(df), ROW_BLOCK):
+        block = df.iloc[start:start + ROW_BLOCK]
+        columns = [_cell_values(block[c]) for c in block.columns]
+        for i, row in enumerate(zip(*columns), start=start + 1):
+            ws.write_row(i, 0, row)
+    ws.freeze_panes(1, 0)
+
+
+def excel_sheet_names(names) -> list:
+    # Excel caps sheet names at 31 chars, bans []:*?/\ and needs them unique
+    used = {"summary"}
+    out = []
+    for name in names:
+        base = "".join("_" if ch in '[]:*?/\\' else ch for ch in str(name)).strip() or "Fund"
+        candidate, n = base[:31], 1
+        while candidate.lower() in used:
+            n += 1
+            suffix = f" ({n})"
+            candidate = base[:31 - len(suffix)] + suffix
+        used.add(candidate.lower())
+        out.append(candidate)
+    return out
+
+
+def excel_bytes(sheets: Iterable[Tuple[str, pd.DataFrame]]) -> bytes:
+    """Workbook with one sheet per (name, frame), streamed in constant memory.
+
+    `sheets` may be a generator; each frame is only needed while its own
+    sheet is being written.
+    """
+    import xlsxwriter
+
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {
+        "constant_memory": True,
+        "default_date_format": "yyyy-mm-dd",
+    })
+    header_format = workbook.add_format({"bold": True, "border": 1})
+    for name, df in sheets:
+        _write_sheet(workbook, name, df, header_format)
+    workbook.close()
+    return output.getvalue()
+
+
+def csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def parquet_bytes(df: pd.DataFrame) -> bytes:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type label columns (e.g. dates and text in "Month") go out as text
+        mixed = {c: df[c].astype(str).where(df[c].notna(), None) for c in df.columns if df[c].dtype == object}
+        table = pa.Table.from_pandas(df.assign(**mixed), preserve_index=False)
+    output = io.BytesIO()
+    pq.write_table(table, output)
+    return output.getvalue()
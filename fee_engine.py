@@ -0,0 +1,964 @@
+"""Array-based gross-to-net fee engines shared by the Streamlit calculators.
+
+`run_accrual` is the monthly-accrual / add-back recurrence used by
+`streamlit_app.py`; `run_periodic` is the periodic-charge recurrence used by
+`backup_app.py`. Both take NumPy arrays (returns, month numbers, year-end
+flags) plus a `FeeParams` and return a preallocated struct-of-arrays result.
+"""
+import json
+from dataclasses import asdict, dataclass, fields, replace
+from itertools import repeat
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+FREQUENCIES = ("Monthly", "Quarterly", "Yearly")
+PERIODS_PER_YEAR = {"Monthly": 12, "Quarterly": 4, "Yearly": 1}
+
+
+@dataclass(frozen=True)
+class FeeParams:
+    # Percent inputs exactly as entered in the UI (1.5 means 1.5%)
+    mgmt_fee: float = 1.5
+    carry_pct: float = 10.0
+    hurdle_rate: float = 0.0
+    mgmt_freq: str = "Monthly"
+    pfm_freq: str = "Yearly"
+    crystal_freq: str = "Yearly"
+    use_hwm: bool = True
+
+    @property
+    def carry_decimal(self) -> float:
+        return self.carry_pct / 100.0
+
+
+def calc_mask(freq: str, months: np.ndarray, year_end: np.ndarray, month_end=None) -> np.ndarray:
+    """Boolean schedule of the periods on which a fee with frequency `freq` is charged.
+
+    Every row is a month unless `month_end` flags which rows end one (see
+    `PeriodCalendar.schedule`).
+    """
+    months = np.asarray(months)
+    if freq == "Monthly":
+        return np.ones(len(months), dtype=bool) if month_end is None else np.asarray(month_end, dtype=bool).copy()
+    if freq == "Quarterly":
+        return months % 3 == 0 if month_end is None else np.asarray(month_end, dtype=bool) & (months % 3 == 0)
+    if freq == "Yearly":
+        return np.asarray(year_end, dtype=bool).copy()
+    return np.zeros(len(months), dtype=bool)
+
+
+def _active_rows(returns: np.ndarray, start_idx: int) -> np.ndarray:
+    # Rows with a missing return are skipped entirely, as in the original loop
+    rows = np.arange(start_idx, len(returns))
+    return rows[~np.isnan(returns[start_idx:])]
+
+
+def _row_days(days, rows):
+    # Days each used row covers, counted from the previous used row so that
+    # the days of skipped rows aren't lost
+    if days is None:
+        return None
+    days = np.asarray(days, dtype=np.float64)
+    if len(rows) == 0:
+        return np.zeros(0)
+    elapsed = np.cumsum(days)[rows]
+    return np.diff(elapsed, prepend=elapsed[0] - days[rows[0]])
+
+
+def _column_days(days, rows, valid):
+    # _row_days per column of a batch: each fund counts from its own previous
+    # return, and rows it skips cover no days
+    if days is None:
+        return None
+    own = np.asarray(days, dtype=np.float64)[rows][:, None]
+    elapsed = np.cumsum(_row_days(days, rows))[:, None]
+    seen = np.maximum.accumulate(np.where(valid, elapsed, -np.inf), axis=0)
+    previous = np.concatenate([np.full_like(seen[:1], -np.inf), seen[:-1]])
+    return np.where(valid, np.where(np.isinf(previous), own, elapsed - previous), 0.0)
+
+
+def _fee_rates(mgmt_fee, hurdle_rate, mgmt_on, days=None):
+    """Management rate per charge and hurdle per period, as decimals.
+
+    Monthly series charge 1/12 of the annual rate. With `days`, fees accrue
+    by day count (Act/365): a management charge covers every day since the
+    previous one and the hurdle scales with each period's length.
+    """
+    mgmt_fee = np.asarray(mgmt_fee, dtype=np.float64) / 100.0
+    hurdle_rate = np.asarray(hurdle_rate, dtype=np.float64) / 100.0
+    if days is None:
+        return mgmt_fee / 12.0, hurdle_rate / 12.0
+    elapsed = np.cumsum(days, axis=0)
+    if mgmt_on.ndim == 2 and days.ndim == 1:
+        elapsed, days = elapsed[:, None], days[:, None]
+    charged_at = np.maximum.accumulate(np.where(mgmt_on, elapsed, 0.0), axis=0)
+    since = elapsed - np.concatenate([np.zeros_like(charged_at[:1]), charged_at[:-1]])
+    return mgmt_fee * since / 365.0, hurdle_rate * days / 365.0
+
+
+# ---------------------------------------------------------------------------
+# Monthly-accrual / add-back engine (streamlit_app.py)
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class AccrualCheckpoint:
+    """Carried state of `run_accrual` after its last period.
+
+    Passing it as `resume=` continues the recurrence on an upload holding
+    only the following periods. `period_index` counts the input rows seen so
+    far (base row excluded); rows without a date are numbered on from it, so
+    build the resumed calendar with `period_calendar(periods, -period_index)`.
+    """
+    current_value: float
+    hwm: float
+    prev_accrued_pf: float
+    period_index: int
+    params: FeeParams
+    last_period: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps({"kind": "accrual_checkpoint", "version": 1, **asdict(self)}, indent=1)
+
+    @classmethod
+    def from_json(cls, text) -> "AccrualCheckpoint":
+        try:
+            data = json.loads(text)
+            if data.pop("kind", None) != "accrual_checkpoint" or data.pop("version", None) != 1:
+                raise ValueError
+            data["params"] = FeeParams(**data["params"])
+            return cls(**data)
+        except (ValueError, TypeError, KeyError):
+            raise ValueError("Not a fee calculator checkpoint file.")
+
+    def check_continues(self, periods):
+        """ValueError if dated `periods` start on or before the last checkpointed period."""
+        if self.last_period is None or len(periods) == 0:
+            return
+        last = pd.to_datetime(self.last_period, errors="coerce")
+        first = pd.to_datetime(pd.Series(periods).iloc[0], errors="coerce")
+        if pd.notna(last) and pd.notna(first) and first <= last:
+            raise ValueError(f"Upload starts at {pd.Series(periods).iloc[0]}, but the checkpoint "
+                             f"already covers up to {self.last_period}.")
+
+
+ACCRUAL_COLUMNS = [
+    ("beginning_nav", "Beginning NAV"),
+    ("pnl", "P&L (Before Mgmt)"),
+    ("addback_pf", "Add Back Uncryst PF"),
+    ("adjusted_gav", "Adjusted GAV"),
+    ("mgmt_fee", "Mgmt Fee"),
+    ("mgmt_charged", "Mgmt Charged?"),
+    ("nav_before_pf", "NAV before PF"),
+    ("accrued_pf", "Accrued PF (Liability)"),
+    ("incremental_pf", "Incremental PF (Δ Liability)"),
+    ("cumulative_uncryst_pf", "Cumulative Uncryst PF"),
+    ("crystallized", "Crystallized?"),
+    ("crystallization_amount", "Crystallization Amount (Reset)"),
+    ("closing_nav", "Closing NAV"),
+    ("net_return_pct", "Net Return %"),
+    ("hwm", "HWM"),
+]
+
+
+@dataclass
+class AccrualResult:
+    """Struct-of-arrays accrual output.
+
+    Arrays are 1-D (periods,) for a single fund, or 2-D (periods, funds) for a
+    batch run; `valid` then marks which cells hold a real period for each fund.
+    """
+    row: np.ndarray
+    gross_return: np.ndarray
+    beginning_nav: np.ndarray
+    pnl: np.ndarray
+    addback_pf: np.ndarray
+    adjusted_gav: np.ndarray
+    mgmt_fee: np.ndarray
+    mgmt_charged: np.ndarray
+    nav_before_pf: np.ndarray
+    accrued_pf: np.ndarray
+    incremental_pf: np.ndarray
+    cumulative_uncryst_pf: np.ndarray
+    crystallized: np.ndarray
+    crystallization_amount: np.ndarray
+    closing_nav: np.ndarray
+    net_return_pct: np.ndarray
+    hwm: np.ndarray
+    starting_value: float = 1.0
+    valid: Optional[np.ndarray] = None
+    checkpoint: Optional[AccrualCheckpoint] = None
+
+    @classmethod
+    def empty(cls, shape, starting_value: float = 1.0) -> "AccrualResult":
+        arrays = {name: np.zeros(shape) for name in ("gross_return",) + tuple(a for a, _ in ACCRUAL_COLUMNS)}
+        arrays["mgmt_charged"] = np.zeros(shape, dtype=bool)
+        arrays["crystallized"] = np.zeros(shape, dtype=bool)
+        n = shape if isinstance(shape, int) else shape[0]
+        return cls(row=np.zeros(n, dtype=np.int64), starting_value=starting_value, **arrays)
+
+    def __len__(self) -> int:
+        return len(self.row)
+
+    @property
+    def n_funds(self) -> int:
+        return 1 if self.closing_nav.ndim == 1 else self.closing_nav.shape[1]
+
+    @property
+    def total_mgmt_fees(self) -> float:
+        return float(np.nansum(self.mgmt_fee, dtype=np.float64))
+
+    @property
+    def total_crystallized(self) -> float:
+        return float(np.nansum(self.crystallization_amount, dtype=np.float64))
+
+    @property
+    def uncrystallized_pf(self) -> float:
+        return float(self.cumulative_uncryst_pf[-1]) if len(self) else 0.0
+
+    @property
+    def final_nav(self) -> float:
+        return float(self.closing_nav[-1]) if len(self) else self.starting_value
+
+    def fund(self, j: int) -> "AccrualResult":
+        """Single-fund view of column `j` of a batch result, gaps dropped."""
+        keep = self.valid[:, j]
+        arrays = {f.name: getattr(self, f.name)[keep, j] for f in fields(self)
+                  if f.name not in ("row", "starting_value", "valid", "checkpoint")}
+        return AccrualResult(row=self.row[keep], starting_value=self.starting_value, **arrays)
+
+    def period_checkpoint(self, periods) -> AccrualCheckpoint:
+        """`checkpoint` labelled with the last period of `periods` this run used."""
+        if self.checkpoint is None or not len(self):
+            return self.checkpoint
+        label = pd.Series(periods).iloc[self.row[-1]]
+        # A missing label leaves the continuity check nothing to compare against
+        return replace(self.checkpoint, last_period=None if pd.isna(label) else str(label))
+
+    def astype(self, dtype) -> "AccrualResult":
+        """Copy with every float array stored as `dtype`, e.g. float32 to halve a long result."""
+        arrays = {f.name: getattr(self, f.name) for f in fields(self)}
+        for name, value in arrays.items():
+            if isinstance(value, np.ndarray) and value.dtype.kind == "f":
+                arrays[name] = value.astype(dtype, copy=False)
+        return AccrualResult(**arrays)
+
+    def to_frame(self, periods, return_label: str = "Input Return %") -> pd.DataFrame:
+        """Per-period table; the columns wrap this result's arrays rather than copying them."""
+        periods = pd.Series(periods)
+        data = {
+            "Month": periods.iloc[self.row].to_numpy(),
+            return_label: self.gross_return * 100,
+        }
+        for attr, label in ACCRUAL_COLUMNS:
+            data[label] = getattr(self, attr)
+        return pd.DataFrame(data, copy=False)
+
+    def summary(self, name) -> dict:
+        """Headline figures of a single-fund result."""
+        return {
+            "Fund": name,
+            "Periods": len(self),
+            "Avg Net Return %": float(np.mean(self.net_return_pct)) if len(self) else np.nan,
+            "Total Mgmt Fees": self.total_mgmt_fees,
+            "Total Crystallization Amount": self.total_crystallized,
+            "Uncrystallized PF": self.uncrystallized_pf,
+            "Final NAV": self.final_nav,
+        }
+
+    def summary_frame(self, names) -> pd.DataFrame:
+        """One row of headline figures per fund of a batch result."""
+        return pd.DataFrame([self.fund(j).summary(name) for j, name in enumerate(names)])
+
+
+def _per_period(values, n, ndim=0):
+    # Per-period values for a kernel loop. Constants (the monthly case) are
+    # repeated lazily rather than expanded into n-long lists.
+    if np.ndim(values) > ndim:
+        return np.asarray(values).tolist()
+    return repeat(np.asarray(values, dtype=np.float64).tolist(), n)
+
+
+def _accrual_states(r, mgmt_on, cryst_on, rate, carry, hurdle, use_hwm, start,
+                    opening_out, addback_out, accrued_out, hwm_out, hwm_start=None, accrued_start=0.0):
+    # Only the carried state is sequential; everything else is derived from it.
+    # `rate` and `hurdle` may be per period. Returns the state after the last period.
+    r = r.tolist()
+    mgmt_on = mgmt_on.tolist()
+    cryst_on = cryst_on.tolist()
+    rate = _per_period(rate, len(r))
+    hurdle = _per_period(hurdle, len(r))
+    current_value = start
+    hwm = start if hwm_start is None else hwm_start
+    prev_accrued_pf = accrued_start
+    for i, period_rate, period_hurdle in zip(range(len(r)), rate, hurdle):
+        opening_nav = current_value
+        adj_gav = opening_nav + opening_nav * r[i] + prev_accrued_pf
+        nav_before_pf = adj_gav - adj_gav * period_rate if mgmt_on[i] else adj_gav
+
+        if use_hwm:
+            accrued_pf = max(0.0, (nav_before_pf - hwm)) * carry
+        else:
+            period_ret = (nav_before_pf / opening_nav - 1.0) if opening_nav > 0 else 0.0
+            accrued_pf = opening_nav * max(0.0, period_ret - period_hurdle) * carry
+
+        opening_out[i] = opening_nav
+        addback_out[i] = prev_accrued_pf
+        accrued_out[i] = accrued_pf
+
+        closing_nav = nav_before_pf - accrued_pf
+        if cryst_on[i] and accrued_pf > 0:
+            prev_accrued_pf = 0.0
+            if use_hwm:
+                hwm = closing_nav
+        else:
+            prev_accrued_pf = accrued_pf
+
+        hwm_out[i] = hwm
+        current_value = closing_nav
+    return current_value, hwm, prev_accrued_pf
+
+
+def _accrual_states_2d(r, valid, mgmt_on, cryst_on, rate, carry, hurdle, use_hwm, start,
+                       opening_out, addback_out, accrued_out, hwm_out):
+    # Same recurrence as _accrual_states, advanced one period at a time across
+    # every column. Masks and rates may be per period, per column, or both.
+    k = valid.shape[1]
+    rate = np.broadcast_to(rate, valid.shape)
+    hurdle = np.broadcast_to(hurdle, valid.shape)
+    current_value = np.full(k, start, dtype=np.float64)
+    hwm = current_value.copy()
+    prev_accrued_pf = np.zeros(k)
+    has_gaps = not valid.all()
+    for t in range(r.shape[0]):
+        opening_nav = current_value
+        adj_gav = opening_nav + opening_nav * r[t] + prev_accrued_pf
+        nav_before_pf = np.where(mgmt_on[t], adj_gav - adj_gav * rate[t], adj_gav)
+
+        if use_hwm:
+            accrued_pf = np.maximum(0.0, nav_before_pf - hwm) * carry
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                period_ret = np.where(opening_nav > 0, nav_before_pf / opening_nav - 1.0, 0.0)
+            accrued_pf = opening_nav * np.maximum(0.0, period_ret - hurdle[t]) * carry
+
+        opening_out[t] = opening_nav
+        addback_out[t] = prev_accrued_pf
+        accrued_out[t] = accrued_pf
+
+        closing_nav = nav_before_pf - accrued_pf
+        reset = cryst_on[t] & (accrued_pf > 0)
+        if has_gaps:
+            # A missing return (or a lot not yet subscribed) leaves that column's state untouched
+            live = valid[t]
+            reset = reset & live
+        next_accrued = np.where(reset, 0.0, accrued_pf)
+        if use_hwm:
+            hwm = np.where(reset, closing_nav, hwm)
+        if has_gaps:
+            next_accrued = np.where(live, next_accrued, prev_accrued_pf)
+            closing_nav = np.where(live, closing_nav, current_value)
+
+        hwm_out[t] = hwm
+        prev_accrued_pf = next_accrued
+        current_value = closing_nav
+
+
+def _derive_accrual(res, sl, r, mgmt_on, cryst_on, mgmt_rate):
+    # Fill every non-state column of `res[sl]` from the carried state
+    opening = res.beginning_nav[sl]
+    addback = res.addback_pf[sl]
+    accrued = res.accrued_pf[sl]
+    res.gross_return[sl] = r
+    np.multiply(opening, r, out=res.pnl[sl])
+    res.adjusted_gav[sl] = opening + res.pnl[sl] + addback
+    res.mgmt_fee[sl] = np.where(mgmt_on, res.adjusted_gav[sl] * mgmt_rate, 0.0)
+    res.mgmt_charged[sl] = mgmt_on
+    np.subtract(res.adjusted_gav[sl], res.mgmt_fee[sl], out=res.nav_before_pf[sl])
+    np.subtract(accrued, addback, out=res.incremental_pf[sl])
+    np.subtract(res.nav_before_pf[sl], accrued, out=res.closing_nav[sl])
+
+    reset = cryst_on & (accrued > 0)
+    res.crystallized[sl] = cryst_on
+    res.crystallization_amount[sl] = np.where(reset, accrued, 0.0)
+    res.cumulative_uncryst_pf[sl] = np.where(reset, 0.0, accrued)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        res.net_return_pct[sl] = np.where(opening > 0, (res.closing_nav[sl] / opening - 1.0) * 100.0, 0.0)
+
+
+def _accrual_base_row(res, starting_value):
+    res.row[0] = 0
+    for attr in ("beginning_nav", "adjusted_gav", "nav_before_pf", "closing_nav", "hwm"):
+        getattr(res, attr)[0] = starting_value
+
+
+def _check_resume(resume: AccrualCheckpoint, params: FeeParams, days):
+    if days is not None:
+        raise ValueError("Checkpoints cover monthly series only; run a daily, weekly or irregular series "
+                         "over its whole history.")
+    if resume.params != params:
+        raise ValueError("Fee terms differ from the ones the checkpoint was calculated with.")
+
+
+def run_accrual(returns, months, year_end, params: FeeParams, first_row_is_base: bool = True,
+                starting_value: float = 1.0, resume: Optional[AccrualCheckpoint] = None,
+                month_end=None, days=None) -> AccrualResult:
+    """Gross-to-net with monthly PF accrual, add-back and crystallization resets.
+
+    `month_end` and `days` (from `PeriodCalendar.schedule`) run a daily,
+    weekly or irregular series: fees are charged at real month, quarter and
+    year ends and accrue by day count. With `resume`, `returns` are the periods following that checkpoint: there
+    is no base row, the state carries on from it and the result matches the
+    tail of one run over the whole history. Day-count runs depend on state a
+    checkpoint doesn't hold (days since the last charge, whether the last row
+    really ended a month), so they can't resume and their `checkpoint` is None.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    state = dict(hwm_start=None, accrued_start=0.0)
+    if resume is not None:
+        _check_resume(resume, params, days)
+        first_row_is_base = False
+        starting_value = resume.current_value
+        state = dict(hwm_start=resume.hwm, accrued_start=resume.prev_accrued_pf)
+    start_idx = 1 if first_row_is_base else 0
+    rows = _active_rows(returns, start_idx)
+    base = 1 if first_row_is_base and len(returns) > 0 else 0
+
+    res = AccrualResult.empty(base + len(rows), starting_value)
+    if base:
+        _accrual_base_row(res, starting_value)
+
+    sl = slice(base, None)
+    r = returns[rows]
+    months = np.asarray(months)[rows]
+    year_end = np.asarray(year_end, dtype=bool)[rows]
+    month_end = None if month_end is None else np.asarray(month_end, dtype=bool)[rows]
+    mgmt_on = calc_mask(params.mgmt_freq, months, year_end, month_end)
+    cryst_on = calc_mask(params.crystal_freq, months, year_end, month_end)
+
+    mgmt_rate, hurdle_period = _fee_rates(params.mgmt_fee, params.hurdle_rate, mgmt_on, _row_days(days, rows))
+
+    current_value, hwm, prev_accrued_pf = _accrual_states(
+        r, mgmt_on, cryst_on, mgmt_rate, params.carry_decimal, hurdle_period, params.use_hwm, starting_value,
+        res.beginning_nav[sl], res.addback_pf[sl], res.accrued_pf[sl], res.hwm[sl], **state)
+    res.row[sl] = rows
+    _derive_accrual(res, sl, r, mgmt_on, cryst_on, mgmt_rate)
+    if days is None:
+        res.checkpoint = AccrualCheckpoint(
+            current_value=current_value,
+            hwm=hwm,
+            prev_accrued_pf=prev_accrued_pf,
+            period_index=(resume.period_index if resume else 0) + max(0, len(returns) - start_idx),
+            params=params,
+            last_period=resume.last_period if resume else None,
+        )
+    return res
+
+
+def run_accrual_batch(returns, months, year_end, params: FeeParams, first_row_is_base: bool = True,
+                      starting_value: float = 1.0, month_end=None, days=None) -> AccrualResult:
+    """`run_accrual` over a (periods, funds) matrix of gross returns in one pass.
+
+    Every column shares the period calendar and fee terms. A missing return
+    skips that period for that fund only; `result.fund(j)` matches what
+    `run_accrual` gives for column `j` on its own.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    if returns.ndim == 1:
+        returns = returns[:, None]
+    n, k = returns.shape
+    start_idx = 1 if first_row_is_base else 0
+    rows = np.arange(start_idx, n)
+    rows = rows[~np.isnan(returns[start_idx:]).all(axis=1)]
+    base = 1 if first_row_is_base and n > 0 else 0
+
+    res = AccrualResult.empty((base + len(rows), k), starting_value)
+    res.valid = np.ones((base + len(rows), k), dtype=bool)
+    if base:
+        _accrual_base_row(res, starting_value)
+
+    sl = slice(base, None)
+    r = returns[rows]
+    valid = ~np.isnan(r)
+    res.valid[sl] = valid
+    months = np.asarray(months)[rows]
+    year_end = np.asarray(year_end, dtype=bool)[rows]
+    month_end = None if month_end is None else np.asarray(month_end, dtype=bool)[rows]
+    mgmt_on = calc_mask(params.mgmt_freq, months, year_end, month_end)[:, None]
+    cryst_on = calc_mask(params.crystal_freq, months, year_end, month_end)[:, None]
+
+    if days is None:
+        mgmt_rate, hurdle_period = _fee_rates(params.mgmt_fee, params.hurdle_rate, mgmt_on)
+    else:
+        # Day counts run per fund, so a fund missing a month-end row carries
+        # those days into its next charge as run_accrual does
+        mgmt_rate, hurdle_period = _fee_rates(params.mgmt_fee, params.hurdle_rate, mgmt_on & valid,
+                                              _column_days(days, rows, valid))
+
+    _accrual_states_2d(r, valid, mgmt_on, cryst_on, mgmt_rate, params.carry_decimal, hurdle_period,
+                       params.use_hwm, starting_value,
+                       res.beginning_nav[sl], res.addback_pf[sl], res.accrued_pf[sl], res.hwm[sl])
+    res.row[sl] = rows
+    _derive_accrual(res, sl, r, mgmt_on, cryst_on, mgmt_rate)
+    return res
+
+
+def run_accrual_grid(returns, months, year_end, mgmt_fee, carry_pct, hurdle_rate,
+                     mgmt_freq, crystal_freq, use_hwm: bool = True,
+                     first_row_is_base: bool = True, starting_value: float = 1.0,
+                     month_end=None, days=None) -> AccrualResult:
+    """`run_accrual` for one return series under k fee-term combinations at once.
+
+    `mgmt_fee` .. `crystal_freq` are length-k sequences; column j of the 2-D
+    result is the run under the j-th entry of each.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    mgmt_fee = np.asarray(mgmt_fee, dtype=np.float64)
+    carry = np.asarray(carry_pct, dtype=np.float64) / 100.0
+    hurdle_rate = np.asarray(hurdle_rate, dtype=np.float64)
+    k = len(mgmt_fee)
+    start_idx = 1 if first_row_is_base else 0
+    rows = _active_rows(returns, start_idx)
+    base = 1 if first_row_is_base and len(returns) > 0 else 0
+
+    res = AccrualResult.empty((base + len(rows), k), starting_value)
+    res.valid = np.ones((base + len(rows), k), dtype=bool)
+    if base:
+        _accrual_base_row(res, starting_value)
+
+    sl = slice(base, None)
+    r = returns[rows][:, None]
+    months = np.asarray(months)[rows]
+    year_end = np.asarray(year_end, dtype=bool)[rows]
+    month_end = None if month_end is None else np.asarray(month_end, dtype=bool)[rows]
+    masks = {freq: calc_mask(freq, months, year_end, month_end) for freq in set(mgmt_freq) | set(crystal_freq)}
+    mgmt_on = np.stack([masks[freq] for freq in mgmt_freq], axis=1) if k else np.zeros((len(rows), 0), bool)
+    cryst_on = np.stack([masks[freq] for freq in crystal_freq], axis=1) if k else np.zeros((len(rows), 0), bool)
+
+    mgmt_rate, hurdle_period = _fee_rates(mgmt_fee, hurdle_rate, mgmt_on, _row_days(days, rows))
+
+    _accrual_states_2d(r, res.valid[sl], mgmt_on, cryst_on, mgmt_rate, carry, hurdle_period,
+                       use_hwm, starting_value,
+                       res.beginning_nav[sl], res.addback_pf[sl], res.accrued_pf[sl], res.hwm[sl])
+    res.row[sl] = rows
+    _derive_accrual(res, sl, r, mgmt_on, cryst_on, mgmt_rate)
+    return res
+
+
+def run_accrual_lots(returns, months, year_end, params: FeeParams, start_rows, amounts,
+                     first_row_is_base: bool = True, month_end=None, days=None) -> AccrualResult:
+    """Series accounting: `run_accrual` for every investor lot of one fund at once.
+
+    Lot j subscribes `amounts[j]` and takes part from input row
+    `start_rows[j]` on, with its own HWM, accrued PF and crystallization
+    state. Columns of the 2-D result are lots; `valid` marks the periods each
+    lot was invested, and `result.fund(j)` is lot j's own history.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    start_rows = np.asarray(start_rows, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    rows = _active_rows(returns, 1 if first_row_is_base else 0)
+
+    res = AccrualResult.empty((len(rows), len(amounts)))
+    # A lot's state is held at its subscription amount until it is invested
+    res.valid = rows[:, None] >= start_rows[None, :]
+    r = returns[rows][:, None]
+    months = np.asarray(months)[rows]
+    year_end = np.asarray(year_end, dtype=bool)[rows]
+    month_end = None if month_end is None else np.asarray(month_end, dtype=bool)[rows]
+    mgmt_on = calc_mask(params.mgmt_freq, months, year_end, month_end)[:, None]
+    cryst_on = calc_mask(params.crystal_freq, months, year_end, month_end)[:, None]
+
+    if days is None:
+        mgmt_rate, hurdle_period = _fee_rates(params.mgmt_fee, params.hurdle_rate, mgmt_on)
+    else:
+        # A lot's day count starts at its subscription, not the fund's previous charge
+        mgmt_rate, hurdle_period = _fee_rates(params.mgmt_fee, params.hurdle_rate, mgmt_on & res.valid,
+                                              _column_days(days, rows, res.valid))
+
+    _accrual_states_2d(r, res.valid, mgmt_on, cryst_on, mgmt_rate, params.carry_decimal, hurdle_period,
+                       params.use_hwm, amounts,
+                       res.beginning_nav, res.addback_pf, res.accrued_pf, res.hwm)
+    res.row[:] = rows
+    _derive_accrual(res, slice(None), r, mgmt_on, cryst_on, mgmt_rate)
+    return res
+
+
+def _layer_states(r, mgmt_on, cryst_on, rate, carry, hurdle, use_hwm, start,
+                  gross_out, opening_out, addback_out, accrued_out, hwm_out):
+    # _accrual_states for a stack of layers, all advanced in the same period
+    # loop; each layer's net return is the next layer's gross return.
+    # Per-layer arguments are sequences (rates may also be per period),
+    # outputs (periods, layers).
+    n_layers = len(carry)
+    rate = _per_period(rate, len(r), ndim=1)
+    hurdle = _per_period(hurdle, len(r), ndim=1)
+    r = r.tolist()
+    mgmt_on = mgmt_on.tolist()
+    cryst_on = cryst_on.tolist()
+    current_value = [start] * n_layers
+    hwm = [start] * n_layers
+    prev_accrued_pf = [0.0] * n_layers
+    # Row-major flat buffers; scalar writes into 2-D arrays would dominate the loop
+    gross, opening, addback, accrued, hwms = ([0.0] * (len(r) * n_layers) for _ in range(5))
+    cell = 0
+    for i, period_rate, period_hurdle in zip(range(len(r)), rate, hurdle):
+        layer_return = r[i]
+        for j in range(n_layers):
+            opening_nav = current_value[j]
+            adj_gav = opening_nav + opening_nav * layer_return + prev_accrued_pf[j]
+            nav_before_pf = adj_gav - adj_gav * period_rate[j] if mgmt_on[i][j] else adj_gav
+
+            if use_hwm[j]:
+                accrued_pf = max(0.0, (nav_before_pf - hwm[j])) * carry[j]
+            else:
+                period_ret = (nav_before_pf / opening_nav - 1.0) if opening_nav > 0 else 0.0
+                accrued_pf = opening_nav * max(0.0, period_ret - period_hurdle[j]) * carry[j]
+
+            gross[cell] = layer_return
+            opening[cell] = opening_nav
+            addback[cell] = prev_accrued_pf[j]
+            accrued[cell] = accrued_pf
+
+            closing_nav = nav_before_pf - accrued_pf
+            if cryst_on[i][j] and accrued_pf > 0:
+                prev_accrued_pf[j] = 0.0
+                if use_hwm[j]:
+                    hwm[j] = closing_nav
+            else:
+                prev_accrued_pf[j] = accrued_pf
+
+            hwms[cell] = hwm[j]
+            current_value[j] = closing_nav
+            layer_return = (closing_nav / opening_nav - 1.0) if opening_nav > 0 else 0.0
+            cell += 1
+
+    for out, values in ((gross_out, gross), (opening_out, opening), (addback_out, addback),
+                        (accrued_out, accrued), (hwm_out, hwms)):
+        out[:] = np.reshape(values, out.shape)
+
+
+def run_accrual_layers(returns, months, year_end, layers, first_row_is_base: bool = True,
+                       starting_value: float = 1.0, month_end=None, days=None) -> AccrualResult:
+    """Fee waterfall: `run_accrual` through a stack of fee layers in one pass.
+
+    `layers` is a sequence of `FeeParams`, outermost last (e.g. master,
+    feeder, platform). Layer 0 is charged on `returns`; every later layer on
+    the net return of the one before. Column j of the 2-D result is layer j,
+    its NAV starting at `starting_value`.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    k = len(layers)
+    start_idx = 1 if first_row_is_base else 0
+    rows = _active_rows(returns, start_idx)
+    base = 1 if first_row_is_base and len(returns) > 0 else 0
+
+    res = AccrualResult.empty((base + len(rows), k), starting_value)
+    res.valid = np.ones((base + len(rows), k), dtype=bool)
+    if base:
+        _accrual_base_row(res, starting_value)
+
+    sl = slice(base, None)
+    months = np.asarray(months)[rows]
+    year_end = np.asarray(year_end, dtype=bool)[rows]
+    month_end = None if month_end is None else np.asarray(month_end, dtype=bool)[rows]
+    masks = {freq: calc_mask(freq, months, year_end, month_end)
+             for freq in {p.mgmt_freq for p in layers} | {p.crystal_freq for p in layers}}
+    mgmt_on = np.stack([masks[p.mgmt_freq] for p in layers], axis=1) if k else np.zeros((len(rows), 0), bool)
+    cryst_on = np.stack([masks[p.crystal_freq] for p in layers], axis=1) if k else np.zeros((len(rows), 0), bool)
+
+    mgmt_rate, hurdle_period = _fee_rates([p.mgmt_fee for p in layers], [p.hurdle_rate for p in layers],
+                                          mgmt_on, _row_days(days, rows))
+
+    _layer_states(returns[rows], mgmt_on, cryst_on, mgmt_rate, [p.carry_decimal for p in layers],
+                  hurdle_period, [p.use_hwm for p in layers], starting_value,
+                  res.gross_return[sl], res.beginning_nav[sl], res.addback_pf[sl], res.accrued_pf[sl], res.hwm[sl])
+    res.row[sl] = rows
+    _derive_accrual(res, sl, res.gross_return[sl].copy(), mgmt_on, cryst_on, mgmt_rate)
+    return res
+
+
+def layer_frame(result: AccrualResult, periods, names, return_label: str = "Input Return %") -> pd.DataFrame:
+    """Per-period table of a `run_accrual_layers` result: fees, NAV and net return of every layer."""
+    data = {
+        "Month": pd.Series(periods).iloc[result.row].to_numpy(),
+        return_label: result.gross_return[:, 0] * 100 if result.n_funds else np.zeros(len(result)),
+    }
+    for j, name in enumerate(names):
+        data[f"{name} Mgmt Fee"] = result.mgmt_fee[:, j]
+        data[f"{name} Accrued PF"] = result.accrued_pf[:, j]
+        data[f"{name} Crystallization Amount"] = result.crystallization_amount[:, j]
+        data[f"{name} NAV"] = result.closing_nav[:, j]
+        data[f"{name} Net Return %"] = result.net_return_pct[:, j]
+    return pd.DataFrame(data, copy=False)
+
+
+def _accrual_gross_steps(n, mgmt_on, cryst_on, rate, carry, hurdle, use_hwm, start, gross_out,
+                         hwm_start=None, accrued_start=0.0):
+    # Closing NAV is continuous and piecewise linear in NAV before PF: slope 1
+    # up to the HWM (or hurdle) threshold K, 1 - carry above it. So each
+    # period inverts in closed form: B = C if C <= K else (C - carry*K) / (1 - carry).
+    n = n.tolist()
+    mgmt_on = mgmt_on.tolist()
+    cryst_on = cryst_on.tolist()
+    rate = _per_period(rate, len(n))
+    hurdle = _per_period(hurdle, len(n))
+    current_value = start
+    hwm = start if hwm_start is None else hwm_start
+    prev_accrued_pf = accrued_start
+    for i, period_rate, period_hurdle in zip(range(len(n)), rate, hurdle):
+        opening_nav = current_value
+        if opening_nav <= 0:
+            raise ValueError("Net NAV falls to zero or below; gross returns can't be recovered past that point.")
+        closing_nav = opening_nav * (1.0 + n[i])
+        threshold = hwm if use_hwm else opening_nav * (1.0 + period_hurdle)
+        if closing_nav <= threshold:
+            nav_before_pf = closing_nav
+        elif carry < 1.0:
+            nav_before_pf = (closing_nav - carry * threshold) / (1.0 - carry)
+        else:
+            raise ValueError("With 100% carry no net return above the high water mark or hurdle is reachable.")
+        adj_gav = nav_before_pf / (1.0 - period_rate) if mgmt_on[i] else nav_before_pf
+        gross_out[i] = (adj_gav - opening_nav - prev_accrued_pf) / opening_nav
+
+        accrued_pf = nav_before_pf - closing_nav
+        if cryst_on[i] and accrued_pf > 0:
+            prev_accrued_pf = 0.0
+            if use_hwm:
+                hwm = closing_nav
+        else:
+            prev_accrued_pf = accrued_pf
+        current_value = closing_nav
+
+
+def accrual_gross_from_net(net_returns, months, year_end, params: FeeParams, first_row_is_base: bool = True,
+                           starting_value: float = 1.0, resume: Optional[AccrualCheckpoint] = None,
+                           month_end=None, days=None) -> np.ndarray:
+    """Gross returns that `run_accrual` turns into `net_returns` (decimals).
+
+    Solved one period at a time in closed form, O(n) with no root finding.
+    Missing returns and the base row are passed through unchanged, so the
+    output can go straight back into `run_accrual` with the same arguments.
+    """
+    net_returns = np.asarray(net_returns, dtype=np.float64)
+    state = dict(hwm_start=None, accrued_start=0.0)
+    if resume is not None:
+        _check_resume(resume, params, days)
+        first_row_is_base = False
+        starting_value = resume.current_value
+        state = dict(hwm_start=resume.hwm, accrued_start=resume.prev_accrued_pf)
+    rows = _active_rows(net_returns, 1 if first_row_is_base else 0)
+    months = np.asarray(months)[rows]
+    year_end = np.asarray(year_end, dtype=bool)[rows]
+    month_end = None if month_end is None else np.asarray(month_end, dtype=bool)[rows]
+
+    mgmt_on = calc_mask(params.mgmt_freq, months, year_end, month_end)
+    mgmt_rate, hurdle_period = _fee_rates(params.mgmt_fee, params.hurdle_rate, mgmt_on, _row_days(days, rows))
+
+    gross = net_returns.copy()
+    solved = np.empty(len(rows))
+    _accrual_gross_steps(net_returns[rows], mgmt_on, calc_mask(params.crystal_freq, months, year_end, month_end),
+                         mgmt_rate, params.carry_decimal, hurdle_period, params.use_hwm,
+                         starting_value, solved, **state)
+    gross[rows] = solved
+    return gross
+
+
+# ---------------------------------------------------------------------------
+# Periodic-charge engine (backup_app.py)
+# ---------------------------------------------------------------------------
+
+PERIODIC_COLUMNS = [
+    ("gross_value", "Gross"),
+    ("mgmt_fee", "Mgmt Fee"),
+    ("mgmt_charged", "Mgmt Charged?"),
+    ("after_mgmt", "After Mgmt"),
+    ("hurdle_met", "Hurdle Met"),
+    ("perf_paid", "Perf Paid"),
+    ("net_value", "Net Value"),
+    ("return_pct", "Return %"),
+    ("hwm", "HWM"),
+]
+
+
+@dataclass
+class PeriodicResult:
+    row: np.ndarray
+    gross_return: np.ndarray
+    beginning_value: np.ndarray
+    gross_value: np.ndarray
+    mgmt_fee: np.ndarray
+    mgmt_charged: np.ndarray
+    after_mgmt: np.ndarray
+    perf_fee_base: np.ndarray
+    perf_paid: np.ndarray
+    net_value: np.ndarray
+    return_pct: np.ndarray
+    hwm: np.ndarray
+    hurdle_met: np.ndarray
+    starting_value: float = 1.0
+
+    @classmethod
+    def empty(cls, n: int, starting_value: float = 1.0) -> "PeriodicResult":
+        names = ("gross_return", "beginning_value", "gross_value", "mgmt_fee", "after_mgmt",
+                 "perf_fee_base", "perf_paid", "net_value", "return_pct", "hwm")
+        arrays = {name: np.zeros(n) for name in names}
+        arrays["mgmt_charged"] = np.zeros(n, dtype=bool)
+        arrays["hurdle_met"] = np.zeros(n, dtype=bool)
+        return cls(row=np.zeros(n, dtype=np.int64), starting_value=starting_value, **arrays)
+
+    def __len__(self) -> int:
+        return len(self.row)
+
+    @property
+    def total_mgmt_fees(self) -> float:
+        return float(np.sum(self.mgmt_fee))
+
+    @property
+    def total_perf_fees(self) -> float:
+        return float(np.sum(self.perf_paid))
+
+    @property
+    def final_value(self) -> float:
+        return float(self.net_value[-1])
+
+    def to_frame(self, periods) -> pd.DataFrame:
+        periods = pd.Series(periods)
+        data = {"Month": periods.iloc[self.row].to_numpy(), "Input": self.gross_return}
+        for attr, label in PERIODIC_COLUMNS:
+            data[label] = getattr(self, attr)
+        data["Hurdle Met"] = np.where(self.hurdle_met, "✓", "")
+        return pd.DataFrame(data, copy=False)
+
+
+def _periodic_states(r, fee_applied, perf_on, carry, hurdle, use_hwm, start,
+                     beginning_out, perf_paid_out, hwm_out):
+    r = r.tolist()
+    fee_applied = fee_applied.tolist()
+    perf_on = perf_on.tolist()
+    current_value = start
+    hwm = start
+    for i in range(len(r)):
+        value_after_mgmt = current_value * (1 + r[i] + fee_applied[i])
+        perf_fee_paid = 0.0
+        if perf_on[i]:
+            if use_hwm:
+                if value_after_mgmt > hwm:
+                    perf_fee_paid = (value_after_mgmt - hwm) * carry
+                    value_after_mgmt -= perf_fee_paid
+                    hwm = value_after_mgmt
+            else:
+                period_return = (value_after_mgmt - current_value) / current_value if current_value > 0 else 0
+                if period_return > hurdle:
+                    perf_fee_paid = current_value * (period_return - hurdle) * carry
+                    value_after_mgmt -= perf_fee_paid
+
+        beginning_out[i] = current_value
+        perf_paid_out[i] = perf_fee_paid
+        hwm_out[i] = hwm
+        current_value = value_after_mgmt
+
+
+def run_periodic(returns, months, year_end, params: FeeParams,
+                 first_row_is_base: bool = False, starting_value: float = 1.0, month_end=None) -> PeriodicResult:
+    """Gross-to-net charging mgmt and performance fees on their own schedules.
+
+    On a non-monthly dated series pass `PeriodCalendar.month_end`, so fees are
+    charged on the rows that end a month, quarter or year rather than every row.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    start_idx = 1 if first_row_is_base else 0
+    rows = _active_rows(returns, start_idx)
+    base = 1 if first_row_is_base and len(returns) > 0 else 0
+
+    mgmt_rate = params.mgmt_fee / 100 / PERIODS_PER_YEAR.get(params.mgmt_freq, 1)
+    hurdle_period = params.hurdle_rate / 100 / PERIODS_PER_YEAR.get(params.pfm_freq, 1)
+
+    res = PeriodicResult.empty(base + len(rows), starting_value)
+    if base:
+        res.row[0] = 0
+        res.gross_return[0] = returns[0]
+        for attr in ("beginning_value", "gross_value", "after_mgmt", "net_value", "hwm"):
+            getattr(res, attr)[0] = starting_value
+        res.hurdle_met[0] = 0.0 > hurdle_period
+
+    sl = slice(base, None)
+    r = returns[rows]
+    months = np.asarray(months)[rows]
+    year_end = np.asarray(year_end, dtype=bool)[rows]
+    month_end = None if month_end is None else np.asarray(month_end, dtype=bool)[rows]
+    mgmt_on = calc_mask(params.mgmt_freq, months, year_end, month_end)
+    perf_on = calc_mask(params.pfm_freq, months, year_end, month_end)
+    fee_applied = np.where(mgmt_on, -mgmt_rate, 0.0)
+
+    beginning = res.beginning_value[sl]
+    perf_paid = res.perf_paid[sl]
+    _periodic_states(r, fee_applied, perf_on, params.carry_decimal, hurdle_period,
+                     params.use_hwm, starting_value, beginning, perf_paid, res.hwm[sl])
+
+    res.row[sl] = rows
+    res.gross_return[sl] = r
+    res.gross_value[sl] = beginning * (1 + r)
+    res.mgmt_charged[sl] = mgmt_on
+    res.mgmt_fee[sl] = np.abs(fee_applied * beginning)
+    after_mgmt = beginning * (1 + r + fee_applied)
+    res.after_mgmt[sl] = after_mgmt
+    np.subtract(after_mgmt, perf_paid, out=res.net_value[sl])
+
+    if params.use_hwm:
+        hwm_before = np.concatenate(([starting_value], res.hwm[:-1]))[sl]
+        charged = perf_on & (after_mgmt > hwm_before)
+        res.perf_fee_base[sl] = np.where(charged, after_mgmt - hwm_before, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        res.return_pct[sl] = np.where(beginning > 0, (res.net_value[sl] - beginning) / beginning * 100, 0.0)
+        res.hurdle_met[sl] = (after_mgmt - beginning) / beginning > hurdle_period
+    return res
+
+
+def _periodic_gross_steps(n, fee_applied, perf_on, carry, hurdle, use_hwm, start, gross_out):
+    # Inverse of _periodic_states: above the HWM (or hurdle) threshold K the net
+    # value is after_mgmt - carry * (after_mgmt - K), which solves in closed form.
+    n = n.tolist()
+    fee_applied = fee_applied.tolist()
+    perf_on = perf_on.tolist()
+    current_value = start
+    hwm = start
+    for i in range(len(n)):
+        if current_value <= 0:
+            raise ValueError("Net value falls to zero or below; gross returns can't be recovered past that point.")
+        net_value = current_value * (1.0 + n[i])
+        after_mgmt = net_value
+        if perf_on[i]:
+            threshold = hwm if use_hwm else current_value * (1.0 + hurdle)
+            if net_value > threshold:
+                if carry >= 1.0:
+                    raise ValueError("With 100% carry no net return above the high water mark or hurdle is reachable.")
+                after_mgmt = (net_value - carry * threshold) / (1.0 - carry)
+                if use_hwm:
+                    hwm = net_value
+        gross_out[i] = after_mgmt / current_value - 1.0 - fee_applied[i]
+        current_value = net_value
+
+
+def periodic_gross_from_net(net_returns, months, year_end, params: FeeParams,
+                            first_row_is_base: bool = False, starting_value: float = 1.0,
+                            month_end=None) -> np.ndarray:
+    """Gross returns that `run_periodic` turns into `net_returns`; see `accrual_gross_from_net`."""
+    net_returns = np.asarray(net_returns, dtype=np.float64)
+    rows = _active_rows(net_returns, 1 if first_row_is_base else 0)
+    months = np.asarray(months)[rows]
+    year_end = np.asarray(year_end, dtype=bool)[rows]
+    month_end = None if month_end is None else np.asarray(month_end, dtype=bool)[rows]
+    mgmt_rate = params.mgmt_fee / 100 / PERIODS_PER_YEAR.get(params.mgmt_freq, 1)
+    hurdle_period = params.hurdle_rate / 100 / PERIODS_PER_YEAR.get(params.pfm_freq, 1)
+
+    gross = net_returns.copy()
+    solved = np.empty(len(rows))
+    _periodic_gross_steps(net_returns[rows],
+                          np.where(calc_mask(params.mgmt_freq, months, year_end, month_end), -mgmt_rate, 0.0),
+                          calc_mask(params.pfm_freq, months, year_end, month_end), params.carry_decimal, hurdle_period,
+                          params.use_hwm, starting_value, solved)
+    gross[rows] = solved
+    return gross
@@ -0,0 +1,209 @@
+"""Local JSON HTTP service for the gross-to-net calculator.
+
+    python fee_service.py --port 8502 --workers 4
+
+POST /accrual with a JSON body::
+
+    {
+      "returns": [0.0, 0.012, -0.004, ...],      # decimals; null skips a period
+      "periods": ["2020-01-31", ...],             # optional, same length as returns
+      "params": {"mgmt_fee": 1.5, "carry_pct": 10, ...},   # FeeParams fields
+      "first_row_is_base": true,
+      "starting_value": 1.0,
+      "series": true,                             # false returns the summary only
+      "checkpoint": {...}                         # optional, resume after a previous response
+    }
+
+runs the `streamlit_app.py` accrual recurrence and answers with the summary
+metrics, (by default) the per-period NAV series and a `checkpoint` that can
+be sent back with the next periods to continue the run (null for a daily,
+weekly or irregular series, which can't be resumed). Calculations run on a
+bounded process pool; once `max_pending` requests are queued or running, further ones get
+503 with Retry-After. Every response carries a `Server-Timing` header
+(parse, queue, compute, encode) and `X-Response-Time` in milliseconds.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+
+import numpy as np
+import pandas as pd
+import tornado.web
+
+from fee_engine import FREQUENCIES, AccrualCheckpoint, FeeParams, run_accrual
+from periods import period_calendar
+
+SERIES_FIELDS = ["row", "gross_return", "beginning_nav", "mgmt_fee", "accrued_pf",
+                 "crystallization_amount", "closing_nav", "net_return_pct", "hwm"]
+MAX_BODY_BYTES = 64 * 2**20
+
+
+def _fee_params(raw) -> FeeParams:
+    raw = raw or {}
+    if not isinstance(raw, dict):
+        raise ValueError("'params' must be an object")
+    types = {f.name: type(f.default) for f in fields(FeeParams)}
+    unknown = sorted(set(raw) - set(types))
+    if unknown:
+        raise ValueError(f"Unknown params: {', '.join(unknown)}")
+    for name, value in raw.items():
+        if types[name] is float and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"'{name}' must be a number")
+        if types[name] is str and value not in FREQUENCIES:
+            raise ValueError(f"'{name}' must be one of {', '.join(FREQUENCIES)}")
+        if types[name] is bool and not isinstance(value, bool):
+            raise ValueError(f"'{name}' must be true or false")
+    return FeeParams(**{name: float(v) if types[name] is float else v for name, v in raw.items()})
+
+
+def calculate(payload: dict) -> dict:
+    """Run one request body through `run_accrual`; ValueError for a bad request."""
+    if not isinstance(payload, dict) or not isinstance(payload.get("returns"), list):
+        raise ValueError("Body must be an object with a 'returns' array")
+    try:
+        returns = np.array(payload["returns"], dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("'returns' must contain only numbers or nulls")
+    if returns.ndim != 1:
+        raise ValueError("'returns' must be a flat array")
+
+    periods = payload.get("periods")
+    if periods is None:
+        periods = pd.Series(np.full(len(returns), np.nan))
+    elif not isinstance(periods, list) or len(periods) != len(returns):
+        raise ValueError("'periods' must be an array the same length as 'returns'")
+
+    params = _fee_params(payload.get("params"))
+    first_row_is_base = bool(payload.get("first_row_is_base", True))
+    starting_value = payload.get("starting_value", 1.0)
+    if isinstance(starting_value, bool) or not isinstance(starting_value, (int, float)) or starting_value <= 0:
+        raise ValueError("'starting_value' must be a positive number")
+
+    resume = None
+    if payload.get("checkpoint") is not None:
+        resume = AccrualCheckpoint.from_json(json.dumps(payload["checkpoint"]))
+        if isinstance(periods, list):
+            resume.check_continues(periods)
+
+    calendar = period_calendar(periods, -resume.period_index if resume else 1 if first_row_is_base else 0)
+    result = run_accrual(returns, calendar.month, calendar.year_end, params,
+                         first_row_is_base, float(starting_value), resume=resume, **calendar.schedule)
+    body = {
+        "summary": {
+            "periods": len(result),
+            "avg_net_return_pct": float(np.mean(result.net_return_pct)) if len(result) else None,
+            "total_mgmt_fees": result.total_mgmt_fees,
+            "total_crystallized": result.total_crystallized,
+            "uncrystallized_pf": result.uncrystallized_pf,
+            "final_nav": result.final_nav,
+        },
+    }
+    checkpoint = result.period_checkpoint(periods) if isinstance(periods, list) else result.checkpoint
+    # Day-count series can't be resumed, so they get no checkpoint
+    body["checkpoint"] = None if checkpoint is None else json.loads(checkpoint.to_json())
+    if payload.get("series", True):
+        body["series"] = {name: getattr(result, name).tolist() for name in SERIES_FIELDS}
+    return body
+
+
+def _timed_calculate(payload: dict):
+    # Runs in the worker; the compute time is measured there so queueing isn't counted
+    started = time.perf_counter()
+    body = calculate(payload)
+    return body, time.perf_counter() - started
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self):
+        self._started = time.perf_counter()
+        self._timings = []
+
+    def mark(self, name: str, seconds: float):
+        self._timings.append(f"{name};dur={seconds * 1000:.2f}")
+
+    def write_error(self, status_code: int, **kwargs):
+        self.write_json(status_code, {"error": self._reason})
+
+    def write_json(self, status: int, body: dict):
+        started = time.perf_counter()
+        text = json.dumps(body, allow_nan=False)
+        self.mark("encode", time.perf_counter() - started)
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.set_header("Server-Timing", ", ".join(self._timings))
+        self.set_header("X-Response-Time", f"{(time.perf_counter() - self._started) * 1000:.2f}")
+        self.finish(text)
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write_json(200, {"status": "ok", **self.application.settings["load"]})
+
+
+class AccrualHandler(BaseHandler):
+    async def post(self):
+        started = time.perf_counter()
+        try:
+            payload = json.loads(self.request.body)
+        except ValueError:
+            self.mark("parse", time.perf_counter() - started)
+            return self.write_json(400, {"error": "Body is not valid JSON"})
+        self.mark("parse", time.perf_counter() - started)
+
+        # Handlers all run on the one event-loop thread, so a plain counter is enough
+        load = self.application.settings["load"]
+        if load["pending"] >= load["max_pending"]:
+            self.set_header("Retry-After", "1")
+            return self.write_json(503, {"error": "Too many requests queued; retry shortly"})
+
+        queued = time.perf_counter()
+        load["pending"] += 1
+        try:
+            body, compute = await asyncio.get_running_loop().run_in_executor(
+                self.application.settings["pool"], _timed_calculate, payload)
+        except ValueError as e:
+            self.mark("queue", time.perf_counter() - queued)
+            return self.write_json(400, {"error": str(e)})
+        finally:
+            load["pending"] -= 1
+        self.mark("queue", time.perf_counter() - queued - compute)
+        self.mark("compute", compute)
+        try:
+            self.write_json(200, body)
+        except ValueError:
+            self.write_json(422, {"error": "Result contains non-finite values"})
+
+
+def make_app(workers: int = None, max_pending: int = None) -> tornado.web.Application:
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 8 * workers
+    return tornado.web.Application(
+        [(r"/accrual", AccrualHandler), (r"/health", HealthHandler)],
+        pool=ProcessPoolExecutor(workers),
+        load={"pending": 0, "max_pending": max_pending, "workers": workers},
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON HTTP service for the gross-to-net calculator.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--workers", type=int, help="calculation processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, help="requests queued or running before 503 (default: 8 per worker)")
+    args = parser.parse_args(argv)
+
+    async def serve():
+        app = make_app(args.workers, args.max_pending)
+        app.listen(args.port, args.host, max_body_size=MAX_BODY_BYTES)
+        print(f"Listening on http://{args.host}:{args.port}")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Upload ingestion: read just the columns the calculator uses, as fast as possible,
+and turn the returns column into decimals.
+
+CSV, Parquet and Arrow IPC uploads are read with pyarrow; numeric columns
+come through as float64 NumPy-backed columns without any string round trip.
+For Excel, backends are tried fastest first:
+
+- ``calamine`` (optional ``python-calamine`` package): Rust reader for both
+  .xlsx and legacy .xls.
+- ``openpyxl``: streams .xlsx rows in read-only mode, stopping at the last
+  column needed.
+- ``xlrd`` (optional): legacy .xls when calamine is not installed.
+"""
+import io
+import time
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+XLS_MAGIC = b"\xd0\xcf\x11\xe0"
+PARQUET_MAGIC = b"PAR1"
+ARROW_MAGIC = b"ARROW1"
+
+UPLOAD_TYPES = ["xlsx", "xls", "csv", "parquet", "arrow", "feather", "arrows"]
+
+
+@dataclass
+class IngestStats:
+    backend: str
+    rows: int
+    columns: int
+    seconds: float
+
+    def describe(self) -> str:
+        return f"{self.rows:,} rows × {self.columns} columns via {self.backend} in {self.seconds * 1000:.0f} ms"
+
+
+def available_backends() -> list:
+    return [name for name, module in (("calamine", "python_calamine"), ("openpyxl", "openpyxl"), ("xlrd", "xlrd"))
+            if find_spec(module) is not None]
+
+
+def is_legacy_xls(data: bytes) -> bool:
+    return data[:4] == XLS_MAGIC
+
+
+def _header_names(values) -> list:
+    # Same naming pandas uses: blanks become "Unnamed: i", repeats get ".1", ".2"...
+    names, seen = [], {}
+    for i, value in enumerate(values):
+        name = f"Unnamed: {i}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _read_openpyxl(data: bytes, max_columns: Optional[int]) -> pd.DataFrame:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(max_col=max_columns, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        width = len(header)
+        while width and header[width - 1] is None:
+            width -= 1
+        columns = [[] for _ in range(width)]
+        last_filled = 0
+        for n, row in enumerate(rows, start=1):
+            filled = False
+            for j in range(width):
+                value = row[j] if j < len(row) else None
+                # Empty cells are NaN, as pandas reads them, so blank columns come out float64
+                columns[j].append(np.nan if value is None else value)
+                filled = filled or value is not None
+            if filled:
+                last_filled = n
+    finally:
+        wb.close()
+    # Trailing blank rows are formatting, not data
+    names = _header_names(header[:width])
+    return pd.DataFrame({name: pd.Series(col[:last_filled]) for name, col in zip(names, columns)})
+
+
+def _read_pandas(data: bytes, engine: str, max_columns: Optional[int]) -> pd.DataFrame:
+    usecols = list(range(max_columns)) if max_columns else None
+    try:
+        return pd.read_excel(io.BytesIO(data), engine=engine, usecols=usecols)
+    except ValueError:
+        # usecols beyond the sheet width; fall back to every column
+        return pd.read_excel(io.BytesIO(data), engine=engine)
+
+
+def read_workbook(data: bytes, max_columns: Optional[int] = None,
+                  backend: Optional[str] = None) -> Tuple[pd.DataFrame, IngestStats]:
+    """First sheet of an .xlsx/.xls upload, limited to its first `max_columns` columns."""
+    started = time.perf_counter()
+    legacy = is_legacy_xls(data)
+    if backend is None:
+        available = available_backends()
+        candidates = ["calamine", "xlrd"] if legacy else ["calamine", "openpyxl"]
+        backend = next((name for name in candidates if name in available), None)
+        if backend is None:
+            raise ValueError("Reading .xls files needs the 'python-calamine' or 'xlrd' package; "
+                             "re-save the file as .xlsx or install one of them.")
+
+    if backend == "openpyxl":
+        df = _read_openpyxl(data, max_columns)
+    else:
+        df = _read_pandas(data, backend, max_columns)
+    return df, IngestStats(backend, len(df), len(df.columns), time.perf_counter() - started)
+
+
+def _arrow_to_frame(table, max_columns: Optional[int]) -> pd.DataFrame:
+    if max_columns:
+        table = table.select(list(range(min(max_columns, table.num_columns))))
+    # split_blocks keeps each null-free numeric column as a view on the Arrow buffer
+    return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
+
+
+def _read_csv(data: bytes, max_columns: Optional[int]):
+    import csv
+    from pyarrow import csv as pa_csv
+
+    header = next(csv.reader(io.StringIO(data[:65536].decode("utf-8-sig", errors="replace"))), [])
+    convert = pa_csv.ConvertOptions(include_columns=header[:max_columns]) if max_columns and header else None
+    return pa_csv.read_csv(io.BytesIO(data), convert_options=convert)
+
+
+def _read_parquet(data: bytes, max_columns: Optional[int]):
+    import pyarrow.parquet as pq
+
+    source = pq.ParquetFile(io.BytesIO(data))
+    names = source.schema_arrow.names
+    return source.read(columns=names[:max_columns] if max_columns else None)
+
+
+def _read_ipc(data: bytes, stream: bool):
+    import pyarrow as pa
+
+    if stream:
+        return pa.ipc.open_stream(pa.BufferReader(data)).read_all()
+    return pa.ipc.open_file(pa.BufferReader(data)).read_all()
+
+
+def upload_format(data: bytes, filename: str = "") -> str:
+    """'excel', 'csv', 'parquet', 'arrow' or 'arrows', from magic bytes then extension."""
+    suffix = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if data[:4] == PARQUET_MAGIC:
+        return "parquet"
+    if data[:6] == ARROW_MAGIC:
+        return "arrow"
+    if suffix == "arrows":
+        return "arrows"
+    if suffix in ("csv", "txt"):
+        return "csv"
+    return "excel"
+
+
+def read_upload(data: bytes, filename: str = "", max_columns: Optional[int] = None,
+                backend: Optional[str] = None) -> Tuple[pd.DataFrame, IngestStats]:
+    """Any supported upload (Excel, CSV, Parquet, Arrow IPC file or stream) as a DataFrame."""
+    fmt = upload_format(data, filename)
+    if fmt == "excel":
+        return read_workbook(data, max_columns, backend)
+
+    started = time.perf_counter()
+    if fmt == "csv":
+        table = _read_csv(data, max_columns)
+    elif fmt == "parquet":
+        table = _read_parquet(data, max_columns)
+    else:
+        table = _read_ipc(data, stream=fmt == "arrows")
+    df = _arrow_to_frame(table, max_columns)
+    return df, IngestStats(f"pyarrow {fmt}", len(df), len(df.columns), time.perf_counter() - started)
+
+
+@dataclass
+class ParseStats:
+    rows: int
+    fast_path: bool       # column was already numeric, no string handling at all
+    text_cells: int       # cells that went through percent-string cleanup
+    missing: int          # empty cells
+    coerced: int          # non-empty cells that could not be read as a number
+    percent_units: bool   # values looked like percents and were divided by 100
+    max_abs: float
+
+    def describe(self) -> str:
+        units = "percent (divided by 100)" if self.percent_units else "decimal"
+        path = "numeric fast path" if self.fast_path else f"{self.text_cells:,} text cells cleaned"
+        text = f"{self.rows - self.missing - self.coerced:,} returns read ({path}); units: {units}"
+        if self.coerced:
+            text += f"; {self.coerced:,} unreadable cells set to blank"
+        return text
+
+
+_TEXT_TYPES = [str, np.str_]
+_BOOL_TYPES = [bool, np.bool_]
+
+
+def parse_returns_report(series: pd.Series) -> Tuple[pd.Series, ParseStats]:
+    """Returns column as float64 decimals, plus what it took to get there.
+
+    Numeric columns skip string handling entirely. In object columns only
+    the text cells ("7.86%", "1,234.5") are cleaned; numbers pass through.
+    If the largest absolute value exceeds 1 the column is taken to be in
+    percent units and divided by 100.
+    """
+    n = len(series)
+    missing = int(series.isna().sum())
+    text_cells = 0
+    if pd.api.types.is_bool_dtype(series):
+        values = np.full(n, np.nan)
+        fast_path = False
+    elif pd.api.types.is_numeric_dtype(series):
+        if series.dtype == np.float64:
+            values = series.to_numpy()
+        else:
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        fast_path = True
+    else:
+        values = np.full(n, np.nan)
+        inferred = pd.api.types.infer_dtype(series, skipna=True)
+        if inferred in ("string", "empty"):
+            text = series.notna().to_numpy()
+            other = np.zeros(n, dtype=bool)
+        else:
+            kinds = series.map(type)
+            text = kinds.isin(_TEXT_TYPES).to_numpy()
+            other = ~text & ~kinds.isin(_BOOL_TYPES).to_numpy()
+        if other.any():
+            values[other] = pd.to_numeric(series[other], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        if text.any():
+            text_cells = int(text.sum())
+            cleaned = series[text].str.replace(",", "", regex=False).str.strip(" \t\r\n%")
+            values[text] = pd.to_numeric(cleaned, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        fast_path = False
+
+    coerced = int(np.isnan(values).sum()) - missing
+    max_abs = float(np.nanmax(np.abs(values))) if n and coerced + missing < n else float("nan")
+    percent_units = bool(max_abs > 1)
+    if percent_units:
+        values = values / 100.0
+    stats = ParseStats(n, fast_path, text_cells, missing, coerced, percent_units, max_abs)
+    return pd.Series(values, index=series.index, name=series.name, copy=False), stats
+
+
+def parse_returns(series: pd.Series) -> pd.Series:
+    return parse_returns_report(series)[0]
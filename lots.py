@@ -0,0 +1,99 @@
+"""Per-investor lot (series) accounting.
+
+A lot table lists subscriptions: a date, an amount and optionally a name.
+Every lot is charged fees on its own money with its own HWM, accrued PF and
+crystallizations; `run_accrual_lots` advances the whole lot book one period
+at a time as a single vectorized step. A lot subscribed on a date takes part
+from the first period dated after it, so a subscription at a period's
+closing NAV starts earning the next period's return. When the periods aren't
+dates, the subscription column may instead give the input row (1 = first row
+under the header) of each lot's first period.
+"""
+import numpy as np
+import pandas as pd
+
+from fee_engine import AccrualResult
+
+
+def parse_lots(df: pd.DataFrame) -> pd.DataFrame:
+    """Lot, Subscription, Amount table from an uploaded lot sheet; ValueError if unusable.
+
+    Columns are read by position: subscription date, amount, then an
+    optional lot or investor name.
+    """
+    if len(df.columns) < 2:
+        raise ValueError("The lot table needs a subscription date and an amount column.")
+    subscription = df.iloc[:, 0]
+    amount = pd.to_numeric(df.iloc[:, 1].astype(str).str.replace(",", "").str.strip(), errors="coerce")
+    keep = subscription.notna() & amount.notna()
+    if not keep.any():
+        raise ValueError("No lots with both a subscription and an amount.")
+    if (amount[keep] <= 0).any():
+        raise ValueError("Lot amounts must be positive.")
+    names = (df.iloc[:, 2].astype(str) if len(df.columns) > 2
+             else pd.Series([f"Lot {i + 1}" for i in range(len(df))], index=df.index))
+    return pd.DataFrame({
+        "Lot": names[keep].to_numpy(),
+        "Subscription": subscription[keep].to_numpy(),
+        "Amount": amount[keep].to_numpy(dtype=np.float64),
+    })
+
+
+def lot_start_rows(subscriptions, periods) -> np.ndarray:
+    """Input row of each lot's first period."""
+    subscriptions = pd.Series(subscriptions).reset_index(drop=True)
+    if pd.api.types.is_numeric_dtype(subscriptions):
+        return subscriptions.to_numpy(dtype=np.int64) - 1
+
+    sub_dates = pd.to_datetime(subscriptions, errors="coerce")
+    if sub_dates.isna().any():
+        bad = subscriptions[sub_dates.isna()].iloc[0]
+        raise ValueError(f"Subscription '{bad}' is not a date.")
+    period_dates = pd.to_datetime(pd.Series(periods), errors="coerce")
+    if period_dates.isna().any() or not period_dates.is_monotonic_increasing:
+        raise ValueError("Dated subscriptions need a period column of ascending dates.")
+    return np.searchsorted(period_dates.to_numpy(), sub_dates.to_numpy(), side="right").astype(np.int64)
+
+
+def fund_totals_frame(result: AccrualResult, periods, return_label: str = "Input Return %") -> pd.DataFrame:
+    """One row per period of the lot book summed over the lots invested in it."""
+    valid = result.valid
+    opening = np.where(valid, result.beginning_nav, 0.0).sum(axis=1)
+    closing = np.where(valid, result.closing_nav, 0.0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        net = np.where(opening > 0, (closing / opening - 1.0) * 100.0, 0.0)
+    return pd.DataFrame({
+        "Month": pd.Series(periods).iloc[result.row].to_numpy(),
+        return_label: result.gross_return[:, 0] * 100,
+        "Lots": valid.sum(axis=1),
+        "Beginning NAV": opening,
+        "Mgmt Fee": np.where(valid, result.mgmt_fee, 0.0).sum(axis=1),
+        "Accrued PF (Liability)": np.where(valid, result.accrued_pf, 0.0).sum(axis=1),
+        "Crystallization Amount (Reset)": np.where(valid, result.crystallization_amount, 0.0).sum(axis=1),
+        "Closing NAV": closing,
+        "Net Return %": net,
+    })
+
+
+def lot_summary_frame(result: AccrualResult, lots: pd.DataFrame) -> pd.DataFrame:
+    """Headline figures per lot, from the columns of a `run_accrual_lots` result."""
+    valid = result.valid
+    n_periods = valid.sum(axis=0)
+    # Closing balances of each lot are on its last invested row
+    last = np.maximum(len(valid) - 1 - np.argmax(valid[::-1], axis=0), 0)
+    cols = np.arange(valid.shape[1])
+    invested = n_periods > 0
+    amount = lots["Amount"].to_numpy(dtype=np.float64)
+    final_nav = np.where(invested, result.closing_nav[last, cols] if len(valid) else amount, amount)
+    return pd.DataFrame({
+        "Lot": lots["Lot"].to_numpy(),
+        "Subscription": lots["Subscription"].to_numpy(),
+        "Amount": amount,
+        "Periods": n_periods,
+        "Total Mgmt Fees": np.where(valid, result.mgmt_fee, 0.0).sum(axis=0),
+        "Total Crystallization Amount": np.where(valid, result.crystallization_amount, 0.0).sum(axis=0),
+        "Uncrystallized PF": np.where(invested, result.cumulative_uncryst_pf[last, cols] if len(valid) else 0.0, 0.0),
+        "HWM": np.where(invested, result.hwm[last, cols] if len(valid) else amount, amount),
+        "Final NAV": final_nav,
+        "Net Return %": (final_nav / amount - 1.0) * 100.0,
+    })
@@ -0,0 +1,131 @@
+"""Monte Carlo fee drag: the accrual recurrence over resampled gross paths.
+
+Paths are drawn from the uploaded gross returns, either one period at a time
+(``iid``) or in circular blocks of consecutive periods (``block``) to keep
+volatility clustering and autocorrelation. Each chunk of paths is laid out
+along the column axis of `run_accrual_batch`, so a chunk is one batched
+recurrence, and only per-path totals are kept. Chunks are sized to a memory
+budget and spread over a process pool for large runs; every chunk has its own
+seed, so results don't depend on the number of workers.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from fee_engine import FeeParams, run_accrual_batch
+
+METHODS = ("iid", "block")
+MC_METRICS = ["final_nav", "gross_final_nav", "total_mgmt_fees", "total_crystallized",
+              "uncrystallized_pf", "fee_drag", "fee_drag_pa_pct"]
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Rough bytes a batched run needs per (period, path) cell: ~20 result arrays
+CELL_BYTES = 8 * 20
+CHUNK_BYTES = 64 * 2**20
+PARALLEL_MIN_CELLS = 20_000_000
+
+_setup = None
+
+
+def resample_paths(source: np.ndarray, horizon: int, n_paths: int, rng: np.random.Generator,
+                   method: str = "iid", block: int = 12) -> np.ndarray:
+    """(horizon, n_paths) matrix of returns drawn from `source`."""
+    m = len(source)
+    if method == "block" and block > 1:
+        n_blocks = -(-horizon // block)
+        starts = rng.integers(0, m, size=(n_blocks, 1, n_paths))
+        idx = (starts + np.arange(block)[None, :, None]) % m
+        idx = idx.reshape(n_blocks * block, n_paths)[:horizon]
+    else:
+        idx = rng.integers(0, m, size=(horizon, n_paths))
+    return source[idx]
+
+
+def _set_setup(setup):
+    global _setup
+    _setup = setup
+
+
+def _simulate_chunk(task) -> np.ndarray:
+    seed, n_paths = task
+    source, months, year_end, params, method, block = _setup
+    horizon = len(months)
+    paths = resample_paths(source, horizon, n_paths, np.random.default_rng(seed), method, block)
+    res = run_accrual_batch(paths, months, year_end, params, first_row_is_base=False)
+    final_nav = res.closing_nav[-1]
+    gross_final = np.prod(1.0 + paths, axis=0) * res.starting_value
+    with np.errstate(divide="ignore", invalid="ignore"):
+        years = horizon / 12.0
+        drag_pa = (np.power(gross_final / res.starting_value, 1.0 / years)
+                   - np.power(final_nav / res.starting_value, 1.0 / years)) * 100.0
+    return np.column_stack([
+        final_nav,
+        gross_final,
+        res.mgmt_fee.sum(axis=0),
+        res.crystallization_amount.sum(axis=0),
+        res.cumulative_uncryst_pf[-1],
+        gross_final - final_nav,
+        drag_pa,
+    ])
+
+
+def run_monte_carlo(returns, months, params: FeeParams, n_paths: int = 10_000, horizon: Optional[int] = None,
+                    method: str = "iid", block: int = 12, seed: int = 0, workers: Optional[int] = None,
+                    chunk_paths: Optional[int] = None, first_row_is_base: bool = False) -> pd.DataFrame:
+    """One row of `MC_METRICS` per simulated path.
+
+    `returns` are the historical gross returns (missing values dropped) and
+    `months` their month numbers; simulated paths start in the month of the
+    first return and run `horizon` periods (default: the history's length).
+    With `first_row_is_base` the first row is a starting point rather than a
+    return, so it is neither resampled nor used to place the first month.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    keep = ~np.isnan(returns)
+    if first_row_is_base:
+        keep[:1] = False
+    source = returns[keep]
+    if len(source) == 0:
+        raise ValueError("No returns to resample.")
+    horizon = horizon or len(source)
+    first_month = int(np.asarray(months)[keep][0])
+    path_months = ((first_month - 1 + np.arange(horizon)) % 12 + 1).astype(np.int8)
+    setup = (source, path_months, path_months == 12, params, method, block)
+
+    chunk_paths = chunk_paths or max(1, CHUNK_BYTES // (horizon * CELL_BYTES))
+    sizes = [min(chunk_paths, n_paths - i) for i in range(0, n_paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(seeds, sizes))
+
+    if workers is None:
+        big = horizon * n_paths >= PARALLEL_MIN_CELLS
+        workers = min(len(tasks), os.cpu_count() or 1) if big else 1
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(workers, initializer=_set_setup, initargs=(setup,)) as pool:
+            parts = list(pool.map(_simulate_chunk, tasks))
+    else:
+        _set_setup(setup)
+        parts = [_simulate_chunk(task) for task in tasks]
+
+    metrics = np.concatenate(parts) if parts else np.empty((0, len(MC_METRICS)))
+    return pd.DataFrame(metrics, columns=MC_METRICS)
+
+
+def percentile_bands(results: pd.DataFrame, percentiles=PERCENTILES) -> pd.DataFrame:
+    """Metric by percentile table, plus the mean."""
+    bands = results.quantile([p / 100 for p in percentiles]).T
+    bands.columns = [f"P{p}" for p in percentiles]
+    bands["Mean"] = results.mean()
+    return bands
+
+
+def histogram_frame(values, bins: int = 60) -> pd.DataFrame:
+    """Pre-binned counts, so a chart of a million paths ships `bins` rows."""
+    values = np.asarray(values)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    return pd.DataFrame({"start": edges[:-1], "end": edges[1:], "paths": counts})
@@ -0,0 +1,137 @@
+"""Period-column handling: parse the dates once into calendar arrays.
+
+The engines only need month numbers and period-end flags, so the whole
+period column is converted up front with vectorized `pd.to_datetime` instead
+of parsing each row inside the fee loop.
+
+Monthly series (or undated ones) treat every row as a month. Any other dated
+series (daily, weekly, quarterly or irregular) gets its month, quarter and
+year ends from the real dates, plus each row's length in days so the accrual
+engine can charge fees by day count.
+"""
+import warnings
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+EPOCH_ORDINAL = 719163  # date(1970, 1, 1).toordinal()
+
+
+@dataclass
+class PeriodCalendar:
+    month: np.ndarray        # 1..12, int8
+    year: np.ndarray         # calendar year, or 1, 2, ... for rows without a date
+    quarter_end: np.ndarray  # bool
+    year_end: np.ndarray     # bool
+    parsed: np.ndarray       # bool, False where the month was inferred from position
+    month_end: np.ndarray    # bool, last row of its calendar month
+    days: Optional[np.ndarray] = None  # days each row covers; None for monthly series
+
+    def __len__(self) -> int:
+        return len(self.month)
+
+    @property
+    def schedule(self) -> dict:
+        """Extra accrual-engine arguments for a non-monthly series (empty for monthly ones)."""
+        return {} if self.days is None else {"month_end": self.month_end, "days": self.days}
+
+
+def _months_and_years(periods: pd.Series):
+    # Float arrays with NaN wherever the period isn't a date: month, year and
+    # the date as days since 1970-01-01
+    if pd.api.types.is_datetime64_any_dtype(periods):
+        dates = periods
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", (UserWarning, FutureWarning))
+            try:
+                # Fast path: one format inferred from the first value, applied to all
+                dates = pd.to_datetime(periods, errors="coerce")
+            except (TypeError, ValueError, OverflowError):
+                dates = None
+        if dates is None or not pd.api.types.is_datetime64_any_dtype(dates):
+            # e.g. mixed UTC offsets come back as objects; let the per-value pass handle them
+            dates = pd.Series(pd.NaT, index=periods.index, dtype="datetime64[ns]")
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    month = dates.dt.month.to_numpy(dtype=np.float64, na_value=np.nan)
+    year = dates.dt.year.to_numpy(dtype=np.float64, na_value=np.nan)
+    day = dates.to_numpy(dtype="datetime64[D]")
+    day = np.where(np.isnat(day), np.nan, day.astype(np.int64))
+
+    # Values in some other format are parsed one by one, as the old loop did
+    for i in np.flatnonzero(np.isnan(month) & periods.notna().to_numpy()):
+        try:
+            ts = pd.to_datetime(periods.iat[i])
+            month[i], year[i], day[i] = ts.month, ts.year, ts.toordinal() - EPOCH_ORDINAL
+        except Exception:
+            pass
+
+    if not (pd.api.types.is_datetime64_any_dtype(periods) or pd.api.types.is_string_dtype(periods)):
+        # Numbers parse as nanoseconds since 1970, so labels like 1..N or 200001 all land on
+        # 1970-01-01; they only count as dates when they actually fall on different days
+        known = day[~np.isnan(day)]
+        if len(known) < 2 or (known == known[0]).all():
+            month[:] = year[:] = day[:] = np.nan
+    return month, year, day
+
+
+def _month_index(day: np.ndarray) -> np.ndarray:
+    # Months since 1970-01 of day numbers
+    return day.astype(np.int64).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def _is_monthly(gaps: np.ndarray) -> bool:
+    # A month apart, give or take month lengths; the odd missing month doesn't count
+    return 28 <= np.median(gaps) <= 31
+
+
+def period_calendar(periods, start_idx: int = 0) -> PeriodCalendar:
+    """Calendar arrays for a period column.
+
+    Rows whose period isn't a date fall back to counting months from
+    `start_idx`, i.e. month ((idx - start_idx) % 12) + 1. A fully dated,
+    ascending series whose rows aren't a month apart gets its period ends
+    and day counts from the dates instead.
+    """
+    periods = pd.Series(periods).reset_index(drop=True)
+    month, year, day = _months_and_years(periods)
+    parsed = ~np.isnan(month)
+
+    idx = np.arange(len(periods)) - start_idx
+    month = np.where(parsed, month, idx % 12 + 1).astype(np.int8)
+    year = np.where(parsed, year, idx // 12 + 1).astype(np.int16)
+    gaps = np.diff(day)
+    if len(periods) < 2 or not parsed.all() or (gaps < 0).any() or not np.median(gaps) > 0 or _is_monthly(gaps):
+        return PeriodCalendar(
+            month=month,
+            year=year,
+            quarter_end=month % 3 == 0,
+            year_end=month == 12,
+            parsed=parsed,
+            month_end=np.ones(len(periods), dtype=bool),
+        )
+
+    # A row ends a month (quarter, year) when the next row falls in a later
+    # one; the last row is compared with where a typical step would land,
+    # rolled on to a weekday when the series only has weekdays (Fri 29 Dec
+    # ends the year on a business-day series)
+    step = max(np.median(gaps), 1.0)
+    next_day = day[-1] + step
+    dates = day.astype(np.int64).astype("datetime64[D]")
+    if np.is_busday(dates).all():
+        next_day = np.busday_offset(np.datetime64(int(np.ceil(next_day)), "D"), 0, roll="forward").astype(np.int64)
+    month_idx = _month_index(day)
+    next_idx = _month_index(np.r_[day[1:], next_day])
+    return PeriodCalendar(
+        month=month,
+        year=year,
+        quarter_end=next_idx // 3 != month_idx // 3,
+        year_end=next_idx // 12 != month_idx // 12,
+        parsed=parsed,
+        month_end=next_idx != month_idx,
+        # The first row's own span is unknown; assume a typical step
+        days=np.r_[step, gaps].astype(np.float64),
+    )
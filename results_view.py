@@ -0,0 +1,97 @@
+"""Browser-sized views of long result tables.
+
+Only one page of rows is handed to `st.dataframe` at a time, and rounding is
+applied as a column display format rather than by copying the frame. Long
+series default to a per-quarter roll-up (or per-month or per-year) built in
+one pass with `np.*.reduceat` over the period boundaries.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from fee_engine import AccrualResult
+from periods import PeriodCalendar
+
+PAGE_ROWS = 500
+# Above this many periods the results open on the aggregated view
+AGGREGATE_MIN_ROWS = 3000
+
+VIEWS = ("Every period", "Monthly", "Quarterly", "Yearly")
+
+
+def default_view(n_rows: int) -> str:
+    return "Quarterly" if n_rows > AGGREGATE_MIN_ROWS else "Every period"
+
+
+def number_formats(df: pd.DataFrame, decimals: int = 6) -> dict:
+    """`column_config` showing every float column to `decimals` places."""
+    return {
+        col: st.column_config.NumberColumn(format=f"%.{decimals}f")
+        for col in df.columns if pd.api.types.is_float_dtype(df[col])
+    }
+
+
+def page_count(n_rows: int, page_rows: int = PAGE_ROWS) -> int:
+    return max(1, -(-n_rows // page_rows))
+
+
+def page_slice(df: pd.DataFrame, page: int, page_rows: int = PAGE_ROWS) -> pd.DataFrame:
+    """Rows of 1-based `page`."""
+    start = (page - 1) * page_rows
+    return df.iloc[start:start + page_rows]
+
+
+def aggregate_frame(result: AccrualResult, calendar: PeriodCalendar, view: str) -> pd.DataFrame:
+    """One row per calendar month, quarter or year of a single-fund accrual result.
+
+    Flows (fees, crystallizations) are summed, returns are compounded and
+    balances (NAV, uncrystallized PF, HWM) are taken at the end of the period.
+    """
+    year = calendar.year[result.row].astype(np.int64)
+    month = calendar.month[result.row].astype(np.int64)
+    suffix = None
+    if view == "Monthly":
+        suffix = np.char.add("-", np.char.zfill(month.astype(str), 2))
+        key = year * 12 + month
+    elif view == "Quarterly":
+        quarter = (month - 1) // 3 + 1
+        suffix = np.char.add(" Q", quarter.astype(str))
+        key = year * 4 + quarter
+    else:
+        key = year
+    if len(key) == 0:
+        return pd.DataFrame()
+
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    ends = np.r_[starts[1:], len(key)] - 1
+    opening = result.beginning_nav[starts]
+    closing = result.closing_nav[ends]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        net = np.where(opening > 0, (closing / opening - 1.0) * 100.0, 0.0)
+
+    labels = year[starts].astype(str)
+    if suffix is not None:
+        labels = np.char.add(labels, suffix[starts])
+    return pd.DataFrame({
+        "Period": labels,
+        "Periods": np.diff(np.r_[starts, len(key)]),
+        "Gross Return %": (np.multiply.reduceat(1.0 + result.gross_return, starts) - 1.0) * 100.0,
+        "Beginning NAV": opening,
+        "Mgmt Fee": np.add.reduceat(result.mgmt_fee, starts),
+        "Incremental PF (Δ Liability)": np.add.reduceat(result.incremental_pf, starts),
+        "Crystallization Amount (Reset)": np.add.reduceat(result.crystallization_amount, starts),
+        "Cumulative Uncryst PF": result.cumulative_uncryst_pf[ends],
+        "Closing NAV": closing,
+        "Net Return %": net,
+        "HWM": result.hwm[ends],
+    })
+
+
+def paged_dataframe(df: pd.DataFrame, key: str, decimals: int = 6):
+    """`st.dataframe` of one page of `df`, with a page picker when there is more than one."""
+    pages = page_count(len(df))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages:,}, {PAGE_ROWS} rows each)", 1, pages, 1, key=key)
+    view = page_slice(df, page)
+    st.dataframe(view, use_container_width=True, column_config=number_formats(view, decimals))
@@ -0,0 +1,100 @@
+"""Process-wide caches that survive Streamlit reruns.
+
+Every widget change reruns `streamlit_app.py` from the top, but imported
+modules stay loaded, so anything held here is reused by the next rerun (and by
+other sessions on the same server). Uploads are keyed by a hash of the file's
+bytes; results by that hash plus everything else the run depends on. Each
+cache is capped by approximate size and evicts least-recently-used entries.
+"""
+import hashlib
+import sys
+import threading
+from dataclasses import fields, is_dataclass
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+UPLOAD_CACHE_BYTES = 256 * 2**20
+RESULT_CACHE_BYTES = 256 * 2**20
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _root(array: np.ndarray) -> np.ndarray:
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def approx_nbytes(value, _seen=None) -> int:
+    """Rough in-memory size of a cached value, used to bound the caches.
+
+    A buffer shared by several parts of the value (e.g. a result and the
+    frame wrapping its arrays) is counted once.
+    """
+    seen = set() if _seen is None else _seen
+    if isinstance(value, np.ndarray):
+        root = _root(value)
+        if id(root) in seen:
+            return 0
+        seen.add(id(root))
+        return root.nbytes
+    if isinstance(value, pd.DataFrame):
+        return value.index.nbytes + sum(approx_nbytes(col.to_numpy(), seen) for _, col in value.items())
+    if isinstance(value, pd.Series):
+        return value.index.nbytes + approx_nbytes(value.to_numpy(), seen)
+    if isinstance(value, (tuple, list)):
+        return sum(approx_nbytes(v, seen) for v in value)
+    if isinstance(value, dict):
+        return sum(approx_nbytes(v, seen) for v in value.values())
+    if is_dataclass(value):
+        return sum(approx_nbytes(getattr(value, f.name), seen) for f in fields(value))
+    return sys.getsizeof(value)
+
+
+class RunCache:
+    """Thread-safe LRU cache bounded by `approx_nbytes` of its values.
+
+    Cached values are shared between reruns and sessions, so callers must
+    treat them as read-only.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=lambda v: max(1, approx_nbytes(v)))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._cache.currsize
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            try:
+                value = self._cache[key]
+                self.hits += 1
+                return value
+            except KeyError:
+                self.misses += 1
+        value = compute()
+        with self._lock:
+            try:
+                self._cache[key] = value
+            except ValueError:
+                pass  # bigger than the whole cache; just don't keep it
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+upload_cache = RunCache(UPLOAD_CACHE_BYTES)
+result_cache = RunCache(RESULT_CACHE_BYTES)
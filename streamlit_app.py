@@ -1,325 +1,646 @@
 import streamlit as st
 import pandas as pd
-import io
+import itertools
+import time
+import traceback
 import numpy as np
 import streamlit.components.v1 as components
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
+
+from analytics import WINDOWS, drawdown_summary, rolling_frame
+from diagnostics import StageLog, set_memory_tracing
+from export import CSV_MIME, PARQUET_MIME, XLSX_MIME, csv_bytes, excel_bytes, excel_sheet_names, parquet_bytes
+from fee_engine import (FREQUENCIES, AccrualCheckpoint, FeeParams, accrual_gross_from_net, layer_frame,
+                        run_accrual, run_accrual_batch, run_accrual_layers, run_accrual_lots)
+from ingest import UPLOAD_TYPES, parse_returns_report, read_upload
+from lots import fund_totals_frame, lot_start_rows, lot_summary_frame, parse_lots
+from monte_carlo import METHODS, histogram_frame, percentile_bands, run_monte_carlo
+from periods import period_calendar
+from results_view import VIEWS, aggregate_frame, default_view, number_formats, paged_dataframe
+from run_cache import content_hash, result_cache, upload_cache
+from sweep import GRID_PARAMS, SWEEP_METRICS, heatmap_frame, run_sweep, sweep_grid, value_range
 
 st.set_page_config(page_title="FoF Calculator", layout="wide")
+
+stage_log = st.session_state.setdefault("stage_log", StageLog())
+stage_log.new_run()
+with st.sidebar:
+    show_diagnostics = st.toggle(
+        "Diagnostics",
+        key="show_diagnostics",
+        on_change=lambda: set_memory_tracing(st.session_state["show_diagnostics"]),
+        help="Time and peak memory of each stage of a run; memory tracing slows calculations while this is on"
+    )
+    # Inside a container, so the fragments below may refresh it
+    diagnostics_panel = st.container().empty()
+if show_diagnostics:
+    # Tracing is process-wide, so another session may have switched it off
+    set_memory_tracing(True)
+
+def show_stages():
+    if not show_diagnostics:
+        return
+    with diagnostics_panel.container():
+        st.caption("Latest stages, newest last. Each rerun of the page or of one of its sections is a new run; "
+                   "stages served from the cache are skipped.")
+        st.dataframe(stage_log.frame().tail(15), hide_index=True)
+
+@contextmanager
+def stage(name):
+    # Every stage is logged; the sidebar panel is refreshed as each one finishes
+    with stage_log.stage(name) as record:
+        yield record
+    show_stages()
+
+show_stages()
 st.title("Investment Fund Fee Calculator")
 
 st.subheader("💰 Fund Fee Mechanism")
 
-# STATIC DIAGRAM
-html_code = """<!DOCTYPE html>
-<html>
-<head>
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        * { box-sizing: border-box; }
-        body { margin: 0; padding: 10px; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: transparent; }
-        .container { background: linear-gradient(135deg, #f8fafc 0%, #e2e8f0 100%); padding: 20px; border-radius: 20px; box-shadow: 0 10px 30px rgba(0,0,0,0.1); width: 100%; max-width: 1100px; margin: 0 auto; }
-        .flowchart { display: flex; flex-direction: row; align-items: center; justify-content: space-between; gap: 10px; padding: 20px 0; width: 100%; }
-        .box { border: 4px solid; padding: 20px 15px; border-radius: 15px; text-align: center; font-weight: bold; box-shadow: 0 8px 20px rgba(0,0,0,0.1); flex: 1 1 0px; min-width: 150px; display: flex; flex-direction: column; justify-content: center; min-height: 140px; }
-        .master { background: linear-gradient(135deg, #4CAF50, #45a049); color: white; border-color: #4CAF50; }
-        .axsa { background: linear-gradient(135deg, #2196F3, #1976D2); color: white; border-color: #2196F3; }
-        .actual { background: linear-gradient(135deg, #FF9800, #F57C00); color: white; border-color: #FF9800; }
-        .arrow { font-size: 28px; color: #475569; font-weight: bold; display: flex; align-items: center; justify-content: center; flex: 0 0 40px; animation: pulse 2s infinite; }
-        .arrow::before { content: "➜"; }
-        @keyframes pulse { 0%, 100% { opacity: 1; transform: scale(1); } 50% { opacity: 0.6; transform: scale(1.1); } }
-        .title { font-size: 16px; margin-bottom: 5px; text-transform: uppercase; letter-spacing: 0.5px; }
-        .big-text { font-size: 28px; font-weight: 900; line-height: 1; margin: 5px 0; }
-        .label { font-size: 13px; opacity: 0.9; font-weight: 500; }
-        .mechanism { margin-top: 20px; padding: 20px; background: rgba(255,255,255,0.7); border-radius: 15px; border: 1px solid rgba(0,0,0,0.05); }
-        .mechanism h3 { text-align: center; margin-top: 0; margin-bottom: 15px; color: #1e293b; font-size: 18px; }
-        .grid-list { display: grid; grid-template-columns: repeat(2, 1fr); gap: 12px; list-style: none; padding: 0; margin: 0; }
-        .grid-list li { background: white; padding: 10px 15px; border-radius: 8px; font-size: 14px; display: flex; align-items: center; box-shadow: 0 2px 5px rgba(0,0,0,0.03); }
-        .grid-list li::before { content: "✓"; color: #10b981; font-weight: bold; margin-right: 10px; }
-        @media (max-width: 800px) {
-            .flowchart { flex-direction: column; gap: 5px; }
-            .box { width: 100%; max-width: 400px; min-height: 120px; }
-            .arrow::before { content: "⬇"; }
-            .arrow { height: 40px; width: 100%; }
-            .grid-list { grid-template-columns: 1fr; }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="flowchart">
-            <div class="box master">
-                <div class="title">📈 Master Fund</div>
-                <div class="big-text">GROSS</div>
-                <div class="label">Before fees are applied (e.g. management fees)</div>
-            </div>
-            <div class="arrow"></div>
-            <div class="box axsa">
-                <div class="title">🏦 AXSA Fund (AXSA GROSS)</div>
-                <div class="big-text">NET</div>
-                <div class="label">Master Fund fees are applied (yet to apply AXSA-level fees)</div>
-            </div>
-            <div class="arrow"></div>
-            <div class="box actual">
-                <div class="title">💰 Actual Net</div>
-                <div class="big-text">FINAL</div>
-                <div class="label">After Carry + Hurdle</div>
-            </div>
-        </div>
-        <div class="mechanism">
-            <h3>🔄 Fee Flow Mechanism</h3>
-            <ul class="grid-list">
-                <li><b>Management Fee %</b>: Annual fee on AUM</li>
-                <li><b>Management Fee Frequency</b>: How often management fee is charged</li>
-                <li><b>Carry %</b>: Performance fee on profits</li>
-                <li><b>Add-Back Method</b>: Prior accrued PF added back to GAV</li>
-                <li><b>Crystallization</b>: Resets accrued PF going forward</li>
-                <li><b>High Water Mark</b>: Benchmark for performance fees</li>
-            </ul>
-        </div>
-    </div>
-</body>
-</html>
-"""
-components.html(html_code, height=650, scrolling=True)
+# Static diagram, served as a component directory: reruns only send the component's
+# name, and the browser keeps the loaded frame instead of being re-sent the page
+fee_mechanism = components.declare_component("fee_mechanism", path=Path(__file__).parent / "fee_mechanism")
+fee_mechanism(key="fee_mechanism", default=None)
 
 st.subheader("This application converts **gross values** to **net values**:")
 
-col1, col2 = st.columns(2)
-with col1:
-    mgmt_fee = st.number_input("Management Fee % (Annual)", 0.0, 10.0, 1.5, 0.1)
-    carry_pct = st.number_input("Carry %", 0.0, 50.0, 10.0, 0.5)
-    mgmt_freq = st.selectbox("Management Fee Frequency", ["Monthly", "Quarterly", "Yearly"], index=0)
-
-with col2:
-    pfm_freq = st.selectbox("Performance Fee Calculation Frequency", ["Monthly", "Quarterly", "Yearly"], index=2)
-    crystal_freq = st.selectbox("Crystallization Frequency", ["Monthly", "Quarterly", "Yearly"], index=2)
-    hurdle_rate = st.number_input("Hurdle Rate % (Annual)", 0.0, 20.0, 0.0, 0.1)
-    use_hwm = st.checkbox("High Water Mark", value=True)
-
-first_row_is_base = st.checkbox(
-    "Treat first row as base row (Net Return % = 0 for first line)",
-    value=True
+batch_mode = st.checkbox(
+    "Batch mode (every column after the first is another fund's gross returns)",
+    value=False
+)
+uploaded_file = st.file_uploader("Upload Excel, CSV, Parquet or Arrow (2 cols: Month, Gross)", type=UPLOAD_TYPES)
+checkpoint_file = st.file_uploader(
+    "Resume from checkpoint (optional): upload only the new months above, plus the checkpoint saved with the last run",
+    type=["json"]
+)
+lots_file = st.file_uploader(
+    "Investor lots (optional): subscription date, amount and an optional lot name per row; "
+    "each lot is charged fees with its own high water mark",
+    type=UPLOAD_TYPES
 )
 
-uploaded_file = st.file_uploader("Upload Excel (2 cols: Month, Gross)", type=["xlsx", "xls"])
-
-def parse_returns(series: pd.Series) -> pd.Series:
-    cleaned = series.astype(str).str.replace(",", "", regex=False).str.rstrip("%").str.strip()
-    numeric = pd.to_numeric(cleaned, errors="coerce")
-    # Auto-detect percent-units vs decimals
-    if numeric.dropna().abs().max() > 1:
-        return numeric / 100.0
-    return numeric
-
-def is_calc_month(freq: str, month: int, is_year_end: bool) -> bool:
-    if freq == "Monthly":
-        return True
-    if freq == "Quarterly":
-        return month in [3, 6, 9, 12]
-    if freq == "Yearly":
-        return is_year_end
-    return False
+def cached_download(key, build):
+    # Built on the first click only (off the script thread), then reused for as long as the result is cached
+    def timed_build():
+        with stage_log.stage(f"{key[-1]}_export"):
+            return build()
+
+    return lambda: result_cache.get_or_compute(key, timed_build)
+
+def read_file(upload_bytes, name, read_columns):
+    with stage("upload_read") as record:
+        df, ingest_stats = read_upload(upload_bytes, name, read_columns)
+        record["Rows"] = len(df)
+    return df, ingest_stats
+
+def parse_column(values):
+    with stage("parse_returns") as record:
+        record["Rows"] = len(values)
+        return parse_returns_report(values)
+
+def build_calendar(periods, start_idx):
+    with stage("dates") as record:
+        record["Rows"] = len(periods)
+        return period_calendar(periods, start_idx)
+
+def show_error(e):
+    st.error(f"❌ File error: {str(e)}")
+    st.code(traceback.format_exc())
+
+def load_upload():
+    """(df, file_hash, parsed returns, fund columns, resume checkpoint) of the upload, or None if unusable."""
+    upload_bytes = uploaded_file.getvalue()
+    file_hash = content_hash(upload_bytes)
+    # Single-fund runs only ever use the period and first return column
+    read_columns = None if batch_mode else 2
+    df, ingest_stats = upload_cache.get_or_compute(
+        (file_hash, read_columns), lambda: read_file(upload_bytes, uploaded_file.name, read_columns)
+    )
+    st.subheader("✅ Original Data")
+    st.caption(f"Read {ingest_stats.describe()}")
+    st.dataframe(df.head(20), use_container_width=True)
+
+    if len(df.columns) < 2:
+        st.error("❌ At least 2 columns required!")
+        return None
+
+    period_col = df.columns[0]
+    return_cols = list(df.columns[1:]) if batch_mode else [df.columns[1]]
+    parse_reports = {
+        col: upload_cache.get_or_compute((file_hash, "returns", col), lambda col=col: parse_column(df[col]))
+        for col in return_cols
+    }
+    parsed = {col: report[0] for col, report in parse_reports.items()}
+    fund_cols = [col for col in return_cols if not parsed[col].isna().all()]
+
+    if not fund_cols:
+        st.error("❌ Cannot parse returns column.")
+        return None
+    if len(fund_cols) < len(return_cols):
+        skipped = ", ".join(str(col) for col in return_cols if col not in fund_cols)
+        st.warning(f"⚠️ Skipping columns that could not be parsed: {skipped}")
+
+    if batch_mode:
+        coerced = {col: parse_reports[col][1].coerced for col in fund_cols if parse_reports[col][1].coerced}
+        if coerced:
+            st.warning("⚠️ Unreadable return cells left blank: " + ", ".join(f"{col} ({n:,})" for col, n in coerced.items()))
+    else:
+        st.caption(f"{fund_cols[0]}: {parse_reports[fund_cols[0]][1].describe()}")
+    resume = None
+    if checkpoint_file is not None:
+        if batch_mode:
+            st.warning("⚠️ Checkpoints apply to single-fund runs; ignoring it in batch mode.")
+        else:
+            resume = AccrualCheckpoint.from_json(checkpoint_file.getvalue())
+            resume.check_continues(df[period_col])
+            st.caption(
+                f"Resuming after {resume.last_period or 'the checkpointed period'} "
+                f"(NAV {resume.current_value:.6f}, HWM {resume.hwm:.6f}); the base-row setting is not used."
+            )
+    return df, file_hash, parsed, fund_cols, resume
 
+# The upload and its preview only change on a full rerun (page load or a new file); everything
+# below is a fragment, so changing a fee term or paging through results skips reading, parsing
+# and previewing the upload again
+upload = None
 if uploaded_file is not None:
     try:
-        df = pd.read_excel(uploaded_file)
-        st.subheader("✅ Original Data")
-        st.dataframe(df.head(20), use_container_width=True)
-
-        if len(df.columns) < 2:
-            st.error("❌ At least 2 columns required!")
-            st.stop()
-
-        period_col, returns_col = df.columns[0], df.columns[1]
-        returns_decimal = parse_returns(df[returns_col])
-
-        if returns_decimal.isna().all():
-            st.error("❌ Cannot parse returns column.")
-            st.stop()
-
-        if st.button("🚀 Calculate", type="primary"):
-            start_idx = 1 if first_row_is_base else 0
-
-            starting_value = 1.0
-            current_value = starting_value
-            hwm = starting_value
-
-            mgmt_fee_monthly = (mgmt_fee / 100.0) / 12.0
-            carry_decimal = (carry_pct / 100.0)
-            hurdle_monthly = (hurdle_rate / 100.0) / 12.0
-
-            # KEY STATE: previous month accrued PF (liability) for add-back + incremental
-            prev_accrued_pf = 0.0
-
-            # Storage
-            months = []
-            beginning_values = []
-            gross_returns = []
-            pnl_values = []
-            addback_perf = []
-            adjusted_gav = []
-            mgmt_fees = []
-            mgmt_charged_list = []
-            nav_before_pf_list = []
-            accrued_pf_list = []
-            incremental_pf_list = []
-            cumulative_uncryst_list = []
-            crystallized_list = []
-            crystallization_amount_list = []
-            closing_nav_list = []
-            net_return_pct_list = []
-            hwm_list = []
-
-            # Optional base row line
-            if first_row_is_base and len(df) > 0:
-                months.append(df[period_col].iloc[0])
-                beginning_values.append(starting_value)
-                gross_returns.append(0.0)
-                pnl_values.append(0.0)
-                addback_perf.append(0.0)
-                adjusted_gav.append(starting_value)
-                mgmt_fees.append(0.0)
-                mgmt_charged_list.append(False)
-                nav_before_pf_list.append(starting_value)
-                accrued_pf_list.append(0.0)
-                incremental_pf_list.append(0.0)
-                cumulative_uncryst_list.append(0.0)
-                crystallized_list.append(False)
-                crystallization_amount_list.append(0.0)
-                closing_nav_list.append(starting_value)
-                net_return_pct_list.append(0.0)
-                hwm_list.append(hwm)
-
-            for idx in range(start_idx, len(returns_decimal)):
-                r = returns_decimal.iloc[idx]
-                if pd.isna(r):
-                    continue
-                r = float(r)
-
-                # Date/month
-                try:
-                    month_dt = pd.to_datetime(df[period_col].iloc[idx])
-                    m = int(month_dt.month)
-                    is_year_end = (m == 12)
-                except Exception:
-                    m = ((idx - start_idx) % 12) + 1
-                    is_year_end = (m == 12)
-
-                months.append(df[period_col].iloc[idx])
-
-                opening_nav = current_value
-                beginning_values.append(opening_nav)
-                gross_returns.append(r)
-
-                # 1) P&L
-                pnl = opening_nav * r
-                pnl_values.append(pnl)
-
-                # 2) Add back prior accrued PF into GAV (sheet mechanism) [file:2]
-                addback_perf.append(prev_accrued_pf)
-
-                # 3) Adjusted GAV
-                adj_gav = opening_nav + pnl + prev_accrued_pf
-                adjusted_gav.append(adj_gav)
-
-                # 4) Mgmt fee
-                mgmt_charged = is_calc_month(mgmt_freq, m, is_year_end)
-                mgmt_fee_amount = (adj_gav * mgmt_fee_monthly) if mgmt_charged else 0.0
-                nav_before_pf = adj_gav - mgmt_fee_amount
-
-                mgmt_fees.append(mgmt_fee_amount)
-                mgmt_charged_list.append(mgmt_charged)
-                nav_before_pf_list.append(nav_before_pf)
-
-                # 5) Accrued PF MUST be computed monthly to match the workbook NAV logic [file:2]
-                # NOTE: pfm_freq kept for display, but NAV-matching method accrues monthly.
-                if use_hwm:
-                    accrued_pf = max(0.0, (nav_before_pf - hwm)) * carry_decimal
+        upload = load_upload()
+    except Exception as e:
+        show_error(e)
+else:
+    st.info("👆 Please upload an Excel, CSV, Parquet or Arrow file to begin")
+
+@st.fragment
+def fee_calculator(upload):
+    # Fee terms, tools and results: a change here reruns from this point on the already-parsed upload
+    stage_log.new_run()
+    st.subheader("⚙️ Fee Terms")
+    col1, col2 = st.columns(2)
+    with col1:
+        mgmt_fee = st.number_input("Management Fee % (Annual)", 0.0, 10.0, 1.5, 0.1)
+        carry_pct = st.number_input("Carry %", 0.0, 50.0, 10.0, 0.5)
+        mgmt_freq = st.selectbox("Management Fee Frequency", ["Monthly", "Quarterly", "Yearly"], index=0)
+
+    with col2:
+        pfm_freq = st.selectbox("Performance Fee Calculation Frequency", ["Monthly", "Quarterly", "Yearly"], index=2)
+        crystal_freq = st.selectbox("Crystallization Frequency", ["Monthly", "Quarterly", "Yearly"], index=2)
+        hurdle_rate = st.number_input("Hurdle Rate % (Annual)", 0.0, 20.0, 0.0, 0.1)
+        use_hwm = st.checkbox("High Water Mark", value=True)
+
+    first_row_is_base = st.checkbox(
+        "Treat first row as base row (Net Return % = 0 for first line)",
+        value=True
+    )
+    data_type = st.radio(
+        "Gross or Net?", ["Gross", "Net"], horizontal=True,
+        help="Net: the upload holds the feeder's net returns; the implied master-fund gross is solved for first"
+    )
+    compact = st.checkbox(
+        "Compact results (float32, about 7 significant digits)",
+        value=False,
+        help="Halves the memory a long result takes; totals are still summed, and checkpoints saved, at full precision"
+    )
+
+    if upload is None:
+        return
+    df, file_hash, parsed, fund_cols, resume = upload
+    period_col = df.columns[0]
+    returns_decimal = parsed[fund_cols[0]]
+    try:
+        # Undated rows of a resumed upload are numbered on from the checkpoint
+        start_idx = -resume.period_index if resume else 1 if first_row_is_base else 0
+        calendar = upload_cache.get_or_compute(
+            (file_hash, "calendar", start_idx), lambda: build_calendar(df[period_col], start_idx)
+        )
+        months, year_end = calendar.month, calendar.year_end
+        if calendar.days is not None:
+            st.caption(
+                f"Dated every {np.median(calendar.days):g} days or so rather than monthly: fees are charged at the "
+                "real month, quarter and year ends and accrue by day count (Act/365)."
+            )
+            if resume is not None:
+                st.error("❌ Checkpoints cover monthly series only; upload the whole history without a checkpoint.")
+                return
+
+        params = FeeParams(
+            mgmt_fee=mgmt_fee,
+            carry_pct=carry_pct,
+            hurdle_rate=hurdle_rate,
+            mgmt_freq=mgmt_freq,
+            pfm_freq=pfm_freq,
+            crystal_freq=crystal_freq,
+            use_hwm=use_hwm,
+        )
+        # Identifies the gross series everything below runs on
+        series_key = file_hash
+        input_label = "Input Return %"
+        if data_type == "Net":
+            if resume is not None and resume.params != params:
+                st.error("❌ Fee terms differ from the ones the checkpoint was calculated with.")
+                return
+            # From here on work on the implied gross, which depends on the fee terms
+            def implied_gross():
+                with stage("implied_gross"):
+                    return {
+                        col: pd.Series(accrual_gross_from_net(parsed[col].to_numpy(dtype=float), months, year_end,
+                                                              params, first_row_is_base, resume=resume,
+                                                              **calendar.schedule),
+                                       name=col)
+                        for col in fund_cols
+                    }
+
+            series_key = (file_hash, "net", params, first_row_is_base, tuple(fund_cols), resume)
+            parsed = result_cache.get_or_compute(series_key, implied_gross)
+            returns_decimal = parsed[fund_cols[0]]
+            input_label = "Implied Gross Return %"
+            st.caption("Net returns converted to implied gross under the fee terms above; "
+                       "sweeps below run on that gross series.")
+
+        def result_frame(res):
+            return res.to_frame(df[period_col], input_label)
+
+        with st.expander("🧮 Fee Parameter Sweep"):
+            st.caption(
+                f"Runs every combination of the ranges below on **{fund_cols[0]}**. "
+                "High Water Mark and base-row settings come from the form above."
+            )
+            s1, s2, s3 = st.columns(3)
+            with s1:
+                sweep_fee_lo = st.number_input("Mgmt Fee % from", 0.0, 10.0, 0.5, 0.1)
+                sweep_fee_hi = st.number_input("Mgmt Fee % to", 0.0, 10.0, 2.5, 0.1)
+                sweep_fee_step = st.number_input("Mgmt Fee % step", 0.0, 10.0, 0.25, 0.05)
+            with s2:
+                sweep_carry_lo = st.number_input("Carry % from", 0.0, 50.0, 0.0, 0.5)
+                sweep_carry_hi = st.number_input("Carry % to", 0.0, 50.0, 30.0, 0.5)
+                sweep_carry_step = st.number_input("Carry % step", 0.0, 50.0, 2.5, 0.5)
+            with s3:
+                sweep_hurdle_lo = st.number_input("Hurdle Rate % from", 0.0, 20.0, 0.0, 0.1)
+                sweep_hurdle_hi = st.number_input("Hurdle Rate % to", 0.0, 20.0, 0.0, 0.1)
+                sweep_hurdle_step = st.number_input("Hurdle Rate % step", 0.0, 20.0, 1.0, 0.1)
+            sweep_mgmt_freqs = st.multiselect("Management Fee Frequencies", list(FREQUENCIES), default=[mgmt_freq])
+            sweep_crystal_freqs = st.multiselect("Crystallization Frequencies", list(FREQUENCIES), default=[crystal_freq])
+
+            h1, h2, h3 = st.columns(3)
+            with h1:
+                heat_x = st.selectbox("Heatmap X", GRID_PARAMS, index=0)
+            with h2:
+                heat_y = st.selectbox("Heatmap Y", GRID_PARAMS, index=1)
+            with h3:
+                heat_value = st.selectbox("Heatmap Value", SWEEP_METRICS, index=0)
+
+            if resume is not None:
+                st.warning("⚠️ The sweep runs on the full history; upload it without a checkpoint.")
+            elif st.button("🧮 Run Sweep"):
+                grid = sweep_grid(
+                    value_range(sweep_fee_lo, sweep_fee_hi, sweep_fee_step),
+                    value_range(sweep_carry_lo, sweep_carry_hi, sweep_carry_step),
+                    value_range(sweep_hurdle_lo, sweep_hurdle_hi, sweep_hurdle_step),
+                    sweep_mgmt_freqs or [mgmt_freq],
+                    sweep_crystal_freqs or [crystal_freq],
+                )
+                sweep_key = (series_key, "sweep", fund_cols[0], use_hwm, first_row_is_base,
+                             tuple(grid.itertuples(index=False, name=None)))
+                sweep_started = time.perf_counter()
+                sweep_df = result_cache.get_or_compute(sweep_key, lambda: run_sweep(
+                    returns_decimal.to_numpy(dtype=float), months, year_end, grid,
+                    use_hwm=use_hwm, first_row_is_base=first_row_is_base, **calendar.schedule,
+                ))
+                st.caption(f"{len(grid):,} combinations in {time.perf_counter() - sweep_started:.2f}s")
+
+                if heat_x != heat_y:
+                    heat = heatmap_frame(sweep_df, heat_x, heat_y, heat_value)
+                    heat_long = heat.stack().rename(heat_value).reset_index()
+                    import altair as alt
+                    st.altair_chart(
+                        alt.Chart(heat_long).mark_rect().encode(
+                            x=alt.X(f"{heat_x}:O"),
+                            y=alt.Y(f"{heat_y}:O"),
+                            color=alt.Color(f"{heat_value}:Q"),
+                            tooltip=[heat_x, heat_y, alt.Tooltip(heat_value, format=".6f")],
+                        ),
+                        use_container_width=True,
+                    )
+                    st.caption("Parameters not on an axis are held at the first value of their range.")
+
+                st.dataframe(sweep_df, use_container_width=True)
+                st.download_button(
+                    "📥 Download Sweep (CSV)",
+                    sweep_df.to_csv(index=False),
+                    f"fee_sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    CSV_MIME
+                )
+
+        with st.expander("🎲 Monte Carlo Fee Drag"):
+            st.caption(
+                f"Resamples **{fund_cols[0]}** into simulated gross paths and runs each through the "
+                "fee terms above. Block bootstrap keeps runs of consecutive months together."
+            )
+            m1, m2, m3, m4 = st.columns(4)
+            with m1:
+                mc_paths = st.selectbox("Paths", [10_000, 100_000, 1_000_000], index=0, format_func=lambda n: f"{n:,}")
+            with m2:
+                mc_method = st.selectbox("Resampling", METHODS, index=1)
+            with m3:
+                mc_block = st.number_input("Block length (months)", 1, 120, 12, 1)
+            with m4:
+                mc_seed = st.number_input("Seed", 0, 2**31 - 1, 0, 1)
+            # The base row is a starting point, not a month of history
+            mc_history = int(returns_decimal.iloc[1 if first_row_is_base else 0:].notna().sum())
+            mc_horizon = st.number_input("Horizon (months)", 1, 1200, min(mc_history, 1200) or 1, 1)
+
+            if calendar.days is not None:
+                st.info("ℹ️ Simulation resamples monthly returns; this upload isn't a monthly series.")
+            elif resume is not None:
+                st.warning("⚠️ The simulation runs on the full history; upload it without a checkpoint.")
+            elif st.button("🎲 Run Simulation"):
+                mc_key = (series_key, "monte_carlo", fund_cols[0], params, first_row_is_base, mc_paths,
+                          mc_method, mc_block, mc_seed, mc_horizon)
+                mc_started = time.perf_counter()
+                mc_df = result_cache.get_or_compute(mc_key, lambda: run_monte_carlo(
+                    returns_decimal.to_numpy(dtype=float), months, params, mc_paths, mc_horizon,
+                    mc_method, mc_block, mc_seed, first_row_is_base=first_row_is_base,
+                ))
+                st.caption(f"{mc_paths:,} paths × {mc_horizon:,} months in {time.perf_counter() - mc_started:.2f}s")
+
+                bands = percentile_bands(mc_df)
+                st.dataframe(bands, use_container_width=True, column_config=number_formats(bands, 4))
+                import altair as alt
+                st.altair_chart(
+                    alt.Chart(histogram_frame(mc_df["fee_drag_pa_pct"])).mark_bar().encode(
+                        x=alt.X("start:Q", bin="binned", title="Fee drag (% p.a.)"),
+                        x2="end:Q",
+                        y=alt.Y("paths:Q", title="Paths"),
+                    ),
+                    use_container_width=True,
+                )
+
+        with st.expander("🧱 Fee Waterfall"):
+            st.caption(
+                f"Charges **{fund_cols[0]}** through a stack of fee layers in one pass: the form above is the "
+                "first layer and each further layer is charged on the net return of the one before."
+            )
+            extra_layers = st.number_input("Further layers", 1, 4, 1, 1)
+            layers = [params]
+            layer_names = [st.text_input("Layer 1 name", "Master")]
+            for n in range(2, extra_layers + 2):
+                st.markdown(f"**Layer {n}**")
+                w1, w2, w3 = st.columns(3)
+                with w1:
+                    layer_names.append(st.text_input("Name", ["Feeder", "Platform"][n - 2] if n < 4 else f"Layer {n}",
+                                                     key=f"layer_name_{n}"))
+                    layer_fee = st.number_input("Management Fee % (Annual)", 0.0, 10.0, 0.5, 0.1, key=f"layer_fee_{n}")
+                with w2:
+                    layer_carry = st.number_input("Carry %", 0.0, 50.0, 0.0, 0.5, key=f"layer_carry_{n}")
+                    layer_hurdle = st.number_input("Hurdle Rate % (Annual)", 0.0, 20.0, 0.0, 0.1, key=f"layer_hurdle_{n}")
+                with w3:
+                    layer_mgmt_freq = st.selectbox("Management Fee Frequency", FREQUENCIES, key=f"layer_mgmt_{n}")
+                    layer_crystal_freq = st.selectbox("Crystallization Frequency", FREQUENCIES, index=2,
+                                                      key=f"layer_crystal_{n}")
+                layer_hwm = st.checkbox("High Water Mark", value=True, key=f"layer_hwm_{n}")
+                layers.append(FeeParams(mgmt_fee=layer_fee, carry_pct=layer_carry, hurdle_rate=layer_hurdle,
+                                        mgmt_freq=layer_mgmt_freq, crystal_freq=layer_crystal_freq, use_hwm=layer_hwm))
+
+            # Layer names head column groups, so they need to be unique and non-empty
+            layer_names = excel_sheet_names(layer_names)
+            waterfall_request = (series_key, "waterfall", fund_cols[0], first_row_is_base, tuple(layers),
+                                 tuple(layer_names))
+            if st.button("🧱 Run Waterfall"):
+                st.session_state["waterfall_request"] = waterfall_request
+            if st.session_state.get("waterfall_request") == waterfall_request:
+                if resume is not None:
+                    st.warning("⚠️ The waterfall runs on the full history; upload it without a checkpoint.")
                 else:
-                    period_ret = (nav_before_pf / opening_nav - 1.0) if opening_nav > 0 else 0.0
-                    excess = max(0.0, period_ret - hurdle_monthly)
-                    accrued_pf = opening_nav * excess * carry_decimal
-
-                accrued_pf_list.append(accrued_pf)
-                incremental_pf_list.append(accrued_pf - prev_accrued_pf)
-
-                # 6) Closing NAV is net of the FULL accrued PF each month [file:2]
-                closing_nav = nav_before_pf - accrued_pf
-                closing_nav_list.append(closing_nav)
-
-                # 7) Crystallization: reset accrual going forward, no additional NAV hit [file:2]
-                crystallize = is_calc_month(crystal_freq, m, is_year_end)
-                crystallized_list.append(crystallize)
-
-                crystallization_amount = accrued_pf if (crystallize and accrued_pf > 0) else 0.0
-                crystallization_amount_list.append(crystallization_amount)
-
-                if crystallize and accrued_pf > 0:
-                    prev_accrued_pf = 0.0
-                    cumulative_uncryst_list.append(0.0)
-                    if use_hwm:
-                        hwm = closing_nav  # HWM after crystallization should be post-fee NAV [file:2]
+                    def run_waterfall():
+                        stack = run_accrual_layers(returns_decimal.to_numpy(dtype=float), months, year_end,
+                                                   layers, first_row_is_base, **calendar.schedule)
+                        return (layer_frame(stack, df[period_col], layer_names, input_label),
+                                stack.summary_frame(layer_names).rename(columns={"Fund": "Layer"}))
+
+                    waterfall_df, layer_summary = result_cache.get_or_compute(waterfall_request, run_waterfall)
+                    st.dataframe(layer_summary, use_container_width=True, column_config=number_formats(layer_summary))
+                    paged_dataframe(waterfall_df, "page_waterfall")
+                    st.download_button(
+                        "📥 Download Waterfall (Excel)",
+                        cached_download(waterfall_request + ("xlsx",), lambda: excel_bytes(
+                            [("Layers", layer_summary), ("Waterfall", waterfall_df)])),
+                        f"fund_fees_waterfall_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                        XLSX_MIME,
+                        on_click="ignore"
+                    )
+
+        # Remember what was calculated so paging through the results survives reruns;
+        # changing any input hides them until Calculate is pressed again
+        run_request = (series_key, batch_mode, params, first_row_is_base, tuple(fund_cols), resume)
+        if st.button("🚀 Calculate", type="primary"):
+            st.session_state["run_request"] = run_request
+
+        @st.fragment
+        def results():
+            # Paging, views and chart options rerun only this section, from the cached result
+            stage_log.new_run()
+            if st.session_state.get("run_request") != run_request:
+                return
+            try:
+                if batch_mode:
+                    def run_batch():
+                        returns_matrix = np.column_stack([parsed[col].to_numpy(dtype=float) for col in fund_cols])
+                        with stage("fee_recurrence") as record:
+                            batch = run_accrual_batch(returns_matrix, months, year_end, params, first_row_is_base,
+                                                      **calendar.schedule)
+                            record["Rows"] = batch.valid.sum()
+                        if compact:
+                            batch = batch.astype(np.float32)
+                        with stage("dataframe_build"):
+                            return batch, batch.summary_frame([str(col) for col in fund_cols])
+
+                    batch_key = (series_key, params, first_row_is_base, tuple(fund_cols), compact)
+                    batch, summary_df = result_cache.get_or_compute(batch_key, run_batch)
+
+                    st.subheader(f"📊 Fund Summary ({len(fund_cols)} funds)")
+                    with stage("table_render"):
+                        paged_dataframe(summary_df, "summary_page")
+
+                    st.subheader("📉 Risk Analytics")
+                    analytics_df = result_cache.get_or_compute(batch_key + ("analytics",), lambda: pd.DataFrame([
+                        {"Fund": str(col), **drawdown_summary(batch.fund(j), df[period_col], first_row_is_base, calendar.days)}
+                        for j, col in enumerate(fund_cols)
+                    ]))
+                    paged_dataframe(analytics_df, "analytics_page", 2)
+
+                    def batch_workbook():
+                        fund_sheets = (
+                            (sheet, result_frame(batch.fund(j)))
+                            for j, sheet in enumerate(excel_sheet_names(fund_cols))
+                        )
+                        return excel_bytes(itertools.chain([("Summary", summary_df)], fund_sheets))
+
+                    st.download_button(
+                        "📥 Download Excel (one sheet per fund)",
+                        cached_download(batch_key + ("xlsx",), batch_workbook),
+                        f"fund_fees_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                        XLSX_MIME,
+                        on_click="ignore"
+                    )
+                    return
+
+                if resume is not None and resume.params != params:
+                    st.error("❌ Fee terms differ from the ones the checkpoint was calculated with.")
+                    return
+
+                def run_single():
+                    with stage("fee_recurrence") as record:
+                        result = run_accrual(returns_decimal.to_numpy(dtype=float), months, year_end, params,
+                                             first_row_is_base, resume=resume, **calendar.schedule)
+                        record["Rows"] = len(result)
+                    if compact:
+                        result = result.astype(np.float32)
+                    with stage("dataframe_build"):
+                        return result, result_frame(result)
+
+                result_key = (series_key, params, first_row_is_base, fund_cols[0], resume, compact)
+                result, result_df = result_cache.get_or_compute(result_key, run_single)
+
+                st.subheader("📈 Detailed Results")
+                view = st.radio("View", VIEWS, index=VIEWS.index(default_view(len(result_df))), horizontal=True)
+                with stage("table_render"):
+                    if view == "Every period":
+                        paged_dataframe(result_df, "page_every")
+                    else:
+                        paged_dataframe(
+                            result_cache.get_or_compute(result_key + (view,), lambda: aggregate_frame(result, calendar, view)),
+                            f"page_{view}",
+                        )
+
+                st.subheader("📊 Summary Statistics")
+                c1, c2, c3, c4, c5 = st.columns(5)
+                with c1:
+                    st.metric("Avg Net Return %", f"{result_df['Net Return %'].mean():.2f}%")
+                with c2:
+                    st.metric("Total Mgmt Fees", f"{result.total_mgmt_fees:.6f}")
+                with c3:
+                    st.metric("Total Crystallization Amount", f"{result.total_crystallized:.6f}")
+                with c4:
+                    st.metric("Uncrystallized PF", f"{result.uncrystallized_pf:.6f}")
+                with c5:
+                    st.metric("Final NAV", f"{result.final_nav:.6f}")
+
+                st.subheader("📉 Risk & Rolling Analytics")
+                # A resumed run has no base row of its own
+                has_base = first_row_is_base and resume is None
+                risk = result_cache.get_or_compute(
+                    result_key + ("risk",), lambda: drawdown_summary(result, df[period_col], has_base, calendar.days)
+                )
+                a1, a2, a3, a4, a5 = st.columns(5)
+                with a1:
+                    st.metric("Annualized Gross / Net %", f"{risk['Annualized Gross %']:.2f}% / {risk['Annualized Net %']:.2f}%")
+                with a2:
+                    st.metric("Fee Drag % p.a.", f"{risk['Fee Drag % p.a.']:.2f}%")
+                with a3:
+                    st.metric("Max Drawdown (Net)", f"{risk['Max Drawdown % (Net)']:.2f}%",
+                              help=f"Peak {risk['Drawdown Peak']}, trough {risk['Drawdown Trough']}")
+                with a4:
+                    st.metric("Time Under HWM", f"{risk['% of Time Under HWM']:.1f}%",
+                              help=f"Longest spell {risk['Longest Spell Under HWM (months)']:.1f} months")
+                with a5:
+                    st.metric("Current Spell Under HWM", f"{risk['Current Spell Under HWM (months)']:.1f} months")
+
+                rolling_df = result_cache.get_or_compute(
+                    result_key + ("rolling",), lambda: rolling_frame(result, df[period_col], has_base, days=calendar.days)
+                )
+                window = st.radio("Rolling window (months)", WINDOWS, horizontal=True)
+                chart_cols = [f"{window}M Gross % p.a.", f"{window}M Net % p.a.", f"{window}M Fee Drag % p.a."]
+                # Plot at most ~2,000 points however long the history
+                step = max(1, len(rolling_df) // 2000)
+                chart_df = rolling_df.iloc[::step].melt("Month", chart_cols, "Series", "% p.a.").dropna()
+                if len(chart_df):
+                    import altair as alt
+                    st.altair_chart(
+                        alt.Chart(chart_df).mark_line().encode(
+                            x=alt.X("Month", title=None), y="% p.a.:Q", color="Series:N"
+                        ),
+                        use_container_width=True,
+                    )
                 else:
-                    prev_accrued_pf = accrued_pf
-                    cumulative_uncryst_list.append(accrued_pf)
-
-                # Net Return % based on NAV movement
-                net_return_pct = ((closing_nav / opening_nav) - 1.0) * 100.0 if opening_nav > 0 else 0.0
-                net_return_pct_list.append(net_return_pct)
-
-                hwm_list.append(hwm)
-                current_value = closing_nav
-
-            result_df = pd.DataFrame({
-                "Month": months,
-                "Input Return %": [x * 100 for x in gross_returns],
-                "Beginning NAV": beginning_values,
-                "P&L (Before Mgmt)": pnl_values,
-                "Add Back Uncryst PF": addback_perf,
-                "Adjusted GAV": adjusted_gav,
-                "Mgmt Fee": mgmt_fees,
-                "Mgmt Charged?": mgmt_charged_list,
-                "NAV before PF": nav_before_pf_list,
-                "Accrued PF (Liability)": accrued_pf_list,
-                "Incremental PF (Δ Liability)": incremental_pf_list,
-                "Cumulative Uncryst PF": cumulative_uncryst_list,
-                "Crystallized?": crystallized_list,
-                "Crystallization Amount (Reset)": crystallization_amount_list,
-                "Closing NAV": closing_nav_list,
-                "Net Return %": net_return_pct_list,
-                "HWM": hwm_list
-            })
-
-            st.subheader("📈 Detailed Results")
-            st.dataframe(result_df.round(6), use_container_width=True)
-
-            st.subheader("📊 Summary Statistics")
-            c1, c2, c3, c4, c5 = st.columns(5)
-            with c1:
-                st.metric("Avg Net Return %", f"{result_df['Net Return %'].mean():.2f}%")
-            with c2:
-                st.metric("Total Mgmt Fees", f"{float(np.nansum(mgmt_fees)):.6f}")
-            with c3:
-                st.metric("Total Crystallization Amount", f"{float(np.nansum(crystallization_amount_list)):.6f}")
-            with c4:
-                st.metric("Uncrystallized PF", f"{float(cumulative_uncryst_list[-1]) if cumulative_uncryst_list else 0.0:.6f}")
-            with c5:
-                st.metric("Final NAV", f"{float(closing_nav_list[-1]) if closing_nav_list else starting_value:.6f}")
-
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                result_df.to_excel(writer, index=False, sheet_name="Results")
-
-            st.download_button(
-                "📥 Download Excel",
-                output.getvalue(),
-                f"fund_fees_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-
+                    st.caption(f"Fewer than {window} months of history for a rolling window.")
+                paged_dataframe(rolling_df, "page_rolling", 2)
+
+                stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                d1, d2, d3, d4 = st.columns(4)
+                with d1:
+                    st.download_button(
+                        "📥 Download Excel",
+                        cached_download(result_key + ("xlsx",), lambda: excel_bytes([("Results", result_df)])),
+                        f"fund_fees_{stamp}.xlsx",
+                        XLSX_MIME,
+                        on_click="ignore"
+                    )
+                with d2:
+                    st.download_button(
+                        "📥 Download CSV",
+                        cached_download(result_key + ("csv",), lambda: csv_bytes(result_df)),
+                        f"fund_fees_{stamp}.csv",
+                        CSV_MIME,
+                        on_click="ignore"
+                    )
+                with d3:
+                    st.download_button(
+                        "📥 Download Parquet",
+                        cached_download(result_key + ("parquet",), lambda: parquet_bytes(result_df)),
+                        f"fund_fees_{stamp}.parquet",
+                        PARQUET_MIME,
+                        on_click="ignore"
+                    )
+                with d4:
+                    if result.checkpoint is None:
+                        st.caption("Checkpoints cover monthly series only.")
+                    else:
+                        st.download_button(
+                            "📥 Download Checkpoint",
+                            result.period_checkpoint(df[period_col]).to_json(),
+                            f"fund_fees_checkpoint_{stamp}.json",
+                            "application/json",
+                            on_click="ignore"
+                        )
+
+                if lots_file is not None:
+                    st.subheader("👥 Investor Lots")
+                    if resume is not None:
+                        st.warning("⚠️ Lot accounting runs on the full history; upload it without a checkpoint.")
+                        return
+                    lots_bytes = lots_file.getvalue()
+                    lots_hash = content_hash(lots_bytes)
+                    lots = upload_cache.get_or_compute(
+                        (lots_hash, "lots"), lambda: parse_lots(read_upload(lots_bytes, lots_file.name, 3)[0])
+                    )
+                    start_rows = lot_start_rows(lots["Subscription"], df[period_col])
+
+                    def run_lots():
+                        book = run_accrual_lots(returns_decimal.to_numpy(dtype=float), months, year_end, params,
+                                                start_rows, lots["Amount"].to_numpy(), first_row_is_base,
+                                                **calendar.schedule)
+                        return fund_totals_frame(book, df[period_col], input_label), lot_summary_frame(book, lots)
+
+                    lots_key = result_key + ("lots", lots_hash)
+                    totals_df, lot_df = result_cache.get_or_compute(lots_key, run_lots)
+                    st.caption(f"{len(lot_df):,} lots; fund totals are the sum over the lots invested in each period.")
+                    paged_dataframe(totals_df, "page_lot_totals")
+                    paged_dataframe(lot_df, "page_lots")
+                    st.download_button(
+                        "📥 Download Lots (Excel)",
+                        cached_download(lots_key + ("xlsx",),
+                                        lambda: excel_bytes([("Fund Totals", totals_df), ("Lots", lot_df)])),
+                        f"fund_fees_lots_{stamp}.xlsx",
+                        XLSX_MIME,
+                        on_click="ignore"
+                    )
+            except Exception as e:
+                show_error(e)
+
+        results()
     except Exception as e:
-        st.error(f"❌ File error: {str(e)}")
-        import traceback
-        st.code(traceback.format_exc())
-else:
-    st.info("👆 Please upload an Excel file to begin")
+        show_error(e)
+
+fee_calculator(upload)
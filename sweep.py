@@ -0,0 +1,105 @@
+"""Fee-parameter sweeps: every combination of a grid of fee terms in one go.
+
+Combinations are laid out along the column axis of `run_accrual_grid`, so a
+chunk of a few thousand combinations is a single batched recurrence. Large
+grids are split into chunks and spread over a process pool.
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from fee_engine import run_accrual_grid
+
+GRID_PARAMS = ["mgmt_fee", "carry_pct", "hurdle_rate", "mgmt_freq", "crystal_freq"]
+SWEEP_METRICS = ["final_nav", "total_mgmt_fees", "total_crystallized", "uncrystallized_pf"]
+
+CHUNK_SIZE = 4096
+# Below this many (periods x combinations) cells a pool costs more than it saves
+PARALLEL_MIN_CELLS = 20_000_000
+
+_series = None
+
+
+def value_range(lo: float, hi: float, step: float) -> np.ndarray:
+    """Inclusive range of UI values, e.g. value_range(1.0, 2.0, 0.5) -> [1.0, 1.5, 2.0]."""
+    if step <= 0 or hi <= lo:
+        return np.array([lo], dtype=np.float64)
+    return np.round(np.arange(lo, hi + step / 2, step), 10)
+
+
+def sweep_grid(mgmt_fee, carry_pct, hurdle_rate, mgmt_freq, crystal_freq) -> pd.DataFrame:
+    """Tidy frame with one row per fee-term combination."""
+    combos = itertools.product(mgmt_fee, carry_pct, hurdle_rate, mgmt_freq, crystal_freq)
+    return pd.DataFrame(list(combos), columns=GRID_PARAMS)
+
+
+def _set_series(series):
+    global _series
+    _series = series
+
+
+def _sweep_chunk(chunk: dict) -> np.ndarray:
+    returns, months, year_end, use_hwm, first_row_is_base, schedule = _series
+    res = run_accrual_grid(returns, months, year_end, use_hwm=use_hwm,
+                           first_row_is_base=first_row_is_base, **chunk, **schedule)
+    if len(res) == 0:
+        k = len(chunk["mgmt_fee"])
+        return np.column_stack([np.full(k, res.starting_value), np.zeros(k), np.zeros(k), np.zeros(k)])
+    return np.column_stack([
+        res.closing_nav[-1],
+        np.nansum(res.mgmt_fee, axis=0),
+        np.nansum(res.crystallization_amount, axis=0),
+        res.cumulative_uncryst_pf[-1],
+    ])
+
+
+def run_sweep(returns, months, year_end, grid: pd.DataFrame, use_hwm: bool = True,
+              first_row_is_base: bool = True, chunk_size: int = CHUNK_SIZE,
+              workers: Optional[int] = None, month_end=None, days=None) -> pd.DataFrame:
+    """Evaluate every row of `grid` and return it with `SWEEP_METRICS` appended.
+
+    `workers=None` uses a process pool sized to the machine once the grid is
+    large enough to be worth it; `workers=1` always runs in-process.
+    `month_end` and `days` are a non-monthly series' `PeriodCalendar.schedule`.
+    """
+    schedule = {} if days is None else {"month_end": month_end, "days": days}
+    series = (np.asarray(returns, dtype=np.float64), np.asarray(months),
+              np.asarray(year_end, dtype=bool), use_hwm, first_row_is_base, schedule)
+    chunks = [
+        {name: grid[name].to_numpy()[i:i + chunk_size] for name in GRID_PARAMS}
+        for i in range(0, len(grid), chunk_size)
+    ]
+
+    if workers is None:
+        big = len(series[0]) * len(grid) >= PARALLEL_MIN_CELLS
+        workers = min(len(chunks), os.cpu_count() or 1) if big else 1
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(workers, initializer=_set_series, initargs=(series,)) as pool:
+            parts = list(pool.map(_sweep_chunk, chunks))
+    else:
+        _set_series(series)
+        parts = [_sweep_chunk(chunk) for chunk in chunks]
+
+    metrics = np.concatenate(parts) if parts else np.empty((0, len(SWEEP_METRICS)))
+    out = grid.reset_index(drop=True).copy()
+    for i, name in enumerate(SWEEP_METRICS):
+        out[name] = metrics[:, i]
+    return out
+
+
+def heatmap_frame(results: pd.DataFrame, x: str, y: str, value: str) -> pd.DataFrame:
+    """Pivot of `value` over two grid parameters.
+
+    The remaining grid parameters are held at their first value so every
+    cell is a single combination rather than an average.
+    """
+    subset = results
+    for name in GRID_PARAMS:
+        if name not in (x, y):
+            subset = subset[subset[name] == results[name].iloc[0]]
+    return subset.pivot(index=y, columns=x, values=value)
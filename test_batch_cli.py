@@ -0,0 +1,80 @@
+"""Checks the headless batch runner against `run_accrual`."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_cli import output_names, process_file, run_batch
+from fee_engine import FeeParams, run_accrual, run_accrual_batch
+from periods import period_calendar
+
+PARAMS = FeeParams(mgmt_fee=2.0, carry_pct=20.0, crystal_freq="Quarterly")
+
+
+def write_funds(path, n=37, seed=7):
+    rng = np.random.default_rng(seed)
+    periods = pd.date_range("2019-12-31", periods=n, freq="ME").strftime("%Y-%m-%d")
+    frame = pd.DataFrame({"Period": periods, "Fund A": rng.normal(0.6, 3, n), "Fund B": rng.normal(0.4, 2, n)})
+    frame.iloc[0, 1:] = 0.0
+    frame.iloc[8, 2] = np.nan
+    frame.to_csv(path, index=False)
+    return frame
+
+
+def expected_single(frame, column):
+    calendar = period_calendar(frame["Period"], 1)
+    return run_accrual(frame[column].to_numpy() / 100, calendar.month, calendar.year_end, PARAMS)
+
+
+@pytest.mark.parametrize("fmt", ["xlsx", "csv", "parquet"])
+def test_single_fund_file(tmp_path, fmt):
+    frame = write_funds(tmp_path / "funds.csv")
+    out = tmp_path / f"funds_fees.{fmt}"
+    rows = process_file(tmp_path / "funds.csv", out, PARAMS, True, False, fmt)
+    expected = expected_single(frame, "Fund A")
+    assert len(rows) == 1 and rows[0]["Error"] == ""
+    assert rows[0]["Final NAV"] == pytest.approx(expected.final_nav, rel=1e-12)
+    written = {"xlsx": pd.read_excel, "csv": pd.read_csv, "parquet": pd.read_parquet}[fmt](out)
+    np.testing.assert_allclose(written["Closing NAV"], expected.closing_nav, rtol=1e-12)
+
+
+def test_all_columns_matches_batch(tmp_path):
+    frame = write_funds(tmp_path / "funds.csv")
+    rows = process_file(tmp_path / "funds.csv", tmp_path / "out.xlsx", PARAMS, True, True, "xlsx")
+    calendar = period_calendar(frame["Period"], 1)
+    batch = run_accrual_batch(frame[["Fund A", "Fund B"]].to_numpy() / 100, calendar.month, calendar.year_end,
+                              PARAMS)
+    assert [row["Fund"] for row in rows] == ["Fund A", "Fund B"]
+    for j, row in enumerate(rows):
+        assert row["Final NAV"] == pytest.approx(batch.fund(j).final_nav, rel=1e-12)
+        assert row["Final NAV"] == pytest.approx(expected_single(frame, f"Fund {'AB'[j]}").final_nav, rel=1e-12)
+    assert set(pd.read_excel(tmp_path / "out.xlsx", sheet_name=None)) == {"Summary", "Fund A", "Fund B"}
+
+
+def test_checkpoints_continue_across_files(tmp_path):
+    frame = write_funds(tmp_path / "whole.csv")
+    frame.iloc[:20].to_csv(tmp_path / "head.csv", index=False)
+    frame.iloc[20:].to_csv(tmp_path / "tail.csv", index=False)
+    checkpoint = tmp_path / "fund.checkpoint.json"
+    process_file(tmp_path / "head.csv", tmp_path / "head_fees.csv", PARAMS, True, False, "csv", checkpoint)
+    rows = process_file(tmp_path / "tail.csv", tmp_path / "tail_fees.csv", PARAMS, True, False, "csv", checkpoint)
+    assert rows[0]["Final NAV"] == pytest.approx(expected_single(frame, "Fund A").final_nav, rel=1e-12)
+    # The same months again don't continue the checkpoint
+    rows = process_file(tmp_path / "tail.csv", tmp_path / "tail_fees.csv", PARAMS, True, False, "csv", checkpoint)
+    assert "checkpoint already covers" in rows[0]["Error"]
+
+
+def test_bad_files_are_reported_not_raised(tmp_path):
+    (tmp_path / "bad.csv").write_text("Period\n2020-01\n")
+    write_funds(tmp_path / "good.csv")
+    summary = run_batch([tmp_path / "bad.csv", tmp_path / "good.csv"], tmp_path / "out", PARAMS, workers=1,
+                        fmt="csv")
+    assert list(summary["File"]) == [str(tmp_path / "bad.csv"), str(tmp_path / "good.csv")]
+    assert summary["Error"].iloc[0] and not summary["Error"].iloc[1]
+    assert (tmp_path / "out" / "good_fees.csv").exists()
+
+
+def test_output_names_are_unique():
+    from pathlib import Path
+
+    names = output_names([Path("a/x.csv"), Path("b/x.csv"), Path("b/X.xlsx")], "csv")
+    assert names == ["x_fees.csv", "x_2_fees.csv", "X_3_fees.csv"]
@@ -0,0 +1,57 @@
+"""Checks the Excel, CSV and Parquet downloads."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import export
+from export import csv_bytes, excel_bytes, excel_sheet_names, parquet_bytes
+
+
+def sample_frame():
+    return pd.DataFrame({
+        "Month": pd.to_datetime(["2023-01-31", "2023-02-28", None]),
+        "Net Return %": [1.5, np.nan, -0.25],
+        "Mgmt Charged?": [True, False, True],
+        "Label": ["a", "b", "c"],
+    })
+
+
+def test_excel_round_trip(monkeypatch):
+    # Blocks smaller than the frame exercise the streaming path
+    monkeypatch.setattr(export, "ROW_BLOCK", 2)
+    frame = sample_frame()
+    data = excel_bytes([("Results", frame), ("Other", frame.head(1))])
+    sheets = pd.read_excel(io.BytesIO(data), sheet_name=None)
+    assert list(sheets) == ["Results", "Other"]
+    pd.testing.assert_frame_equal(sheets["Results"], frame, check_dtype=False)
+
+
+def test_excel_sheet_names_are_valid_and_unique():
+    names = excel_sheet_names(["Fund A", "fund a", "x" * 40, "a/b:c", "", "Summary"])
+    assert names[:2] == ["Fund A", "fund a (2)"]
+    assert len(names[2]) == 31
+    assert names[3] == "a_b_c" and names[4] == "Fund"
+    assert names[5] == "Summary (2)"
+    assert len({n.lower() for n in names}) == len(names)
+
+
+def test_too_many_rows_for_excel(monkeypatch):
+    monkeypatch.setattr(export, "EXCEL_MAX_ROWS", 3)
+    with pytest.raises(ValueError):
+        excel_bytes([("Results", sample_frame())])
+
+
+def test_csv_and_parquet_round_trip():
+    frame = sample_frame()
+    pd.testing.assert_frame_equal(pd.read_parquet(io.BytesIO(parquet_bytes(frame))), frame,
+                                  check_dtype=False)
+    back = pd.read_csv(io.BytesIO(csv_bytes(frame)), parse_dates=["Month"])
+    pd.testing.assert_frame_equal(back, frame, check_dtype=False)
+
+
+def test_parquet_with_mixed_labels():
+    frame = pd.DataFrame({"Month": [pd.Timestamp("2023-01-31"), "base", None], "x": [1.0, 2.0, 3.0]})
+    back = pd.read_parquet(io.BytesIO(parquet_bytes(frame)))
+    assert list(back["Month"]) == ["2023-01-31 00:00:00", "base", None]
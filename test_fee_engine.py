@@ -0,0 +1,351 @@
+"""Checks the array fee engines against the original per-row loops and against `run_accrual`.
+
+Run with `python -m pytest -q` from the repository root.
+"""
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fee_engine import (AccrualCheckpoint, FeeParams, accrual_gross_from_net, periodic_gross_from_net, run_accrual,
+                        run_accrual_batch, run_accrual_grid, run_accrual_layers, run_accrual_lots, run_periodic)
+from periods import period_calendar
+
+
+def is_calc_month(freq, month, is_year_end):
+    if freq == "Monthly":
+        return True
+    if freq == "Quarterly":
+        return month in [3, 6, 9, 12]
+    if freq == "Yearly":
+        return is_year_end
+    return False
+
+
+def reference_accrual(returns, months, params, first_row_is_base):
+    # The monthly-accrual loop of the original streamlit_app.py
+    current_value = hwm = 1.0
+    mgmt_fee_monthly = params.mgmt_fee / 100.0 / 12.0
+    hurdle_monthly = params.hurdle_rate / 100.0 / 12.0
+    prev_accrued_pf = 0.0
+    rows = []
+    if first_row_is_base and len(returns) > 0:
+        rows.append(dict(mgmt_fee=0.0, accrued_pf=0.0, crystallization_amount=0.0, closing_nav=1.0, hwm=hwm))
+    for idx in range(1 if first_row_is_base else 0, len(returns)):
+        r = returns[idx]
+        if np.isnan(r):
+            continue
+        month = months[idx]
+        opening_nav = current_value
+        adj_gav = opening_nav + opening_nav * r + prev_accrued_pf
+        mgmt_fee = adj_gav * mgmt_fee_monthly if is_calc_month(params.mgmt_freq, month, month == 12) else 0.0
+        nav_before_pf = adj_gav - mgmt_fee
+        if params.use_hwm:
+            accrued_pf = max(0.0, nav_before_pf - hwm) * params.carry_decimal
+        else:
+            period_ret = (nav_before_pf / opening_nav - 1.0) if opening_nav > 0 else 0.0
+            accrued_pf = opening_nav * max(0.0, period_ret - hurdle_monthly) * params.carry_decimal
+        closing_nav = nav_before_pf - accrued_pf
+        crystallize = is_calc_month(params.crystal_freq, month, month == 12) and accrued_pf > 0
+        if crystallize:
+            prev_accrued_pf = 0.0
+            if params.use_hwm:
+                hwm = closing_nav
+        else:
+            prev_accrued_pf = accrued_pf
+        rows.append(dict(mgmt_fee=mgmt_fee, accrued_pf=accrued_pf,
+                         crystallization_amount=accrued_pf if crystallize else 0.0,
+                         closing_nav=closing_nav, hwm=hwm))
+        current_value = closing_nav
+    return pd.DataFrame(rows)
+
+
+def reference_periodic(returns, months, params, first_row_is_base):
+    # The periodic-charge loop of the original backup_app.py
+    current_value = hwm = 1.0
+    mgmt_rate = -(params.mgmt_fee / 100 / {"Monthly": 12, "Quarterly": 4}.get(params.mgmt_freq, 1))
+    hurdle_period = params.hurdle_rate / 100 / {"Monthly": 12, "Quarterly": 4}.get(params.pfm_freq, 1)
+    rows = []
+    if first_row_is_base:
+        rows.append(dict(mgmt_fee=0.0, perf_paid=0.0, net_value=1.0, hwm=1.0))
+    for idx in range(1 if first_row_is_base else 0, len(returns)):
+        gross = returns[idx]
+        if np.isnan(gross):
+            continue
+        month = months[idx]
+        charged = is_calc_month(params.mgmt_freq, month, month == 12)
+        fee_applied = mgmt_rate if charged else 0.0
+        value_after_mgmt = current_value * (1 + gross + fee_applied)
+        period_return = (value_after_mgmt - current_value) / current_value if current_value > 0 else 0
+        perf_fee_paid = 0.0
+        if is_calc_month(params.pfm_freq, month, month == 12):
+            if params.use_hwm:
+                if value_after_mgmt > hwm:
+                    perf_fee_paid = (value_after_mgmt - hwm) * params.carry_decimal
+                    value_after_mgmt -= perf_fee_paid
+                    hwm = value_after_mgmt
+            elif period_return > hurdle_period:
+                perf_fee_paid = current_value * (period_return - hurdle_period) * params.carry_decimal
+                value_after_mgmt -= perf_fee_paid
+        rows.append(dict(mgmt_fee=abs(fee_applied * current_value), perf_paid=perf_fee_paid,
+                         net_value=value_after_mgmt, hwm=hwm))
+        current_value = value_after_mgmt
+    return pd.DataFrame(rows)
+
+
+def sample_series(n=61, seed=0):
+    returns = np.random.default_rng(seed).normal(0.006, 0.035, n)
+    returns[[7, 30]] = np.nan
+    months = (np.arange(n) + 10) % 12 + 1
+    return returns, months, months == 12
+
+
+PARAM_CASES = [
+    FeeParams(),
+    FeeParams(mgmt_fee=2.0, carry_pct=20.0, mgmt_freq="Quarterly", pfm_freq="Quarterly", crystal_freq="Quarterly"),
+    FeeParams(carry_pct=15.0, hurdle_rate=6.0, use_hwm=False, crystal_freq="Monthly"),
+    FeeParams(mgmt_fee=1.0, carry_pct=25.0, hurdle_rate=4.0, mgmt_freq="Yearly", pfm_freq="Monthly",
+              use_hwm=False),
+]
+
+
+@pytest.mark.parametrize("params", PARAM_CASES)
+@pytest.mark.parametrize("first_row_is_base", [True, False])
+def test_run_accrual_matches_reference(params, first_row_is_base):
+    returns, months, year_end = sample_series()
+    res = run_accrual(returns, months, year_end, params, first_row_is_base)
+    expected = reference_accrual(returns, months, params, first_row_is_base)
+    for column in expected:
+        np.testing.assert_allclose(getattr(res, column), expected[column], rtol=1e-12, atol=1e-15, err_msg=column)
+
+
+@pytest.mark.parametrize("params", PARAM_CASES)
+@pytest.mark.parametrize("first_row_is_base", [True, False])
+def test_run_periodic_matches_reference(params, first_row_is_base):
+    returns, months, year_end = sample_series()
+    res = run_periodic(returns, months, year_end, params, first_row_is_base)
+    expected = reference_periodic(returns, months, params, first_row_is_base)
+    for column in expected:
+        np.testing.assert_allclose(getattr(res, column), expected[column], rtol=1e-12, atol=1e-15, err_msg=column)
+
+
+@pytest.mark.parametrize("params", PARAM_CASES)
+@pytest.mark.parametrize("split", [5, 24, 40])
+def test_resumed_run_matches_full_history(params, split):
+    returns, months, year_end = sample_series()
+    full = run_accrual(returns, months, year_end, params)
+    head = run_accrual(returns[:split], months[:split], year_end[:split], params)
+    checkpoint = AccrualCheckpoint.from_json(head.checkpoint.to_json())
+    tail = run_accrual(returns[split:], months[split:], year_end[split:], params, resume=checkpoint)
+    for column in ("mgmt_fee", "accrued_pf", "crystallization_amount", "closing_nav", "hwm"):
+        np.testing.assert_allclose(getattr(tail, column), getattr(full, column)[len(head):], rtol=1e-12,
+                                   err_msg=column)
+
+
+@pytest.mark.parametrize("params", PARAM_CASES)
+@pytest.mark.parametrize("first_row_is_base", [True, False])
+def test_accrual_gross_from_net_round_trip(params, first_row_is_base):
+    returns, months, year_end = sample_series()
+    net = run_accrual(returns, months, year_end, params, first_row_is_base)
+    # The base row passes through unchanged, so only the charged rows round-trip
+    charged = slice(1 if first_row_is_base else 0, None)
+    net_returns = returns.copy()
+    net_returns[net.row[charged]] = net.net_return_pct[charged] / 100
+    gross = accrual_gross_from_net(net_returns, months, year_end, params, first_row_is_base)
+    np.testing.assert_allclose(gross[net.row[charged]], returns[net.row[charged]], atol=1e-12)
+    assert np.isnan(gross[[7, 30]]).all()
+
+
+@pytest.mark.parametrize("params", PARAM_CASES)
+@pytest.mark.parametrize("first_row_is_base", [True, False])
+def test_periodic_gross_from_net_round_trip(params, first_row_is_base):
+    returns, months, year_end = sample_series()
+    net = run_periodic(returns, months, year_end, params, first_row_is_base)
+    # The base row passes through unchanged, so only the charged rows round-trip
+    charged = slice(1 if first_row_is_base else 0, None)
+    net_returns = returns.copy()
+    net_returns[net.row[charged]] = net.return_pct[charged] / 100
+    gross = periodic_gross_from_net(net_returns, months, year_end, params, first_row_is_base)
+    np.testing.assert_allclose(gross[net.row[charged]], returns[net.row[charged]], atol=1e-12)
+
+
+def test_integer_period_labels_use_the_monthly_calendar():
+    calendar = period_calendar(pd.Series(np.arange(1, 26)))
+    assert calendar.days is None
+    assert list(calendar.month[:13]) == list(range(1, 13)) + [1]
+
+
+def test_day_count_series_cannot_resume():
+    periods = pd.Series(pd.date_range("2021-01-04", periods=300, freq="B"))
+    calendar = period_calendar(periods)
+    returns = np.random.default_rng(1).normal(0.0003, 0.01, len(periods))
+    res = run_accrual(returns, calendar.month, calendar.year_end, FeeParams(), **calendar.schedule)
+    assert res.checkpoint is None
+    with pytest.raises(ValueError):
+        run_accrual(returns, calendar.month, calendar.year_end, FeeParams(),
+                    resume=AccrualCheckpoint(1.0, 1.0, 0.0, 0, FeeParams()), **calendar.schedule)
+
+
+
+def test_business_day_series_closes_its_last_year():
+    periods = pd.Series(pd.bdate_range("2023-01-02", "2023-12-29"))
+    calendar = period_calendar(periods)
+    assert calendar.month_end[-1] and calendar.quarter_end[-1] and calendar.year_end[-1]
+    assert calendar.month_end.sum() == 12
+    returns = np.full(len(periods), 0.0004)
+    res = run_accrual(returns, calendar.month, calendar.year_end,
+                      FeeParams(mgmt_freq="Yearly", crystal_freq="Yearly"), False, **calendar.schedule)
+    assert res.mgmt_charged.sum() == 1 and res.mgmt_charged[-1]
+    assert res.total_mgmt_fees > 0 and res.total_crystallized > 0
+
+
+def business_day_funds():
+    # Three funds on one business-day calendar, each missing different days;
+    # fund 0 misses every other month end
+    periods = pd.Series(pd.bdate_range("2022-01-03", "2023-12-29"))
+    calendar = period_calendar(periods)
+    rng = np.random.default_rng(3)
+    returns = rng.normal(0.0004, 0.01, (len(periods), 3))
+    returns[np.flatnonzero(calendar.month_end)[::2], 0] = np.nan
+    returns[rng.choice(len(periods), 80, replace=False), 1] = np.nan
+    return returns, calendar
+
+
+DAY_COUNT_CASES = [
+    FeeParams(),
+    FeeParams(hurdle_rate=5.0, use_hwm=False, mgmt_freq="Quarterly", crystal_freq="Quarterly"),
+]
+
+
+@pytest.mark.parametrize("params", DAY_COUNT_CASES)
+def test_day_count_batch_matches_single_runs(params):
+    returns, calendar = business_day_funds()
+    batch = run_accrual_batch(returns, calendar.month, calendar.year_end, params, **calendar.schedule)
+    for j in range(returns.shape[1]):
+        single = run_accrual(returns[:, j], calendar.month, calendar.year_end, params, **calendar.schedule)
+        fund = batch.fund(j)
+        np.testing.assert_array_equal(fund.row, single.row)
+        for column in ("mgmt_fee", "accrued_pf", "crystallization_amount", "closing_nav", "hwm"):
+            np.testing.assert_allclose(getattr(fund, column), getattr(single, column), rtol=1e-12, err_msg=column)
+
+
+@pytest.mark.parametrize("params", DAY_COUNT_CASES)
+def test_day_count_lots_match_runs_from_subscription(params):
+    returns, calendar = business_day_funds()
+    returns = returns[:, 2]
+    start_rows, amounts = [1, 40, 333], [1.0, 2.0, 0.5]
+    lots = run_accrual_lots(returns, calendar.month, calendar.year_end, params, start_rows, amounts,
+                            **calendar.schedule)
+    for j, (start, amount) in enumerate(zip(start_rows, amounts)):
+        single = run_accrual(returns[start:], calendar.month[start:], calendar.year_end[start:], params, False,
+                             amount, month_end=calendar.month_end[start:], days=calendar.days[start:])
+        np.testing.assert_allclose(lots.fund(j).closing_nav, single.closing_nav, rtol=1e-12)
+        np.testing.assert_allclose(lots.fund(j).mgmt_fee, single.mgmt_fee, rtol=1e-12)
+
+
+def test_gross_from_net_resume_checks_match_run_accrual():
+    returns, months, year_end = sample_series()
+    checkpoint = run_accrual(returns[:24], months[:24], year_end[:24], FeeParams()).checkpoint
+    with pytest.raises(ValueError):
+        accrual_gross_from_net(returns[24:], months[24:], year_end[24:], FeeParams(carry_pct=20.0),
+                               resume=checkpoint)
+    with pytest.raises(ValueError):
+        accrual_gross_from_net(returns[24:], months[24:], year_end[24:], FeeParams(), resume=checkpoint,
+                               month_end=np.ones(37, dtype=bool), days=np.full(37, 30.0))
+
+
+@pytest.mark.parametrize("label", [None, np.nan])
+def test_checkpoint_without_a_last_label(label):
+    returns, months = np.full(12, 0.01), np.arange(1, 13)
+    year_end = months == 12
+    periods = pd.Series([f"2020-{m:02d}-28" for m in range(1, 12)] + [label], dtype=object)
+    checkpoint = run_accrual(returns, months, year_end, FeeParams()).period_checkpoint(periods)
+    assert checkpoint.last_period is None
+    checkpoint.check_continues(pd.Series(["2019-01-31"]))
+
+
+@pytest.mark.parametrize("freq, charges", [("Monthly", 12), ("Quarterly", 4), ("Yearly", 1)])
+def test_periodic_fees_charge_at_period_ends_of_daily_series(freq, charges):
+    periods = pd.Series(pd.bdate_range("2023-01-02", "2023-12-29"))
+    calendar = period_calendar(periods)
+    returns = np.full(len(periods), 0.0004)
+    params = FeeParams(mgmt_freq=freq, pfm_freq=freq)
+    res = run_periodic(returns, calendar.month, calendar.year_end, params, month_end=calendar.month_end)
+    assert res.mgmt_charged.sum() == charges
+    assert (res.perf_paid > 0).sum() == charges
+    gross = periodic_gross_from_net(res.return_pct / 100, calendar.month, calendar.year_end, params,
+                                    month_end=calendar.month_end)
+    np.testing.assert_allclose(gross, returns, atol=1e-12)
+
+
+STATE_COLUMNS = ("mgmt_fee", "accrued_pf", "crystallization_amount", "closing_nav", "hwm")
+
+
+def assert_same_run(result, expected):
+    np.testing.assert_array_equal(result.row, expected.row)
+    for column in STATE_COLUMNS:
+        np.testing.assert_allclose(getattr(result, column), getattr(expected, column), rtol=1e-12, err_msg=column)
+
+
+@pytest.mark.parametrize("params", PARAM_CASES)
+def test_batch_matches_single_runs(params):
+    returns, months, year_end = sample_series()
+    matrix = np.column_stack([returns, np.roll(returns, 5), returns * 0.5])
+    matrix[[3, 12], 2] = np.nan
+    batch = run_accrual_batch(matrix, months, year_end, params)
+    for j in range(matrix.shape[1]):
+        assert_same_run(batch.fund(j), run_accrual(matrix[:, j], months, year_end, params))
+
+
+def test_grid_matches_single_runs():
+    returns, months, year_end = sample_series()
+    for use_hwm in (True, False):
+        combos = [replace(p, use_hwm=use_hwm) for p in PARAM_CASES]
+        grid = run_accrual_grid(returns, months, year_end, [p.mgmt_fee for p in combos],
+                                [p.carry_pct for p in combos], [p.hurdle_rate for p in combos],
+                                [p.mgmt_freq for p in combos], [p.crystal_freq for p in combos], use_hwm)
+        for j, params in enumerate(combos):
+            assert_same_run(grid.fund(j), run_accrual(returns, months, year_end, params))
+
+
+@pytest.mark.parametrize("params", PARAM_CASES)
+def test_lots_match_runs_from_subscription(params):
+    returns, months, year_end = sample_series()
+    start_rows, amounts = [1, 13, 31], [1.0, 2.5, 0.4]
+    lots = run_accrual_lots(returns, months, year_end, params, start_rows, amounts)
+    for j, (start, amount) in enumerate(zip(start_rows, amounts)):
+        single = run_accrual(returns[start:], months[start:], year_end[start:], params, False, amount)
+        single.row += start
+        assert_same_run(lots.fund(j), single)
+
+
+def test_layers_match_chained_single_runs():
+    returns, months, year_end = sample_series()
+    layers = [PARAM_CASES[1], PARAM_CASES[2], FeeParams(mgmt_fee=0.5, carry_pct=0.0)]
+    stack = run_accrual_layers(returns, months, year_end, layers)
+    layer_returns = returns
+    for j, params in enumerate(layers):
+        single = run_accrual(layer_returns, months, year_end, params)
+        assert_same_run(stack.fund(j), single)
+        # Each layer is charged on the net return of the one before
+        layer_returns = returns.copy()
+        layer_returns[single.row[1:]] = single.net_return_pct[1:] / 100
+
+
+def test_day_count_grid_and_layers_match_single_runs():
+    returns, calendar = business_day_funds()
+    returns = returns[:, 1]
+    combos = DAY_COUNT_CASES
+    grid = run_accrual_grid(returns, calendar.month, calendar.year_end, [p.mgmt_fee for p in combos],
+                            [p.carry_pct for p in combos], [p.hurdle_rate for p in combos],
+                            [p.mgmt_freq for p in combos], [p.crystal_freq for p in combos], False,
+                            **calendar.schedule)
+    stack = run_accrual_layers(returns, calendar.month, calendar.year_end,
+                               [replace(p, use_hwm=False) for p in combos], **calendar.schedule)
+    for j, params in enumerate(combos):
+        single = run_accrual(returns, calendar.month, calendar.year_end, replace(params, use_hwm=False),
+                             **calendar.schedule)
+        assert_same_run(grid.fund(j), single)
+    assert_same_run(stack.fund(0), run_accrual(returns, calendar.month, calendar.year_end,
+                                               replace(combos[0], use_hwm=False), **calendar.schedule))
@@ -0,0 +1,69 @@
+"""Checks the JSON service's request handling against `run_accrual`."""
+import json
+
+import numpy as np
+import pytest
+
+from fee_engine import FeeParams, run_accrual
+from fee_service import calculate
+from periods import period_calendar
+
+RETURNS = np.random.default_rng(6).normal(0.006, 0.03, 37)
+RETURNS[0] = 0.0
+PERIODS = [f"{2020 + (m // 12)}-{m % 12 + 1:02d}" for m in range(37)]
+PARAMS = {"mgmt_fee": 2.0, "carry_pct": 20.0, "crystal_freq": "Quarterly"}
+
+
+def test_matches_run_accrual():
+    body = calculate({"returns": RETURNS.tolist(), "periods": PERIODS, "params": PARAMS})
+    calendar = period_calendar(PERIODS, 1)
+    expected = run_accrual(RETURNS, calendar.month, calendar.year_end, FeeParams(**PARAMS))
+    assert body["summary"]["final_nav"] == pytest.approx(expected.final_nav, rel=1e-12)
+    assert body["summary"]["total_mgmt_fees"] == pytest.approx(expected.total_mgmt_fees, rel=1e-12)
+    np.testing.assert_allclose(body["series"]["closing_nav"], expected.closing_nav, rtol=1e-12)
+    assert body["checkpoint"]["last_period"] == PERIODS[-1]
+
+
+def test_resuming_from_the_returned_checkpoint_matches_one_request():
+    whole = calculate({"returns": RETURNS.tolist(), "periods": PERIODS, "params": PARAMS, "series": False})
+    head = calculate({"returns": RETURNS[:20].tolist(), "periods": PERIODS[:20], "params": PARAMS})
+    # The checkpoint goes back through JSON exactly as a client would send it
+    checkpoint = json.loads(json.dumps(head["checkpoint"]))
+    tail = calculate({"returns": RETURNS[20:].tolist(), "periods": PERIODS[20:], "params": PARAMS,
+                      "checkpoint": checkpoint})
+    assert "series" not in whole
+    assert tail["summary"]["final_nav"] == pytest.approx(whole["summary"]["final_nav"], rel=1e-12)
+    assert tail["checkpoint"]["period_index"] == whole["checkpoint"]["period_index"]
+    with pytest.raises(ValueError):
+        calculate({"returns": RETURNS[20:].tolist(), "periods": PERIODS[:17], "params": PARAMS,
+                   "checkpoint": checkpoint})
+
+
+def test_null_returns_and_missing_periods():
+    returns = RETURNS.tolist()
+    returns[5] = None
+    body = calculate({"returns": returns})
+    assert body["summary"]["periods"] == len(RETURNS) - 1
+    assert body["checkpoint"]["last_period"] is None
+
+
+def test_day_count_series_get_no_checkpoint():
+    periods = np.arange("2023-01-02", "2023-04-01", dtype="datetime64[D]").astype(str).tolist()
+    body = calculate({"returns": [0.0005] * len(periods), "periods": periods})
+    assert body["checkpoint"] is None
+
+
+@pytest.mark.parametrize("payload", [
+    [],
+    {"returns": "x"},
+    {"returns": [[0.1]]},
+    {"returns": ["a"]},
+    {"returns": [0.1], "periods": ["2020-01", "2020-02"]},
+    {"returns": [0.1], "params": {"mgmt_fee": "1"}},
+    {"returns": [0.1], "params": {"mgmt_freq": "Weekly"}},
+    {"returns": [0.1], "params": {"fee": 1}},
+    {"returns": [0.1], "starting_value": 0},
+])
+def test_bad_requests(payload):
+    with pytest.raises(ValueError):
+        calculate(payload)
@@ -0,0 +1,59 @@
+"""Checks upload reading and returns parsing: every backend reads the same frame."""
+import datetime as dt
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingest import available_backends, parse_returns, read_upload, read_workbook
+
+
+def workbook_bytes():
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Period", "Fund A", "Blank", "Notes", "Mixed", "When", None, "Ints"])
+    for i in range(6):
+        ws.append([f"2020-0{i + 1}", None if i == 2 else 0.01 * i, None, "x" if i % 2 else None,
+                   1.5 if i % 2 else "a", None if i == 3 else dt.datetime(2020, 1, i + 1), None, i])
+    # Trailing blank rows are formatting and must not come through
+    ws.append([None] * 8)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("backend", [b for b in ("openpyxl", "calamine") if b in available_backends()])
+def test_workbook_backends_match_read_excel(backend):
+    data = workbook_bytes()
+    df, stats = read_workbook(data, backend=backend)
+    pd.testing.assert_frame_equal(df, pd.read_excel(io.BytesIO(data), engine="openpyxl"))
+    assert df["Blank"].dtype == np.float64
+    assert stats.backend == backend and stats.rows == 6
+
+
+@pytest.mark.parametrize("backend", [b for b in ("openpyxl", "calamine") if b in available_backends()])
+def test_workbook_max_columns(backend):
+    df, _ = read_workbook(workbook_bytes(), max_columns=2, backend=backend)
+    assert list(df.columns) == ["Period", "Fund A"]
+
+
+
+def test_csv_parquet_and_arrow_uploads_match():
+    frame = pd.DataFrame({"Period": ["2020-01", "2020-02", "2020-03"], "Fund A": [0.01, np.nan, -0.02]})
+    csv = frame.to_csv(index=False).encode()
+    parquet = io.BytesIO()
+    frame.to_parquet(parquet, index=False)
+    feather = io.BytesIO()
+    frame.to_feather(feather)
+    for data, name in ((csv, "f.csv"), (parquet.getvalue(), "f.parquet"), (feather.getvalue(), "f.arrow")):
+        df = read_upload(data, name)[0]
+        pd.testing.assert_frame_equal(df, frame, check_dtype=False)
+        assert df["Fund A"].dtype == np.float64
+
+
+def test_parse_returns_scales_percentages():
+    np.testing.assert_allclose(parse_returns(pd.Series(["1.5%", "-2", "0.5"])), [0.015, -0.02, 0.005])
+    np.testing.assert_allclose(parse_returns(pd.Series([0.01, -0.02])), [0.01, -0.02])
@@ -0,0 +1,60 @@
+"""Checks the Monte Carlo fee-drag simulation."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from fee_engine import FeeParams, run_accrual
+from monte_carlo import MC_METRICS, histogram_frame, percentile_bands, resample_paths, run_monte_carlo
+
+PARAMS = FeeParams(mgmt_fee=2.0, carry_pct=20.0, crystal_freq="Quarterly")
+
+
+def test_block_paths_are_runs_of_consecutive_returns():
+    source = np.arange(10, dtype=np.float64)
+    paths = resample_paths(source, 24, 50, np.random.default_rng(0), "block", 6)
+    assert paths.shape == (24, 50)
+    steps = (np.diff(paths.reshape(4, 6, 50), axis=1) % 10)
+    assert (steps == 1).all()
+
+
+def test_constant_returns_give_one_path_equal_to_run_accrual():
+    returns = np.full(30, 0.01)
+    months = (np.arange(30) + 4) % 12 + 1
+    out = run_monte_carlo(returns, months, PARAMS, n_paths=20, workers=1)
+    assert list(out.columns) == MC_METRICS and len(out) == 20
+    single = run_accrual(returns, months, months == 12, PARAMS, False)
+    np.testing.assert_allclose(out["final_nav"], single.final_nav, rtol=1e-12)
+    np.testing.assert_allclose(out["total_mgmt_fees"], single.total_mgmt_fees, rtol=1e-12)
+    np.testing.assert_allclose(out["gross_final_nav"], 1.01 ** 30, rtol=1e-12)
+    np.testing.assert_allclose(out["fee_drag"], out["gross_final_nav"] - out["final_nav"])
+
+
+def test_base_row_is_not_resampled():
+    returns = np.r_[0.0, np.random.default_rng(1).normal(0.01, 0.03, 24)]
+    months = (np.arange(25) + 11) % 12 + 1
+    with_base = run_monte_carlo(returns, months, PARAMS, 500, first_row_is_base=True, workers=1)
+    without = run_monte_carlo(returns[1:], months[1:], PARAMS, 500, workers=1)
+    pd.testing.assert_frame_equal(with_base, without)
+
+
+@pytest.mark.parametrize("method", ["iid", "block"])
+def test_results_do_not_depend_on_the_number_of_workers(method):
+    returns = np.random.default_rng(2).normal(0.006, 0.03, 36)
+    months = np.arange(36) % 12 + 1
+    serial = run_monte_carlo(returns, months, PARAMS, 300, method=method, seed=7, workers=1, chunk_paths=64)
+    pooled = run_monte_carlo(returns, months, PARAMS, 300, method=method, seed=7, workers=2, chunk_paths=64)
+    pd.testing.assert_frame_equal(serial, pooled)
+
+
+def test_summaries():
+    results = pd.DataFrame({"fee_drag": np.arange(101, dtype=np.float64)})
+    bands = percentile_bands(results)
+    assert bands.loc["fee_drag", "P5"] == 5 and bands.loc["fee_drag", "P95"] == 95
+    assert bands.loc["fee_drag", "Mean"] == 50
+    hist = histogram_frame(np.r_[results["fee_drag"], np.nan], bins=10)
+    assert hist["paths"].sum() == 101
+
+
+def test_no_returns_is_an_error():
+    with pytest.raises(ValueError):
+        run_monte_carlo([np.nan, np.nan], [1, 2], PARAMS, 10)
@@ -0,0 +1,82 @@
+"""Checks the period calendar on monthly, day-count and undated period columns."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from periods import period_calendar
+
+
+def ends(calendar):
+    return (list(np.flatnonzero(calendar.month_end)), list(np.flatnonzero(calendar.quarter_end)),
+            list(np.flatnonzero(calendar.year_end)))
+
+
+def test_monthly_dates_count_every_row_as_a_month():
+    calendar = period_calendar(pd.Series(pd.date_range("2022-10-31", periods=6, freq="ME")))
+    assert calendar.days is None and calendar.schedule == {}
+    assert list(calendar.month) == [10, 11, 12, 1, 2, 3]
+    assert list(np.flatnonzero(calendar.year_end)) == [2]
+    assert list(np.flatnonzero(calendar.quarter_end)) == [2, 5]
+
+
+@pytest.mark.parametrize("labels", [
+    np.arange(1, 26),
+    np.arange(200001, 200026),
+    pd.Series(np.arange(1, 26), dtype=object),
+    ["Period 1", "Period 2", "Period 3"],
+])
+def test_undated_labels_count_months_from_the_start(labels):
+    calendar = period_calendar(pd.Series(labels), start_idx=1)
+    assert calendar.days is None and not calendar.parsed.any()
+    assert list(calendar.month[:3]) == [12, 1, 2]
+
+
+def test_rows_without_a_date_are_numbered_by_position():
+    calendar = period_calendar(pd.Series(["2023-01-31", "n/a", "2023-03-31"]))
+    assert calendar.days is None
+    assert list(calendar.parsed) == [True, False, True]
+    assert list(calendar.month) == [1, 2, 3]
+
+
+def test_calendar_daily_dates():
+    calendar = period_calendar(pd.Series(pd.date_range("2023-01-01", "2023-12-31")))
+    assert calendar.days is not None and (calendar.days == 1).all()
+    month_ends, quarter_ends, year_ends = ends(calendar)
+    assert len(month_ends) == 12 and month_ends[:2] == [30, 58]
+    assert quarter_ends == [89, 180, 272, 364]
+    assert year_ends == [364]
+
+
+def test_business_day_dates_end_on_the_last_weekday():
+    periods = pd.Series(pd.bdate_range("2023-03-01", "2024-03-29"))
+    calendar = period_calendar(periods)
+    month_ends, quarter_ends, year_ends = ends(calendar)
+    expected = periods.groupby(periods.dt.to_period("M")).tail(1).index
+    assert month_ends == list(expected)
+    assert [str(periods[i].date()) for i in quarter_ends] == ["2023-03-31", "2023-06-30", "2023-09-29",
+                                                              "2023-12-29", "2024-03-29"]
+    assert [str(periods[i].date()) for i in year_ends] == ["2023-12-29"]
+    # Monday after a weekend covers three days
+    assert calendar.days[periods.dt.dayofweek.to_numpy() == 0][1:].min() == 3
+
+
+def test_weekly_dates():
+    periods = pd.Series(pd.date_range("2023-01-06", "2023-12-29", freq="W-FRI"))
+    calendar = period_calendar(periods)
+    month_ends, quarter_ends, year_ends = ends(calendar)
+    assert len(month_ends) == 12
+    assert [str(periods[i].date()) for i in quarter_ends] == ["2023-03-31", "2023-06-30", "2023-09-29",
+                                                              "2023-12-29"]
+    assert year_ends == [len(periods) - 1]
+    assert (calendar.days == 7).all()
+
+
+def test_history_ending_mid_month_leaves_it_open():
+    calendar = period_calendar(pd.Series(pd.bdate_range("2023-01-02", "2023-05-30")))
+    assert not calendar.month_end[-1]
+    assert calendar.month_end.sum() == 4
+
+
+def test_descending_dates_fall_back_to_the_monthly_calendar():
+    periods = pd.Series(pd.date_range("2023-01-01", "2023-03-31")[::-1])
+    assert period_calendar(periods).days is None
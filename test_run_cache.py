@@ -0,0 +1,41 @@
+"""Checks the size-bounded result caches."""
+import numpy as np
+import pandas as pd
+
+from run_cache import RunCache, approx_nbytes, content_hash
+
+
+def test_get_or_compute_computes_once():
+    cache = RunCache(2**20)
+    calls = []
+    for _ in range(3):
+        value = cache.get_or_compute(("a", 1), lambda: calls.append(1) or np.ones(10))
+    assert len(calls) == 1 and (value == 1).all()
+    assert (cache.hits, cache.misses, len(cache)) == (2, 1, 1)
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    cache = RunCache(3 * 8000)
+    for key in "abc":
+        cache.get_or_compute(key, lambda: np.zeros(1000))
+    cache.get_or_compute("a", lambda: None)
+    cache.get_or_compute("d", lambda: np.zeros(1000))
+    assert len(cache) == 3 and cache.size_bytes <= 3 * 8000
+    assert cache.get_or_compute("a", lambda: "recomputed") is not None
+    assert cache.get_or_compute("b", lambda: "recomputed") == "recomputed"
+
+
+def test_values_bigger_than_the_cache_are_returned_but_not_kept():
+    cache = RunCache(100)
+    value = cache.get_or_compute("big", lambda: np.zeros(1000))
+    assert len(value) == 1000 and len(cache) == 0
+
+
+def test_shared_buffers_count_once():
+    data = np.zeros(1000)
+    frame = pd.DataFrame({"x": data}, copy=False)
+    assert approx_nbytes((data, data[:10], frame)) < 2 * data.nbytes
+
+
+def test_content_hash():
+    assert content_hash(b"abc") == content_hash(b"abc") != content_hash(b"abd")
@@ -0,0 +1,68 @@
+"""Checks the fee-parameter sweep against single `run_accrual` runs."""
+import numpy as np
+import pandas as pd
+
+from fee_engine import FeeParams, run_accrual
+from periods import period_calendar
+from sweep import heatmap_frame, run_sweep, sweep_grid, value_range
+
+
+def sample_series(n=49):
+    returns = np.random.default_rng(4).normal(0.006, 0.035, n)
+    returns[9] = np.nan
+    months = np.arange(n) % 12 + 1
+    return returns, months, months == 12
+
+
+def test_value_range_is_inclusive():
+    np.testing.assert_allclose(value_range(1.0, 2.0, 0.5), [1.0, 1.5, 2.0])
+    np.testing.assert_allclose(value_range(0.1, 0.3, 0.1), [0.1, 0.2, 0.3])
+    np.testing.assert_allclose(value_range(2.0, 2.0, 0.5), [2.0])
+
+
+def test_sweep_matches_single_runs():
+    returns, months, year_end = sample_series()
+    grid = sweep_grid([1.0, 2.0], [10.0, 20.0], [0.0, 6.0], ["Monthly", "Quarterly"], ["Quarterly", "Yearly"])
+    assert len(grid) == 32
+    for use_hwm in (True, False):
+        out = run_sweep(returns, months, year_end, grid, use_hwm=use_hwm, chunk_size=5, workers=1)
+        for row in out.itertuples(index=False):
+            params = FeeParams(mgmt_fee=row.mgmt_fee, carry_pct=row.carry_pct, hurdle_rate=row.hurdle_rate,
+                               mgmt_freq=row.mgmt_freq, crystal_freq=row.crystal_freq, use_hwm=use_hwm)
+            single = run_accrual(returns, months, year_end, params)
+            assert np.isclose(row.final_nav, single.final_nav, rtol=1e-12)
+            assert np.isclose(row.total_mgmt_fees, single.total_mgmt_fees, rtol=1e-12)
+            assert np.isclose(row.total_crystallized, single.total_crystallized, rtol=1e-12, atol=1e-15)
+            assert np.isclose(row.uncrystallized_pf, single.uncrystallized_pf, rtol=1e-12, atol=1e-15)
+
+
+def test_sweep_in_a_process_pool_matches_in_process():
+    returns, months, year_end = sample_series()
+    grid = sweep_grid(value_range(0.5, 2.0, 0.5), [10.0, 20.0], [0.0], ["Monthly"], ["Yearly"])
+    serial = run_sweep(returns, months, year_end, grid, chunk_size=3, workers=1)
+    pooled = run_sweep(returns, months, year_end, grid, chunk_size=3, workers=2)
+    pd.testing.assert_frame_equal(serial, pooled)
+
+
+def test_day_count_sweep_matches_single_runs():
+    periods = pd.Series(pd.bdate_range("2022-01-03", "2023-12-29"))
+    calendar = period_calendar(periods)
+    returns = np.random.default_rng(5).normal(0.0004, 0.01, len(periods))
+    grid = sweep_grid([1.5], [10.0], [0.0, 5.0], ["Monthly", "Yearly"], ["Quarterly"])
+    out = run_sweep(returns, calendar.month, calendar.year_end, grid, use_hwm=False, workers=1,
+                    **calendar.schedule)
+    for row in out.itertuples(index=False):
+        params = FeeParams(hurdle_rate=row.hurdle_rate, mgmt_freq=row.mgmt_freq, crystal_freq=row.crystal_freq,
+                           use_hwm=False)
+        single = run_accrual(returns, calendar.month, calendar.year_end, params, **calendar.schedule)
+        assert np.isclose(row.final_nav, single.final_nav, rtol=1e-12)
+
+
+def test_heatmap_holds_other_parameters_at_their_first_value():
+    returns, months, year_end = sample_series()
+    grid = sweep_grid([1.0, 2.0], [10.0, 20.0, 30.0], [0.0, 5.0], ["Monthly"], ["Yearly"])
+    out = run_sweep(returns, months, year_end, grid, workers=1)
+    heat = heatmap_frame(out, "mgmt_fee", "carry_pct", "final_nav")
+    assert heat.shape == (3, 2)
+    first = out[(out.hurdle_rate == 0.0) & (out.mgmt_fee == 2.0) & (out.carry_pct == 30.0)].final_nav.item()
+    assert heat.loc[30.0, 2.0] == first